@@ -1,15 +1,10 @@
-import RPi.GPIO as GPIO
-from mfrc522 import SimpleMFRC522
-import time
-reader = SimpleMFRC522()
-while True:
-    try:
-        print("Place your RFID tag near the reader...")
-        id, text = reader.read()
-        print(id)
-        f=open('rfid2.txt','w')
-        f.write(str(id))
-        f.close()
-    finally:
-        GPIO.cleanup()
-    time.sleep(1)
+# Older launch scripts run this file from the repository root.  The MFRC522
+# reader now lives in ui/RFID2.py (it needs ui/scan_bus.py), so just run that
+# instead of keeping a second copy here.
+import os
+import runpy
+import sys
+
+UI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ui')
+sys.path.insert(0, UI_DIR)
+runpy.run_path(os.path.join(UI_DIR, 'RFID2.py'), run_name='__main__')
@@ -1,12 +1,14 @@
-import serial
 import time
 
+from hal import open_serial
+from scan_bus import ScanBus
+
 # Set up the serial connection
-ser = serial.Serial(
-    port='/dev/ttyUSB0',  # Change to '/dev/ttyAMA0' or '/dev/serial0' if using GPIO UART
-    baudrate=9600,
-    timeout=1
-)
+# Change to '/dev/ttyAMA0' or '/dev/serial0' if using GPIO UART
+ser = open_serial('/dev/ttyUSB0', baudrate=9600, timeout=1)
+
+# Scans go straight to traffic.py over the scan bus
+bus = ScanBus('rfid1')
 
 time.sleep(2)  # Give time for connection to establish
 
@@ -14,13 +16,13 @@ print("Reading data from serial...")
 
 try:
     while True:
-        if ser.in_waiting > 0:
-            data = ser.readline().decode('utf-8').strip()
+        # readline() blocks until a full line or the 1 s timeout
+        data = ser.readline().decode('utf-8').strip()
+        if data:
             print(f"Received: {data}")
-            f=open('rfid1.txt','w')
-            f.write(str(id))
-            f.close()
+            bus.publish(data)
 except KeyboardInterrupt:
     print("Stopped by user")
 finally:
     ser.close()
+    bus.close()
@@ -1,15 +1,20 @@
-import RPi.GPIO as GPIO
-from mfrc522 import SimpleMFRC522
-import time
-reader = SimpleMFRC522()
-while True:
-    try:
-        print("Place your RFID tag near the reader...")
-        id, text = reader.read()
-        print(id)
-        f=open('rfid2.txt','w')
-        f.write(str(id))
-        f.close()
-    finally:
-        GPIO.cleanup()
-    time.sleep(1)
+from intersections import load_spi_readers
+from mfrc522_poller import MFRC522Poller
+from scan_bus import ScanBus
+
+# Scans go straight to traffic.py over the scan bus
+bus = ScanBus('rfid2')
+
+
+def on_scan(reader, uid, read_at):
+    print(uid)
+    bus.publish(uid, read_at)
+
+
+print("Place your RFID tag near the reader...")
+try:
+    MFRC522Poller(load_spi_readers(), on_scan).run()
+except KeyboardInterrupt:
+    print("Stopped by user")
+finally:
+    bus.close()
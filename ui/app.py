@@ -1,78 +1,36 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from passlib.hash import pbkdf2_sha256
-import threading
-import time
-import sqlite3
+import atexit
+import base64
+import json
+import math
+import os
+import subprocess
+import sys
 from datetime import datetime
 
-# RFID imports - with fallback for testing
-try:
-    import serial
-    from mfrc522 import SimpleMFRC522
-    import RPi.GPIO as GPIO
-    RFID_AVAILABLE = True
-except ImportError:
-    print("RFID libraries not available - running in simulation mode")
-    RFID_AVAILABLE = False
-
-DB_PATH = "rfid_logs.db"
+from change_feed import notify_changes
+from db import DB_PATH, add_commit_hook, connection, transaction
+import export
+from hospital_index import DEFAULT_K, load_hospital_index
+from ingest import RFID_AVAILABLE, STOP_TIMEOUT, save_rfid_to_db
+import ingest_daemon
+from live_feed import LiveFeed
+import metrics
+from migrations import migrate
+from retention import history
+import stats
 
 def init_db():
     """Initialize database with all required tables"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Create rfid_scans table (already exists but ensure it's there)
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS rfid_scans (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            data TEXT NOT NULL,
-            source TEXT NOT NULL,
-            severity INTEGER,
-            patient_name TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create emergency_cases table for SQLAlchemy
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS emergency_case (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            patient_name TEXT NOT NULL,
-            hospital_name TEXT NOT NULL,
-            severity_level INTEGER NOT NULL,
-            driver_id TEXT NOT NULL,
-            rfid1_number TEXT,
-            rfid2_number TEXT,
-            rfid_linked BOOLEAN DEFAULT 0,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create drivers table for SQLAlchemy
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS driver (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            driver_id TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            name TEXT
-        )
-    ''')
-    
-    # Create rfid_reading table for SQLAlchemy
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS rfid_reading (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            rfid_number TEXT NOT NULL,
-            reader_type TEXT NOT NULL,
-            case_id INTEGER,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            processed BOOLEAN DEFAULT 0,
-            FOREIGN KEY (case_id) REFERENCES emergency_case (id)
-        )
-    ''')
-    
+    version = migrate()
+    with transaction() as conn:
+        _create_test_driver(conn.cursor())
+    print(f"Database initialized with all tables (schema version {version})")
+
+def _create_test_driver(c):
+    """Insert the test driver used by the login page"""
     # Insert test driver if not exists
     c.execute("SELECT COUNT(*) FROM driver WHERE driver_id = ?", ('driver123',))
     if c.fetchone()[0] == 0:
@@ -80,18 +38,15 @@ def init_db():
         c.execute("INSERT INTO driver (driver_id, password_hash, name) VALUES (?, ?, ?)",
                  ('driver123', password_hash, 'Test Driver'))
         print("Test driver created")
-    
-    conn.commit()
-    conn.close()
-    print("Database initialized with all tables")
 
 # ============================================================================
 # CORE FLASK AND DATABASE SETUP
 # ============================================================================
 
-app = Flask(__name__, template_folder='/home/team19/etps/fyp/ui/templates')
+# Next to this file (/home/team19/etps/fyp/ui/templates on the Pi), whatever the working directory
+app = Flask(__name__, template_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates'))
 app.config['SECRET_KEY'] = 'your_secret_key_here'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///rfid_logs.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_PATH}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db = SQLAlchemy(app)
 
@@ -131,12 +86,9 @@ class RFIDReading(db.Model):
 def save_scan_to_db(data, source, severity=None, patient_name=None):
     """Save to rfid_scans table (your existing table)"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("INSERT INTO rfid_scans (data, source, severity, patient_name) VALUES (?, ?, ?, ?)", 
-                 (data, source, severity, patient_name))
-        conn.commit()
-        conn.close()
+        with transaction() as conn:
+            conn.execute("INSERT INTO rfid_scans (data, source, severity, patient_name) VALUES (?, ?, ?, ?)", 
+                         (data, source, severity, patient_name))
         print(f"[DB] Saved to rfid_scans: {data} from {source} with severity {severity}")
         return True
     except Exception as e:
@@ -146,17 +98,12 @@ def save_scan_to_db(data, source, severity=None, patient_name=None):
 def save_emergency_case_direct(patient_name, hospital_name, severity_level, driver_id):
     """Save emergency case directly to database"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        
-        c.execute("""
-            INSERT INTO emergency_case (patient_name, hospital_name, severity_level, driver_id, created_at) 
-            VALUES (?, ?, ?, ?, ?)
-        """, (patient_name, hospital_name, severity_level, driver_id, datetime.now()))
-        
-        case_id = c.lastrowid
-        conn.commit()
-        conn.close()
+        with transaction() as conn:
+            c = conn.execute("""
+                INSERT INTO emergency_case (patient_name, hospital_name, severity_level, driver_id, created_at) 
+                VALUES (?, ?, ?, ?, ?)
+            """, (patient_name, hospital_name, severity_level, driver_id, datetime.now()))
+            case_id = c.lastrowid
         
         print(f"[DB] Emergency case saved: ID={case_id}, Patient={patient_name}, Severity={severity_level}")
         return case_id
@@ -164,146 +111,100 @@ def save_emergency_case_direct(patient_name, hospital_name, severity_level, driv
         print(f"[DB ERROR] emergency_case: {e}")
         return None
 
-def save_rfid_to_db(rfid_number, reader_type):
-    """Save RFID reading to database"""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        
-        # Save to rfid_reading table
-        c.execute("""
-            INSERT INTO rfid_reading (rfid_number, reader_type, timestamp) 
-            VALUES (?, ?, ?)
-        """, (rfid_number, reader_type, datetime.now()))
-        
-        reading_id = c.lastrowid
-        print(f"[{reader_type.upper()}] Saved RFID reading: {rfid_number} (ID: {reading_id})")
-        
-        # Also save to rfid_scans for compatibility
-        c.execute("INSERT INTO rfid_scans (data, source) VALUES (?, ?)", 
-                 (rfid_number, f"Signal {1 if reader_type == 'rfid1' else 2}"))
-        
-        # Try to link to most recent unlinked case
-        c.execute("""
-            SELECT id FROM emergency_case 
-            WHERE (rfid1_number IS NULL OR rfid2_number IS NULL) 
-            ORDER BY created_at DESC LIMIT 1
-        """)
-        
-        recent_case = c.fetchone()
-        if recent_case:
-            case_id = recent_case[0]
-            
-            if reader_type == 'rfid1':
-                c.execute("SELECT rfid1_number FROM emergency_case WHERE id = ?", (case_id,))
-                if c.fetchone()[0] is None:  # rfid1_number is NULL
-                    c.execute("UPDATE emergency_case SET rfid1_number = ? WHERE id = ?", (rfid_number, case_id))
-                    c.execute("UPDATE rfid_reading SET case_id = ?, processed = 1 WHERE id = ?", (case_id, reading_id))
-                    print(f"RFID1: Linked {rfid_number} to case {case_id}")
-            
-            elif reader_type == 'rfid2':
-                c.execute("SELECT rfid2_number FROM emergency_case WHERE id = ?", (case_id,))
-                if c.fetchone()[0] is None:  # rfid2_number is NULL
-                    c.execute("UPDATE emergency_case SET rfid2_number = ? WHERE id = ?", (rfid_number, case_id))
-                    c.execute("UPDATE rfid_reading SET case_id = ?, processed = 1 WHERE id = ?", (case_id, reading_id))
-                    print(f"RFID2: Linked {rfid_number} to case {case_id}")
-            
-            # Check if both RFIDs are now linked
-            c.execute("SELECT rfid1_number, rfid2_number FROM emergency_case WHERE id = ?", (case_id,))
-            rfid1, rfid2 = c.fetchone()
-            if rfid1 and rfid2:
-                c.execute("UPDATE emergency_case SET rfid_linked = 1 WHERE id = ?", (case_id,))
-                print(f"Case {case_id} fully linked!")
-        
-        conn.commit()
-        conn.close()
-        return True
-        
-    except Exception as e:
-        print(f"Database error saving RFID ({reader_type}): {e}")
-        return False
-
-# ============================================================================
-# RFID READING CLASSES
-# ============================================================================
-
-class RFID1Reader:
-    """RFID Reader 1 - Serial/USB connection"""
-    def __init__(self):
-        self.running = False
-        self.serial_connection = None
+# Pushes new readings, case links and priority activations to browsers
+live_feed = LiveFeed()
 
-    def start_reading(self):
-        if not RFID_AVAILABLE:
-            print("RFID1: Running in simulation mode")
-            return
+# Nearest-hospital lookups for the dashboard (None without a hospital list)
+hospital_index = load_hospital_index()
 
-        try:
-            self.serial_connection = serial.Serial(
-                port='/dev/ttyUSB0',
-                baudrate=9600,
-                timeout=1
-            )
-            time.sleep(2)
-            self.running = True
-            print("RFID1: Started reading from serial...")
-
-            while self.running:
-                if self.serial_connection.in_waiting > 0:
-                    data = self.serial_connection.readline().decode('utf-8').strip()
-                    if data:
-                        print(f"RFID1 Received: {data}")
-                        save_rfid_to_db(data, 'rfid1')
-                time.sleep(0.1)
+# Wake change-feed subscribers (the priority controller) after every commit
+add_commit_hook(notify_changes)
 
-        except Exception as e:
-            print(f"RFID1 Error: {e}")
-        finally:
-            if self.serial_connection:
-                self.serial_connection.close()
+# ============================================================================
+# LISTINGS (KEYSET PAGINATION)
+# ============================================================================
+#
+# Case and reading lists are served a page at a time, newest first.  The
+# cursor is the (created_at, id) / (timestamp, id) of the last row shown, and
+# the next page is "rows before that key" - an index range read, so a page
+# costs the same however much history there is (no OFFSET).
 
-    def stop_reading(self):
-        self.running = False
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
 
-class RFID2Reader:
-    """RFID Reader 2 - GPIO connection"""
-    def __init__(self):
-        self.running = False
-        self.reader = None
+CASE_COLUMNS = ('id', 'patient_name', 'hospital_name', 'severity_level', 'rfid1_number',
+                'rfid2_number', 'rfid_linked', 'created_at')
+READING_COLUMNS = ('id', 'rfid_number', 'reader_type', 'case_id', 'processed', 'timestamp')
 
-    def start_reading(self):
-        if not RFID_AVAILABLE:
-            print("RFID2: Running in simulation mode")
-            return
 
-        try:
-            self.reader = SimpleMFRC522()
-            self.running = True
-            print("RFID2: Started reading from GPIO...")
-
-            while self.running:
-                try:
-                    print("RFID2: Place your RFID tag near the reader...")
-                    id, text = self.reader.read()
-                    if id:
-                        print(f"RFID2 Received: {id}")
-                        save_rfid_to_db(str(id), 'rfid2')
-                except Exception as e:
-                    print(f"RFID2 Read error: {e}")
-                finally:
-                    if RFID_AVAILABLE:
-                        GPIO.cleanup()
-                time.sleep(1)
+def encode_cursor(sort_value, row_id):
+    """Opaque cursor for the row a page ended on"""
+    raw = json.dumps([sort_value, row_id], default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
 
-        except Exception as e:
-            print(f"RFID2 Error: {e}")
 
-    def stop_reading(self):
-        self.running = False
-
-# Global RFID reader instances
-rfid1_reader = RFID1Reader()
-rfid2_reader = RFID2Reader()
+def decode_cursor(cursor):
+    """(sort value, id) from encode_cursor(); ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(sort_value, str) or not isinstance(row_id, int):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return sort_value, row_id
+
+
+def page_args(cursor_param='cursor', default_size=PAGE_SIZE):
+    """(decoded cursor or None, page size) from the query string"""
+    size = request.args.get('page_size', default_size, type=int) or default_size
+    size = max(1, min(size, MAX_PAGE_SIZE))
+    cursor = request.args.get(cursor_param)
+    return (decode_cursor(cursor) if cursor else None), size
+
+
+def fetch_case_page(conn, driver_id, cursor=None, page_size=PAGE_SIZE):
+    """One page of a driver's cases, newest first: (cases, next cursor or None)"""
+    if cursor is None:
+        rows = conn.execute("""
+            SELECT id, patient_name, hospital_name, severity_level, rfid1_number, rfid2_number,
+                   rfid_linked, created_at
+            FROM emergency_case
+            WHERE driver_id = ?
+            ORDER BY created_at DESC, id DESC LIMIT ?
+        """, (driver_id, page_size + 1)).fetchall()
+    else:
+        rows = conn.execute("""
+            SELECT id, patient_name, hospital_name, severity_level, rfid1_number, rfid2_number,
+                   rfid_linked, created_at
+            FROM emergency_case
+            WHERE driver_id = ? AND (created_at, id) < (?, ?)
+            ORDER BY created_at DESC, id DESC LIMIT ?
+        """, (driver_id, cursor[0], cursor[1], page_size + 1)).fetchall()
+    cases = [dict(zip(CASE_COLUMNS, row)) for row in rows[:page_size]]
+    # One extra row tells us whether there is another page
+    next_cursor = encode_cursor(cases[-1]['created_at'], cases[-1]['id']) if len(rows) > page_size else None
+    return cases, next_cursor
+
+
+def fetch_reading_page(conn, cursor=None, page_size=PAGE_SIZE):
+    """One page of RFID readings, newest first: (readings, next cursor or None)"""
+    if cursor is None:
+        rows = conn.execute("""
+            SELECT id, rfid_number, reader_type, case_id, processed, timestamp
+            FROM rfid_reading
+            ORDER BY timestamp DESC, id DESC LIMIT ?
+        """, (page_size + 1,)).fetchall()
+    else:
+        rows = conn.execute("""
+            SELECT id, rfid_number, reader_type, case_id, processed, timestamp
+            FROM rfid_reading
+            WHERE (timestamp, id) < (?, ?)
+            ORDER BY timestamp DESC, id DESC LIMIT ?
+        """, (cursor[0], cursor[1], page_size + 1)).fetchall()
+    readings = [dict(zip(READING_COLUMNS, row)) for row in rows[:page_size]]
+    next_cursor = encode_cursor(readings[-1]['timestamp'], readings[-1]['id']) if len(rows) > page_size else None
+    return readings, next_cursor
 
 # ============================================================================
 # FLASK ROUTES
@@ -324,11 +225,9 @@ def login():
             password = request.form.get('password')
 
             # Check credentials using direct database query
-            conn = sqlite3.connect(DB_PATH)
-            c = conn.cursor()
-            c.execute("SELECT password_hash, name FROM driver WHERE driver_id = ?", (driver_id,))
-            result = c.fetchone()
-            conn.close()
+            with connection() as conn:
+                result = conn.execute("SELECT password_hash, name FROM driver WHERE driver_id = ?",
+                                      (driver_id,)).fetchone()
 
             if result and pbkdf2_sha256.verify(password, result[0]):
                 session['driver_id'] = driver_id
@@ -387,41 +286,23 @@ def dashboard():
 
         return redirect(url_for('dashboard'))
 
-    # Get cases for current driver
+    # Get one page of the current driver's cases
+    next_cursor = None
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("""
-            SELECT id, patient_name, hospital_name, severity_level, rfid1_number, rfid2_number, 
-                   rfid_linked, created_at 
-            FROM emergency_case 
-            WHERE driver_id = ? 
-            ORDER BY created_at DESC
-        """, (session['driver_id'],))
-        
-        cases_data = c.fetchall()
-        conn.close()
-        
-        # Convert to dict format
+        cursor, page_size = page_args()
+        with connection() as conn:
+            cases, next_cursor = fetch_case_page(conn, session['driver_id'], cursor, page_size)
+    except ValueError as e:
+        print(f"Error fetching cases: {e}")
         cases = []
-        for case in cases_data:
-            cases.append({
-                'id': case[0],
-                'patient_name': case[1],
-                'hospital_name': case[2],
-                'severity_level': case[3],
-                'rfid1_number': case[4],
-                'rfid2_number': case[5],
-                'rfid_linked': case[6],
-                'created_at': case[7]
-            })
-        
+        flash('Invalid page link', 'error')
     except Exception as e:
         print(f"Error fetching cases: {e}")
         cases = []
         flash('Error loading cases', 'error')
 
-    return render_template('dashboard.html', cases=cases)
+    return render_template('dashboard.html', cases=cases, next_cursor=next_cursor,
+                           paged='cursor' in request.args)
 
 @app.route('/logout')
 def logout():
@@ -429,27 +310,62 @@ def logout():
     flash('Logged out successfully!', 'success')
     return redirect(url_for('login'))
 
+# Offered when there is no hospital list or the browser sent no location
+FALLBACK_HOSPITALS = [
+    "City General Hospital",
+    "Metro Medical Center",
+    "Emergency Care Hospital",
+    "Central District Hospital",
+    "Regional Medical Center",
+    "St. Mary's Hospital",
+    "General Hospital",
+    "Community Health Center",
+    "University Medical Center",
+    "Sacred Heart Hospital",
+    "Apollo Hospital",
+    "Fortis Hospital",
+    "Max Healthcare",
+    "Manipal Hospital",
+    "Columbia Asia Hospital"
+]
+
 @app.route('/get_nearby_hospitals', methods=['POST'])
 def get_nearby_hospitals():
-    """Fixed hospital list"""
-    hospitals = [
-        "City General Hospital",
-        "Metro Medical Center",
-        "Emergency Care Hospital",
-        "Central District Hospital",
-        "Regional Medical Center",
-        "St. Mary's Hospital",
-        "General Hospital",
-        "Community Health Center",
-        "University Medical Center",
-        "Sacred Heart Hospital",
-        "Apollo Hospital",
-        "Fortis Hospital",
-        "Max Healthcare",
-        "Manipal Hospital",
-        "Columbia Asia Hospital"
-    ]
-    return jsonify({'hospitals': hospitals})
+    """Nearest hospitals to the ambulance, with distances"""
+    data = request.get_json(silent=True) or {}
+    try:
+        latitude, longitude = float(data['latitude']), float(data['longitude'])
+    except (KeyError, TypeError, ValueError):
+        latitude = longitude = None
+    limit = data.get('limit')
+    try:
+        k = DEFAULT_K if limit is None else min(max(int(limit), 1), 50)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'limit must be a whole number'}), 400
+
+    if latitude is not None and not (math.isfinite(latitude) and math.isfinite(longitude)
+                                     and -90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return jsonify({'error': 'latitude must be within [-90, 90] and longitude within [-180, 180]'}), 400
+
+    if hospital_index is None or latitude is None or not len(hospital_index):
+        # No hospital list (or no location) - fall back to the fixed names
+        return jsonify({'hospitals': FALLBACK_HOSPITALS, 'results': []})
+
+    nearest = hospital_index.nearest(latitude, longitude, k)
+    return jsonify({
+        'hospitals': [hospital.name for _, hospital in nearest],
+        'results': [{
+            'name': hospital.name,
+            'latitude': hospital.latitude,
+            'longitude': hospital.longitude,
+            'distance_km': round(distance, 2),
+        } for distance, hospital in nearest],
+    })
+
+@app.route('/api/hospital_index')
+def api_hospital_index():
+    """Hospital index size and result-cache counters"""
+    return jsonify(hospital_index.stats() if hospital_index else {'hospitals': 0})
 
 @app.route('/rfid_status')
 def rfid_status():
@@ -457,54 +373,13 @@ def rfid_status():
     if 'driver_id' not in session:
         return redirect(url_for('login'))
 
+    readings_next = cases_next = None
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        
-        # Get recent RFID readings
-        c.execute("""
-            SELECT id, rfid_number, reader_type, case_id, processed, timestamp 
-            FROM rfid_reading 
-            ORDER BY timestamp DESC LIMIT 20
-        """)
-        readings_data = c.fetchall()
-        
-        # Get cases for current driver
-        c.execute("""
-            SELECT id, patient_name, hospital_name, severity_level, rfid1_number, rfid2_number, 
-                   rfid_linked, created_at 
-            FROM emergency_case 
-            WHERE driver_id = ? 
-            ORDER BY created_at DESC
-        """, (session['driver_id'],))
-        cases_data = c.fetchall()
-        
-        conn.close()
-        
-        # Convert to dict format
-        readings = []
-        for reading in readings_data:
-            readings.append({
-                'id': reading[0],
-                'rfid_number': reading[1],
-                'reader_type': reading[2],
-                'case_id': reading[3],
-                'processed': reading[4],
-                'timestamp': reading[5]
-            })
-        
-        cases = []
-        for case in cases_data:
-            cases.append({
-                'id': case[0],
-                'patient_name': case[1],
-                'hospital_name': case[2],
-                'severity_level': case[3],
-                'rfid1_number': case[4],
-                'rfid2_number': case[5],
-                'rfid_linked': case[6],
-                'created_at': case[7]
-            })
+        readings_cursor, page_size = page_args('readings_cursor')
+        cases_cursor, _ = page_args('cases_cursor')
+        with connection() as conn:
+            readings, readings_next = fetch_reading_page(conn, readings_cursor, page_size)
+            cases, cases_next = fetch_case_page(conn, session['driver_id'], cases_cursor, page_size)
         
     except Exception as e:
         print(f"Error in rfid_status: {e}")
@@ -512,61 +387,167 @@ def rfid_status():
         cases = []
         flash('Error loading RFID status', 'error')
 
-    return render_template('rfid_status.html', readings=readings, cases=cases)
+    return render_template('rfid_status.html', readings=readings, cases=cases,
+                           readings_next=readings_next, cases_next=cases_next)
 
 @app.route('/api/rfid_readings')
 def api_rfid_readings():
-    """API endpoint for RFID readings"""
+    """API endpoint for RFID readings (?page_size=&cursor= for older pages)"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("""
-            SELECT id, rfid_number, reader_type, case_id, processed, timestamp 
-            FROM rfid_reading 
-            ORDER BY timestamp DESC LIMIT 10
-        """)
-        readings_data = c.fetchall()
-        conn.close()
-        
-        readings = []
-        for reading in readings_data:
-            readings.append({
-                'id': reading[0],
-                'rfid_number': reading[1],
-                'reader_type': reading[2],
-                'case_id': reading[3],
-                'processed': reading[4],
-                'timestamp': reading[5]
-            })
-        
-        return jsonify({'readings': readings})
+        cursor, page_size = page_args(default_size=10)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        with connection() as conn:
+            readings, next_cursor = fetch_reading_page(conn, cursor, page_size)
+        return jsonify({'readings': readings, 'next_cursor': next_cursor})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/start_rfid_readers')
-def start_rfid_readers():
-    """Start RFID readers"""
-    try:
-        rfid1_thread = threading.Thread(target=rfid1_reader.start_reading, daemon=True)
-        rfid1_thread.start()
+# Most rows /api/rfid_history returns (the newest ones)
+HISTORY_LIMIT = 1000
 
-        rfid2_thread = threading.Thread(target=rfid2_reader.start_reading, daemon=True)
-        rfid2_thread.start()
+@app.route('/api/rfid_history')
+def api_rfid_history():
+    """Your cases' readings of one tag (?rfid_number=&since=&until=), including archived days"""
+    if 'driver_id' not in session:
+        return jsonify({'error': 'login required'}), 401
+    rfid_number = request.args.get('rfid_number')
+    if not rfid_number:
+        return jsonify({'error': 'rfid_number is required'}), 400
+    try:
+        # Same scoping as /api/export: readings belong to a driver through their case
+        with connection() as conn:
+            case_ids = {row[0] for row in conn.execute(
+                "SELECT id FROM emergency_case WHERE driver_id = ?", (session['driver_id'],))}
+        rows = [row for row in history('rfid_reading', request.args.get('since'), request.args.get('until'),
+                                       rfid_number=rfid_number)
+                if row['case_id'] in case_ids]
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'readings': rows[-HISTORY_LIMIT:], 'total': len(rows)})
 
-        flash('RFID readers started successfully!', 'success')
+@app.route('/api/stats')
+def api_stats():
+    """Case/scan/reading counters and the last ?hours= (default 24) of hourly rollups"""
+    hours = request.args.get('hours', stats.DEFAULT_HOURS, type=int)
+    hours = max(1, min(hours, stats.MAX_HOURS))
+    try:
+        with connection() as conn:
+            return jsonify(stats.read_stats(conn, hours))
     except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/export/<table>')
+def api_export(table):
+    """Stream your rows of rfid_scans, rfid_reading or emergency_case (?format=csv|ndjson&since=&until=&archived=0)"""
+    if 'driver_id' not in session:
+        return jsonify({'error': 'login required'}), 401
+    fmt = request.args.get('format', 'csv')
+    try:
+        # Only the logged-in driver's cases (and their readings and tag scans);
+        # exporting everything is the CLI's job
+        chunks = export.export(table, fmt, request.args.get('since'), request.args.get('until'),
+                               session['driver_id'], archived=request.args.get('archived') != '0')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return app.response_class(chunks, mimetype=export.FORMATS[fmt], headers={
+        'Content-Disposition': f'attachment; filename="{table}.{fmt}"',
+        'X-Accel-Buffering': 'no',
+    })
+
+@app.route('/api/live')
+def api_live():
+    """Server-Sent Events stream of readings, your case links and priority activations"""
+    if 'driver_id' not in session:
+        return jsonify({'error': 'login required'}), 401
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    stream = live_feed.subscribe(session['driver_id'], last_event_id)
+    return app.response_class(stream_with_context(stream), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # Stop nginx from buffering the stream
+        'X-Accel-Buffering': 'no',
+    })
+
+@app.route('/api/live_feed')
+def api_live_feed():
+    """Broadcaster counters (subscribers, buffered events, DB queries)"""
+    return jsonify(live_feed.stats())
+
+def ingest_status():
+    """(status dict, None) from the ingest daemon, or (None, error message)"""
+    try:
+        return ingest_daemon.control('status'), None
+    except (ingest_daemon.DaemonNotRunning, OSError, ValueError) as e:
+        return None, str(e)
+
+def _ingest_reply(pick):
+    """JSON of pick(daemon status), or 503 if the daemon isn't answering"""
+    status, error = ingest_status()
+    if status is None:
+        return jsonify({'error': error}), 503
+    return jsonify(pick(status))
+
+@app.route('/api/ingest')
+def api_ingest():
+    """Everything the ingest daemon reports (readers, writer, dedup, linking)"""
+    return _ingest_reply(lambda status: status)
+
+@app.route('/api/scan_writer')
+def api_scan_writer():
+    """Queue depth and dropped-scan counters for the scan writer"""
+    return _ingest_reply(lambda status: status['scan_writer'])
+
+@app.route('/api/scan_dedup')
+def api_scan_dedup():
+    """Duplicate scans suppressed before they were saved"""
+    return _ingest_reply(lambda status: status['scan_dedup'])
+
+@app.route('/api/serial_ports')
+def api_serial_ports():
+    """Connection state and line counts for each serial RFID reader"""
+    return _ingest_reply(lambda status: {'ports': status['serial_ports']})
+
+@app.route('/api/spi_readers')
+def api_spi_readers():
+    """Poll and card counts for each MFRC522 reader"""
+    return _ingest_reply(lambda status: {'readers': status['spi_readers']})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint (covers every ETPS process on this host)"""
+    return app.response_class(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/start_rfid_readers')
+def start_rfid_readers():
+    """Ask the ingest daemon to start the RFID readers"""
+    try:
+        reply = ingest_daemon.control('start')
+        if not reply.get('ok'):
+            flash(f"Error starting RFID readers: {reply.get('error')}", 'error')
+        elif reply['started']:
+            flash('RFID readers started successfully!', 'success')
+        else:
+            flash('RFID readers are already running.', 'info')
+    except (ingest_daemon.DaemonNotRunning, OSError, ValueError) as e:
         flash(f'Error starting RFID readers: {e}', 'error')
 
     return redirect(url_for('dashboard'))
 
 @app.route('/stop_rfid_readers')
 def stop_rfid_readers():
-    """Stop RFID readers"""
+    """Ask the ingest daemon to stop the RFID readers"""
     try:
-        rfid1_reader.stop_reading()
-        rfid2_reader.stop_reading()
-        flash('RFID readers stopped.', 'info')
-    except Exception as e:
+        reply = ingest_daemon.control('stop', timeout=2 * STOP_TIMEOUT + 1)
+        if reply.get('ok'):
+            flash('RFID readers stopped.', 'info')
+        else:
+            flash(f"Error stopping RFID readers: {reply.get('error')}", 'error')
+    except (ingest_daemon.DaemonNotRunning, OSError, ValueError) as e:
         flash(f'Error stopping RFID readers: {e}', 'error')
 
     return redirect(url_for('dashboard'))
@@ -588,61 +569,70 @@ def test_rfid2():
 @app.route('/view_all_data')
 def view_all_data():
     """View all data in database"""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        
-        result = "<h1>Database Contents</h1>"
-        
-        # Show rfid_scans
-        c.execute("SELECT * FROM rfid_scans ORDER BY timestamp DESC LIMIT 10")
-        scans = c.fetchall()
-        result += "<h2>RFID Scans (Latest 10)</h2>"
-        for scan in scans:
-            result += f"<p>ID: {scan[0]}, Data: {scan[1]}, Source: {scan[2]}, Severity: {scan[3]}, Patient: {scan[4]}, Time: {scan[5]}</p>"
-        
-        # Show emergency cases
-        c.execute("SELECT * FROM emergency_case ORDER BY created_at DESC")
-        cases = c.fetchall()
-        result += "<h2>Emergency Cases</h2>"
-        for case in cases:
-            result += f"<p>ID: {case[0]}, Patient: {case[1]}, Hospital: {case[2]}, Severity: {case[3]}, Driver: {case[4]}, RFID1: {case[5]}, RFID2: {case[6]}, Linked: {case[7]}, Time: {case[8]}</p>"
-        
-        # Show rfid readings
-        c.execute("SELECT * FROM rfid_reading ORDER BY timestamp DESC LIMIT 10")
-        readings = c.fetchall()
-        result += "<h2>RFID Readings (Latest 10)</h2>"
-        for reading in readings:
-            result += f"<p>ID: {reading[0]}, RFID: {reading[1]}, Type: {reading[2]}, Case: {reading[3]}, Time: {reading[4]}, Processed: {reading[5]}</p>"
-        
-        conn.close()
-        return result
-        
-    except Exception as e:
-        return f"Error viewing data: {e}"
+    def sections():
+        yield "<h1>Database Contents</h1>"
+        with connection() as conn:
+            scans = conn.execute("SELECT * FROM rfid_scans ORDER BY timestamp DESC LIMIT 10").fetchall()
+        yield "<h2>RFID Scans (Latest 10)</h2>"
+        yield "".join(f"<p>ID: {scan[0]}, Data: {scan[1]}, Source: {scan[2]}, Severity: {scan[3]}, Patient: {scan[4]}, Time: {scan[5]}</p>"
+                      for scan in scans)
+
+        # Every case, newest first, streamed a chunk at a time: keyset reads
+        # on (created_at, id), so no read stays open while the page is sent
+        yield "<h2>Emergency Cases</h2>"
+        after = None
+        while True:
+            with connection() as conn:
+                if after is None:
+                    cases = conn.execute("""
+                        SELECT * FROM emergency_case
+                        ORDER BY created_at DESC, id DESC LIMIT ?
+                    """, (export.CHUNK_ROWS,)).fetchall()
+                else:
+                    cases = conn.execute("""
+                        SELECT * FROM emergency_case WHERE (created_at, id) < (?, ?)
+                        ORDER BY created_at DESC, id DESC LIMIT ?
+                    """, (*after, export.CHUNK_ROWS)).fetchall()
+            yield "".join(f"<p>ID: {case[0]}, Patient: {case[1]}, Hospital: {case[2]}, Severity: {case[3]}, Driver: {case[4]}, RFID1: {case[5]}, RFID2: {case[6]}, Linked: {case[7]}, Time: {case[8]}</p>"
+                          for case in cases)
+            if len(cases) < export.CHUNK_ROWS:
+                break
+            after = (cases[-1][8], cases[-1][0])
+
+        with connection() as conn:
+            readings = conn.execute("SELECT * FROM rfid_reading ORDER BY timestamp DESC LIMIT 10").fetchall()
+        yield "<h2>RFID Readings (Latest 10)</h2>"
+        yield "".join(f"<p>ID: {reading[0]}, RFID: {reading[1]}, Type: {reading[2]}, Case: {reading[3]}, Time: {reading[4]}, Processed: {reading[5]}</p>"
+                      for reading in readings)
+        yield "<h2>Export</h2>"
+        yield "".join(f'<p>{table}: <a href="/api/export/{table}">CSV</a> <a href="/api/export/{table}?format=ndjson">NDJSON</a></p>'
+                      for table in export.TABLES)
+
+    def page():
+        # Headers are already sent by the time a read fails - say so in the page
+        try:
+            yield from sections()
+        except Exception as e:
+            yield f"<p>Error viewing data: {e}</p>"
+
+    return app.response_class(page(), mimetype='text/html')
 
 @app.route('/test')
 def test_page():
     """Test page"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        
-        c.execute("SELECT COUNT(*) FROM emergency_case")
-        case_count = c.fetchone()[0]
-        
-        c.execute("SELECT COUNT(*) FROM rfid_reading")
-        rfid_count = c.fetchone()[0]
-        
-        c.execute("SELECT COUNT(*) FROM rfid_scans")
-        scan_count = c.fetchone()[0]
-        
-        conn.close()
+        with connection() as conn:
+            counts = stats.hot_rows(conn)
+        case_count = counts.get('emergency_case', 0)
+        rfid_count = counts.get('rfid_reading', 0)
+        scan_count = counts.get('rfid_scans', 0)
         
     except Exception as e:
         case_count = f"Error: {e}"
         rfid_count = "Error"
         scan_count = "Error"
+    status, error = ingest_status()
+    ingest_summary = f"running {status['readers_running']}, pid {status['pid']}" if status else error
 
     return f"""
     <h1>Emergency System - Fixed Database Version</h1>
@@ -652,6 +642,7 @@ def test_page():
     <p>Total RFID Readings: {rfid_count}</p>
     <p>Total RFID Scans: {scan_count}</p>
     <p>RFID Libraries Available: {RFID_AVAILABLE}</p>
+    <p>Ingest Daemon: {ingest_summary}</p>
     <hr>
     <h2>Test Login:</h2>
     <p>Driver ID: <code>driver123</code></p>
@@ -663,6 +654,8 @@ def test_page():
     <p><a href="/stop_rfid_readers">Stop RFID Readers</a></p>
     <p><a href="/rfid_status">View RFID Status</a></p>
     <p><a href="/api/rfid_readings">API: Recent RFID Readings</a></p>
+    <p><a href="/api/ingest">API: Ingest Daemon Status</a></p>
+    <p><a href="/api/stats">API: Counters and Hourly Rollups</a></p>
     <hr>
     <h2>Debug:</h2>
     <p><a href="/test_rfid2">Test RFID2 Save</a></p>
@@ -673,22 +666,27 @@ def test_page():
 # RUN THE APPLICATION
 # ============================================================================
 
+def start_ingest_daemon():
+    """Run ingest_daemon.py as a child process unless one is already up"""
+    if ingest_daemon.running():
+        print("Ingest daemon already running")
+        return None
+    daemon = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ingest_daemon.py')])
+    atexit.register(daemon.terminate)
+    print(f"Started ingest daemon (pid {daemon.pid})")
+    return daemon
+
 if __name__ == '__main__':
     # Initialize database first
     print("Initializing database...")
     init_db()
-    
-    # Start RFID readers automatically
-    try:
-        rfid1_thread = threading.Thread(target=rfid1_reader.start_reading, daemon=True)
-        rfid1_thread.start()
 
-        rfid2_thread = threading.Thread(target=rfid2_reader.start_reading, daemon=True)
-        rfid2_thread.start()
-
-        print("RFID readers started in background threads")
+    # Development convenience: the readers run in their own process, as they
+    # do under gunicorn (see gunicorn.conf.py and the README)
+    try:
+        start_ingest_daemon()
     except Exception as e:
-        print(f"Could not start RFID readers: {e}")
+        print(f"Could not start ingest daemon: {e}")
 
     # Run Flask app
     app.run(host='0.0.0.0', port=5000, ssl_context=('cert.pem', 'key.pem'))
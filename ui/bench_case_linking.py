@@ -0,0 +1,173 @@
+"""Case-linking stress benchmark: parallel readers against one database.
+
+Each thread is an ambulance.  Every round all of them create a case, then
+all scan their tag at reader 1 at the same moment, then - after another
+driver has created a case that is waiting for reader 1 - read the same tag
+at reader 1 again (as happens once the dedup window has passed), then all
+scan at reader 2.  Scans go through ingest.save_rfid_to_db, one immediate
+transaction each.  The scenario runs with the old linking code (newest
+unlinked case, up to eight statements per scan) and with CaseLinker, each
+in a fresh process and database:
+
+    python bench_case_linking.py --threads 8 --rounds 50
+
+Reported per mode: scans per second while scanning, and link correctness -
+cases that got both tags, tags whose reads ended up in different cases,
+reads that linked to nothing although a case was waiting, and slots of the
+other drivers' cases taken by a re-read.  Exits non-zero if CaseLinker gets
+any of them wrong (the old code is only reported).
+"""
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+UI_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def legacy_record_rfid_scan(c, rfid_number, reader_type, read_at=None):
+    """ingest.record_rfid_scan before CaseLinker (kept here for comparison)"""
+    from datetime import datetime
+    from ingest import SavedScan
+    read_at = read_at or time.time()
+    c.execute("INSERT INTO rfid_reading (rfid_number, reader_type, timestamp) VALUES (?, ?, ?)",
+              (rfid_number, reader_type, datetime.fromtimestamp(read_at)))
+    reading_id = c.lastrowid
+    c.execute("INSERT INTO rfid_scans (data, source, read_at) VALUES (?, ?, ?)",
+              (rfid_number, f"Signal {1 if reader_type == 'rfid1' else 2}", read_at))
+    c.execute("""
+        SELECT id FROM emergency_case
+        WHERE (rfid1_number IS NULL OR rfid2_number IS NULL)
+        ORDER BY created_at DESC LIMIT 1
+    """)
+    recent_case = c.fetchone()
+    linked = None
+    if recent_case:
+        case_id = recent_case[0]
+        column = 'rfid1_number' if reader_type == 'rfid1' else 'rfid2_number'
+        c.execute(f"SELECT {column} FROM emergency_case WHERE id = ?", (case_id,))
+        if c.fetchone()[0] is None:
+            c.execute(f"UPDATE emergency_case SET {column} = ? WHERE id = ?", (rfid_number, case_id))
+            c.execute("UPDATE rfid_reading SET case_id = ?, processed = 1 WHERE id = ?", (case_id, reading_id))
+            linked = case_id
+        c.execute("SELECT rfid1_number, rfid2_number FROM emergency_case WHERE id = ?", (case_id,))
+        rfid1, rfid2 = c.fetchone()
+        if rfid1 and rfid2:
+            c.execute("UPDATE emergency_case SET rfid_linked = 1 WHERE id = ?", (case_id,))
+    return SavedScan(reading_id, linked, linked is not None)
+
+
+def run_single(mode, args):
+    workdir = tempfile.mkdtemp(prefix='etps-link-')
+    os.environ['ETPS_HAL'] = 'sim'
+    os.environ['ETPS_DB_PATH'] = os.path.join(workdir, 'rfid_logs.db')
+    os.environ['ETPS_SOCKET_DIR'] = os.path.join(workdir, 'sock')
+    sys.path.insert(0, UI_DIR)
+
+    quiet = open(os.devnull, 'w')
+    with contextlib.redirect_stdout(quiet):
+        import app
+        import ingest
+        from db import connection
+        app.init_db()
+        if mode == 'legacy':
+            ingest.record_rfid_scan = legacy_record_rfid_scan
+
+    barrier = threading.Barrier(args.threads)
+    scan_seconds = [0.0]
+    phase_started = [0.0]
+    failures = []
+
+    def ambulance(k):
+        for round_no in range(args.rounds):
+            tag = f"{k:03d}{round_no:05d}"
+            app.save_emergency_case_direct(f"Patient {k}-{round_no}", 'Bench Hospital', 3, f"driver{k}")
+            for step, reader in enumerate(('rfid1', 'rfid1', 'rfid2')):
+                if step == 1:
+                    # Someone else's case, waiting for its reader 1 tag
+                    app.save_emergency_case_direct(f"Other {k}-{round_no}", 'Bench Hospital', 3, f"other{k}")
+                if barrier.wait() == 0:
+                    phase_started[0] = time.perf_counter()
+                if not ingest.save_rfid_to_db(tag, reader):
+                    failures.append((tag, reader))
+                if barrier.wait() == 0:
+                    scan_seconds[0] += time.perf_counter() - phase_started[0]
+
+    threads = [threading.Thread(target=ambulance, args=(k,)) for k in range(args.threads)]
+    with contextlib.redirect_stdout(quiet):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    with connection() as conn:
+        cases = conn.execute("SELECT id, rfid1_number, rfid2_number FROM emergency_case WHERE driver_id LIKE 'driver%'").fetchall()
+        stolen = conn.execute("""
+            SELECT COUNT(*) FROM emergency_case
+            WHERE driver_id LIKE 'other%' AND (rfid1_number IS NOT NULL OR rfid2_number IS NOT NULL)
+        """).fetchone()[0]
+        reading_cases = conn.execute("SELECT rfid_number, case_id FROM rfid_reading").fetchall()
+        unlinked_reads = conn.execute("SELECT COUNT(*) FROM rfid_reading WHERE case_id IS NULL").fetchone()[0]
+        link_events = conn.execute("SELECT COUNT(*) FROM change_log WHERE table_name = 'emergency_case' AND op = 'link'").fetchone()[0]
+
+    case_of = {}
+    for case_id, rfid1, rfid2 in cases:
+        for slot, uid in (('rfid1', rfid1), ('rfid2', rfid2)):
+            if uid:
+                case_of[(uid, slot)] = case_id
+    tags = {uid for uid, _ in case_of}
+    cases_of_tag = {}
+    for uid, case_id in reading_cases:
+        cases_of_tag.setdefault(uid, set()).add(case_id)
+    scans = args.threads * args.rounds * 3
+    report = {
+        'mode': mode,
+        'threads': args.threads,
+        'scans': scans,
+        'scans_per_s': round(scans / scan_seconds[0], 1),
+        'cases': len(cases),
+        'cases_fully_linked': sum(1 for _, rfid1, rfid2 in cases if rfid1 and rfid2),
+        'split_tags': sum(1 for uid in tags if case_of.get((uid, 'rfid1')) != case_of.get((uid, 'rfid2')))
+                      + sum(1 for ids in cases_of_tag.values() if len(ids) > 1),
+        # Each round has a waiting case for every read, so this should be 0
+        'reads_not_linked': unlinked_reads,
+        # change_log rows written by the case link trigger
+        'case_link_events': link_events,
+        # Other drivers' cases that a re-read tag linked to
+        'stolen_slots': stolen,
+        'failed_scans': len(failures),
+    }
+    report['ok'] = (report['cases_fully_linked'] == args.threads * args.rounds and report['split_tags'] == 0
+                    and unlinked_reads == 0 and stolen == 0 and not failures)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_single(args.mode, args)))
+        return
+
+    runs = []
+    for mode in ('legacy', 'case_linker'):
+        child = [sys.executable, os.path.abspath(__file__), '--mode', mode,
+                 '--threads', str(args.threads), '--rounds', str(args.rounds)]
+        output = subprocess.run(child, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    ok = all(run['ok'] for run in runs if run['mode'] == 'case_linker')
+    print(json.dumps({'benchmark': 'case_linking', 'runs': runs, 'ok': ok}, indent=2))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Stuck-tag benchmark: DB rows written with and without scan deduplication.
+
+A tag left on reader 1 is read --rate times a second for --seconds, while a
+few other tags pass by.  Scans go through ingest.ingest_scan and the scan
+writer into a scratch database; every rfid_scans row is also one decision
+for the priority controller.  Rows written per second should stay flat with
+dedup on and grow with the scan count with it off:
+
+    python bench_dedup.py --rate 20 --seconds 10
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+UI_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rate', type=float, default=20, help='reads per second of the stuck tag')
+    parser.add_argument('--seconds', type=int, default=10)
+    parser.add_argument('--passing', type=float, default=1, help='other tags per second')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='etps-dedup-')
+    os.environ['ETPS_HAL'] = 'sim'
+    os.environ['ETPS_DB_PATH'] = os.path.join(workdir, 'rfid_logs.db')
+    os.environ['ETPS_SOCKET_DIR'] = os.path.join(workdir, 'sock')
+    sys.path.insert(0, UI_DIR)
+
+    quiet = open(os.devnull, 'w')
+    with contextlib.redirect_stdout(quiet):
+        import app
+        import ingest
+        from db import connection
+        from dedup import ScanDedup
+        app.init_db()
+        ingest.scan_writer.start()
+
+    def count_rows():
+        with connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM rfid_scans").fetchone()[0]
+
+    runs = []
+    for mode, ttl in (('dedup', None), ('no_dedup', 0)):
+        ingest.scan_dedup = ScanDedup() if ttl is None else ScanDedup(ttl=ttl)
+        rows_per_second = []
+        reads = 0
+        passing = 0
+        with contextlib.redirect_stdout(quiet):
+            for second in range(args.seconds):
+                before = count_rows()
+                end = time.monotonic() + 1
+                next_passing = time.monotonic()
+                while time.monotonic() < end:
+                    ingest.ingest_scan('999000000001', 'rfid1', time.time())
+                    reads += 1
+                    if args.passing and time.monotonic() >= next_passing:
+                        passing += 1
+                        ingest.ingest_scan(f"{mode}-{passing}", 'rfid2', time.time())
+                        next_passing += 1 / args.passing
+                    time.sleep(1 / args.rate)
+                # Let the writer's batch window close before counting
+                time.sleep(0.05)
+                rows_per_second.append(count_rows() - before)
+        runs.append({
+            'mode': mode,
+            'stuck_tag_reads': reads,
+            'passing_tags': passing,
+            'rows_written': sum(rows_per_second),
+            'rows_per_second': rows_per_second,
+            'dedup': ingest.scan_dedup.stats(),
+        })
+
+    with contextlib.redirect_stdout(quiet):
+        ingest.scan_writer.stop()
+    print(json.dumps({'benchmark': 'stuck_tag_dedup', 'settings': vars(args), 'runs': runs}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+"""End-to-end scan benchmark: simulated tag -> DB -> priority controller -> lamp.
+
+Runs the real pipeline on simulated hardware (hal.py): ingest.py's RFID1Reader
+and RFID2Reader read scripted tags, the scan writer commits them,
+PriorityTrafficController picks them up from the change feed and drives the
+simulated GPIO.  Every rate runs in a fresh process against a fresh
+database, and the report is JSON so results can be diffed between commits:
+
+    python bench_e2e.py --rates 1,10,100 --seconds 20 --out e2e.json
+
+Latencies (ms) are measured from the moment the tag reaches the reader:
+    read     - the reader loop has picked it up
+    decision - controller has decided (priority or denial)
+    white    - the signal's white lamp is lit (new priority only; includes
+               the yellow clearance if --clearance > 0)
+"""
+import argparse
+import bisect
+import collections
+import contextlib
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+UI_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SEVERITY_MIX = '1:0.1,2:0.2,3:0.4,4:0.2,5:0.1'
+
+
+def percentiles(values):
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+
+    def pick(pct):
+        return round(ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))], 3)
+
+    return {'count': len(ordered), 'p50': pick(50), 'p95': pick(95), 'p99': pick(99),
+            'max': round(ordered[-1], 3)}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        level, weight = part.split(':')
+        mix[int(level)] = float(weight)
+    return mix
+
+
+def make_arrivals(rng, rate, seconds, share, known_tags, known_fraction):
+    """Poisson arrivals for one reader: (offset seconds, uid)"""
+    arrivals = []
+    at = 0.0
+    rate = rate * share
+    if rate <= 0:
+        return arrivals
+    while True:
+        at += rng.expovariate(rate)
+        if at >= seconds:
+            return arrivals
+        if known_tags and rng.random() < known_fraction:
+            uid = rng.choice(known_tags)
+        else:
+            uid = str(rng.randrange(10 ** 11, 10 ** 12))
+        arrivals.append((at, uid))
+
+
+def db_size(path):
+    """(database file bytes, WAL bytes)"""
+    return tuple(os.path.getsize(p) if os.path.exists(p) else 0 for p in (path, path + '-wal'))
+
+
+def run_single(args):
+    """One rate, in this process; returns the result dict"""
+    workdir = tempfile.mkdtemp(prefix='etps-bench-')
+    os.environ['ETPS_HAL'] = 'sim'
+    os.environ['ETPS_SIM_DWELL'] = str(args.dwell)
+    os.environ['ETPS_DB_PATH'] = os.path.join(workdir, 'rfid_logs.db')
+    os.environ['ETPS_SOCKET_DIR'] = os.path.join(workdir, 'sock')
+    sys.path.insert(0, UI_DIR)
+
+    quiet = open(os.devnull, 'w')
+    with contextlib.redirect_stdout(quiet):
+        import app
+        import hal
+        import ingest
+        from brandnewpriority import SIGNALS, PriorityTrafficController
+        from db import connection, transaction
+
+        app.init_db()
+
+        # Known tags: fully linked cases, so unknown tags can't link to them
+        rng = random.Random(args.seed)
+        mix = parse_mix(args.severity_mix)
+        levels, weights = list(mix), list(mix.values())
+        known = {1: [], 2: []}
+        with transaction() as conn:
+            for i in range(args.cases):
+                tag1 = str(rng.randrange(10 ** 11, 10 ** 12))
+                tag2 = str(rng.randrange(10 ** 11, 10 ** 12))
+                conn.execute("""
+                    INSERT INTO emergency_case
+                        (patient_name, hospital_name, severity_level, driver_id,
+                         rfid1_number, rfid2_number, rfid_linked, created_at)
+                    VALUES (?, 'Bench Hospital', ?, 'driver123', ?, ?, 1, datetime('now'))
+                """, (f"Bench {i}", rng.choices(levels, weights)[0], tag1, tag2))
+                known[1].append(tag1)
+                known[2].append(tag2)
+
+    outcomes = collections.Counter()
+    decisions = []   # (time, signal, uid, outcome)
+
+    class InstrumentedController(PriorityTrafficController):
+        def process_rfid_scan(self, scan_id, rfid_data, source, timestamp, severity_level):
+            self.outcome = None
+            super().process_rfid_scan(scan_id, rfid_data, source, timestamp, severity_level)
+            if severity_level is None:
+                self.outcome = 'unknown_tag'
+            outcomes[self.outcome] += 1
+            decisions.append((time.monotonic(), self.get_signal_number(source), rfid_data, self.outcome))
+
+        def activate_priority_signal(self, signal_num, priority_level, scan_time=None):
+            renewal = self.signals.priority_signal == signal_num and self.signals.lamps.get(signal_num) == 'white'
+            self.outcome = 'renewed' if renewal else 'activated'
+            super().activate_priority_signal(signal_num, priority_level, scan_time)
+
+        def flash_red_denial(self, signal_num):
+            self.outcome = self.outcome or 'denied'
+            super().flash_red_denial(signal_num)
+
+    with contextlib.redirect_stdout(quiet):
+        controller = InstrumentedController()
+        controller.priority_duration = args.hold
+        controller.signals.clearance = args.clearance
+
+        arrivals = {
+            1: make_arrivals(rng, args.rate, args.seconds, args.split, known[1], args.known),
+            2: make_arrivals(rng, args.rate, args.seconds, 1 - args.split, known[2], args.known),
+        }
+        offered = sum(len(a) for a in arrivals.values())
+        scripts = {
+            1: hal.script('serial:/dev/ttyUSB0', arrivals[1]),
+            2: hal.script('mfrc522:0.0', arrivals[2]),
+        }
+        size_before = db_size(os.environ['ETPS_DB_PATH'])
+        with connection() as conn:
+            rows_before = conn.execute("SELECT COUNT(*) FROM rfid_scans").fetchone()[0]
+
+        cpu_started = time.process_time()
+        started = time.monotonic()
+        ingest.scan_writer.start()
+        threads = [
+            threading.Thread(target=controller.run, daemon=True),
+            threading.Thread(target=ingest.rfid1_reader.start_reading, daemon=True),
+            threading.Thread(target=ingest.rfid2_reader.start_reading, daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+
+        # Let the scripts finish, then give the pipeline time to catch up
+        time.sleep(args.seconds)
+        deadline = time.monotonic() + args.drain
+        while len(decisions) < offered and time.monotonic() < deadline:
+            time.sleep(0.05)
+        wall = time.monotonic() - started
+        cpu = time.process_time() - cpu_started
+
+        ingest.rfid1_reader.stop_reading()
+        ingest.rfid2_reader.stop_reading()
+        controller.stop()
+        threads[0].join(timeout=5)
+
+        with connection() as conn:
+            rows_after = conn.execute("SELECT COUNT(*) FROM rfid_scans").fetchone()[0]
+        size_after = db_size(os.environ['ETPS_DB_PATH'])
+
+    # Match each decision to the oldest undecided delivery of the same tag
+    pending = collections.defaultdict(collections.deque)
+    for signal, script in scripts.items():
+        for arrived, read, uid in script.delivered:
+            pending[(signal, uid)].append((arrived, read))
+
+    white_rises = {signal: [t for t, pin, level in hal.GPIO.transitions
+                            if pin == SIGNALS[signal]['white'] and level == hal.GPIO.HIGH]
+                   for signal in SIGNALS}
+
+    read_ms, decision_ms, white_ms = [], [], []
+    for at, signal, uid, outcome in decisions:
+        queue = pending.get((signal, uid))
+        if not queue:
+            continue
+        arrived, read = queue.popleft()
+        read_ms.append((read - arrived) * 1000)
+        decision_ms.append((at - arrived) * 1000)
+        if outcome == 'activated':
+            rises = white_rises[signal]
+            i = bisect.bisect_left(rises, at - 0.001)
+            if i < len(rises):
+                white_ms.append((rises[i] - arrived) * 1000)
+
+    return {
+        'rate_per_s': args.rate,
+        'seconds': args.seconds,
+        'scans_offered': offered,
+        'scans_read': {f"rfid{signal}": f"{len(s.delivered)}/{len(arrivals[signal])}"
+                       for signal, s in scripts.items()},
+        # Cards that left the MFRC522 antenna before a poll saw them
+        'scans_missed': sum(len(s.missed) for s in scripts.values()),
+        'scans_decided': len(decisions),
+        'throughput_per_s': round(len(decisions) / wall, 2),
+        'outcomes': dict(outcomes),
+        'latency_ms': {
+            'read': percentiles(read_ms),
+            'decision': percentiles(decision_ms),
+            'white': percentiles(white_ms),
+        },
+        'db': {
+            'rows_added': rows_after - rows_before,
+            'file_bytes_added': size_after[0] - size_before[0],
+            # WAL frames are reused after each checkpoint; this is the high-water mark
+            'wal_bytes_added': size_after[1] - size_before[1],
+            'bytes_per_scan': round((sum(size_after) - sum(size_before)) / max(1, rows_after - rows_before), 1),
+        },
+        'cpu': {
+            'seconds': round(cpu, 3),
+            'share_of_one_core': round(cpu / wall, 4),
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        },
+        'scan_writer': ingest.scan_writer.stats(),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=UI_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rates', default='1,10,100', help='comma separated scans per second')
+    parser.add_argument('--seconds', type=float, default=10, help='length of each scan stream')
+    parser.add_argument('--split', type=float, default=0.5, help='share of scans at reader 1')
+    parser.add_argument('--known', type=float, default=0.8, help='share of scans from tags linked to a case')
+    parser.add_argument('--severity-mix', default=DEFAULT_SEVERITY_MIX, help='severity:weight,... of known tags')
+    parser.add_argument('--cases', type=int, default=50, help='linked cases to create')
+    parser.add_argument('--hold', type=float, default=10, help='priority hold seconds')
+    parser.add_argument('--clearance', type=float, default=0, help='yellow clearance seconds')
+    parser.add_argument('--dwell', type=float, default=0.5, help='seconds a card stays on the MFRC522')
+    parser.add_argument('--drain', type=float, default=15, help='max seconds to wait for the backlog')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help='also write the JSON report here')
+    parser.add_argument('--rate', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.rate is not None:
+        # Child process: one rate
+        print(json.dumps(run_single(args)))
+        return
+
+    settings = {key: value for key, value in vars(args).items() if key not in ('rate', 'rates', 'out')}
+    runs = []
+    for rate in args.rates.split(','):
+        child = [sys.executable, os.path.abspath(__file__), '--rate', rate]
+        for key, value in settings.items():
+            child += [f"--{key.replace('_', '-')}", str(value)]
+        output = subprocess.run(child, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    report = {
+        'benchmark': 'e2e_scan_to_lamp',
+        'commit': git_commit(),
+        'settings': settings,
+        'runs': runs,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Export benchmark: streaming export vs. reading everything first, under load.
+
+Fills a scratch database with --rows readings, then exports rfid_reading
+three ways while a separate process commits one scan at a time at
+--write-rate per second (as the ingest daemon does):
+
+    fetchall  - SELECT * ... fetchall() and one joined string, the way
+                view_all_data() built its page
+    cursor    - one long-lived cursor streamed to the end (one read
+                transaction for the whole export)
+    export    - export.export(), keyset chunks of CHUNK_ROWS rows
+
+    python bench_export.py --rows 1000000 --format csv
+
+Reported per method: rows/s, MB/s, peak Python memory (tracemalloc), the
+concurrent writer's commit latency percentiles and the WAL file size at the
+end (a read transaction held open stops checkpoints from resetting it).
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+UI_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def writer(db_path, rate, stop, results):
+    """Commit one rfid_scans row at a time, `rate` per second; report latencies"""
+    os.environ['ETPS_DB_PATH'] = db_path
+    sys.path.insert(0, UI_DIR)
+    from db import transaction
+    latencies, interval, n = [], 1.0 / rate, 0
+    next_at = time.monotonic()
+    while not stop.is_set():
+        started = time.perf_counter()
+        with transaction() as conn:
+            conn.execute("INSERT INTO rfid_scans (data, source) VALUES (?, ?)", (f"W{n}", 'Signal 1'))
+        latencies.append(time.perf_counter() - started)
+        n += 1
+        next_at += interval
+        time.sleep(max(0.0, next_at - time.monotonic()))
+    results.put(latencies)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * p))] * 1000, 2) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--format', default='csv', choices=('csv', 'ndjson'))
+    parser.add_argument('--write-rate', type=float, default=50, help='concurrent commits per second')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='etps-export-')
+    db_path = os.path.join(workdir, 'rfid_logs.db')
+    os.environ['ETPS_DB_PATH'] = db_path
+    os.environ['ETPS_SOCKET_DIR'] = os.path.join(workdir, 'sock')
+    os.environ['ETPS_ARCHIVE_DIR'] = os.path.join(workdir, 'archive')
+    sys.path.insert(0, UI_DIR)
+
+    quiet = open(os.devnull, 'w')
+    with contextlib.redirect_stdout(quiet):
+        from db import connection, transaction
+        from migrations import migrate
+        import export
+        migrate()
+
+    rng = random.Random(args.seed)
+    for start in range(0, args.rows, 50000):
+        with transaction() as conn:
+            conn.executemany("INSERT INTO rfid_reading (rfid_number, reader_type, case_id, timestamp) VALUES (?, ?, ?, ?)", [
+                (f"{rng.randrange(10**11, 10**12)}", rng.choice(('rfid1', 'rfid2')), rng.choice((None, rng.randrange(1, 1000))),
+                 f"2025-{1 + n * 12 // args.rows:02d}-{1 + n % 28:02d} {n % 24:02d}:{n % 60:02d}:{n % 59:02d}.{n % 999999:06d}")
+                for n in range(start, min(start + 50000, args.rows))
+            ])
+    with connection() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+    def fetchall_export(out):
+        with connection() as conn:
+            rows = conn.execute("SELECT * FROM rfid_reading ORDER BY timestamp, id").fetchall()
+        body = ''.join(f"{','.join('' if v is None else str(v) for v in row)}\n" for row in rows)
+        out.write(body)
+
+    def cursor_export(out):
+        columns, _ = export.rows('rfid_reading', archived=False)
+        with connection() as conn:
+            cursor = conn.execute("SELECT * FROM rfid_reading ORDER BY timestamp, id")
+            for chunk in export.CHUNKERS[args.format](columns, cursor, export.CHUNK_ROWS):
+                out.write(chunk)
+
+    def streaming_export(out):
+        for chunk in export.export('rfid_reading', args.format, archived=False):
+            out.write(chunk)
+
+    runs = []
+    for name, fn in (('fetchall', fetchall_export), ('cursor', cursor_export), ('export', streaming_export)):
+        stop, results = multiprocessing.Event(), multiprocessing.Queue()
+        load = multiprocessing.Process(target=writer, args=(db_path, args.write_rate, stop, results))
+        load.start()
+        time.sleep(0.5)
+        out_path = os.path.join(workdir, f"{name}.{args.format}")
+        tracemalloc.start()
+        started = time.perf_counter()
+        with open(out_path, 'w', newline='') as out:
+            fn(out)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        wal = os.path.getsize(db_path + '-wal') if os.path.exists(db_path + '-wal') else 0
+        time.sleep(0.5)
+        stop.set()
+        latencies = results.get()
+        load.join()
+        size = os.path.getsize(out_path)
+        runs.append({
+            'method': name,
+            'seconds': round(elapsed, 2),
+            'rows_per_s': round(args.rows / elapsed),
+            'mb_per_s': round(size / elapsed / 1e6, 1),
+            'output_mb': round(size / 1e6, 1),
+            'peak_python_mb': round(peak / 1e6, 1),
+            'writer_commits': len(latencies),
+            'writer_latency_ms': {'p50': percentile(latencies, 0.5), 'p99': percentile(latencies, 0.99),
+                                  'max': percentile(latencies, 1.0)},
+            'wal_mb_after': round(wal / 1e6, 1),
+        })
+        os.unlink(out_path)
+        with connection() as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+    print(json.dumps({'benchmark': 'export', 'settings': vars(args), 'runs': runs}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
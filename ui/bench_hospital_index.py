@@ -0,0 +1,134 @@
+"""Nearest-hospital benchmark: grid index vs. scanning every hospital.
+
+Builds a synthetic hospital list (--hospitals entries clustered around
+--cities random city centres, like real facility data) and asks for the
+--k nearest from ambulance positions that drift along random routes, the
+way repeated dashboard requests from a moving fleet do.  Every answer is
+checked against a brute-force scan of all hospitals:
+
+    python bench_hospital_index.py --hospitals 5000 --queries 20000
+
+Reported: microseconds per query for brute force, the index without its
+cache, and the index with the cache, plus mismatches against brute force
+(should be 0).  --write-csv saves the synthetic list in the format
+hospital_index.load_hospitals() reads.
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+UI_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, UI_DIR)
+
+from hospital_index import HospitalIndex, Hospital, haversine_km  # noqa: E402
+
+# Roughly India's bounding box
+LAT_RANGE = (8.0, 34.0)
+LON_RANGE = (69.0, 95.0)
+
+
+def synthetic_hospitals(count, cities, rng):
+    centres = [(rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)) for _ in range(cities)]
+    hospitals = []
+    for n in range(count):
+        if rng.random() < 0.8:
+            lat, lon = rng.choice(centres)
+            lat, lon = rng.gauss(lat, 0.15), rng.gauss(lon, 0.15)
+        else:
+            # Rural hospitals anywhere
+            lat, lon = rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)
+        hospitals.append(Hospital(f"Hospital {n:05d}", round(lat, 6), round(lon, 6)))
+    return hospitals, centres
+
+
+def ambulance_positions(count, centres, rng, fleet=50):
+    """Positions from a fleet driving ~50 m between requests"""
+    fleet = [list(rng.choice(centres)) for _ in range(fleet)]
+    positions = []
+    for n in range(count):
+        unit = fleet[n % len(fleet)]
+        unit[0] += rng.uniform(-0.0005, 0.0005)
+        unit[1] += rng.uniform(-0.0005, 0.0005)
+        positions.append(tuple(unit))
+    return positions
+
+
+def brute_force(hospitals, lat, lon, k):
+    return sorted((haversine_km(lat, lon, h.latitude, h.longitude), h) for h in hospitals)[:k]
+
+
+def timed(fn, positions):
+    latencies = []
+    answers = []
+    for lat, lon in positions:
+        started = time.perf_counter()
+        answers.append(fn(lat, lon))
+        latencies.append((time.perf_counter() - started) * 1e6)
+    latencies.sort()
+    return answers, {
+        'p50_us': round(statistics.median(latencies), 1),
+        'p99_us': round(latencies[int(len(latencies) * 0.99) - 1], 1),
+        'mean_us': round(statistics.fmean(latencies), 1),
+    }
+
+
+def same(a, b):
+    # Ties at equal distance may come back in either order
+    return [round(d, 9) for d, _ in a] == [round(d, 9) for d, _ in b]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hospitals', type=int, default=5000)
+    parser.add_argument('--cities', type=int, default=40)
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--brute-force-queries', type=int, default=1000,
+                        help='queries checked against a full scan (it is slow)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--write-csv', metavar='PATH')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    hospitals, centres = synthetic_hospitals(args.hospitals, args.cities, rng)
+    if args.write_csv:
+        with open(args.write_csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['name', 'latitude', 'longitude'])
+            writer.writerows(hospitals)
+
+    started = time.perf_counter()
+    index = HospitalIndex(hospitals)
+    build_ms = (time.perf_counter() - started) * 1000
+    uncached = HospitalIndex(hospitals, cache_size=0)
+
+    positions = ambulance_positions(args.queries, centres, rng)
+    checked = positions[:args.brute_force_queries]
+
+    expected, brute_timing = timed(lambda lat, lon: brute_force(hospitals, lat, lon, args.k), checked)
+    grid_answers, grid_timing = timed(lambda lat, lon: uncached.search(lat, lon, args.k), positions)
+    cached_answers, cached_timing = timed(lambda lat, lon: index.nearest(lat, lon, args.k), positions)
+
+    print(json.dumps({
+        'benchmark': 'hospital_index',
+        'settings': vars(args),
+        'build_ms': round(build_ms, 1),
+        'grid_cells': len(index.grid),
+        'brute_force': brute_timing,
+        'grid_uncached': grid_timing,
+        'grid_cached': cached_timing,
+        'mismatches_uncached': sum(not same(a, b) for a, b in zip(grid_answers, expected)),
+        'mismatches_cached': sum(not same(a, b) for a, b in zip(cached_answers, expected)),
+        # Cached vs uncached over every query, not just the brute-force sample
+        'mismatches_cache_vs_grid': sum(not same(a, b) for a, b in zip(cached_answers, grid_answers)),
+        'cache': index.stats(),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
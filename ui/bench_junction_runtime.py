@@ -0,0 +1,99 @@
+"""CPU and memory of junction_runtime.py with many simulated intersections.
+
+Generates N two-approach intersections on a SimulatedBackend, runs the real
+event loop on the wall clock and feeds it random priority scans from a
+second thread.  Phase timings can be scaled down with --speed to push more
+lamp changes per second than real traffic would:
+
+    python bench_junction_runtime.py --counts 10,100,500 --seconds 10 --speed 10
+"""
+import argparse
+import json
+import random
+import resource
+import threading
+import time
+
+from intersections import parse_intersection
+from junction_runtime import JunctionRuntime
+from signal_bank import SimulatedBackend
+
+
+def make_intersections(count, speed):
+    entries = []
+    for i in range(count):
+        base = 8 * i
+        entries.append({
+            'name': f"junction{i}",
+            'signals': {
+                '1': {'red': base, 'yellow': base + 1, 'green': base + 2, 'white': base + 3},
+                '2': {'red': base + 4, 'yellow': base + 5, 'green': base + 6, 'white': base + 7},
+            },
+            'readers': {f"junction{i}-a": '1', f"junction{i}-b": '2'},
+            'green': 5 / speed,
+            'yellow': 2 / speed,
+            'priority_hold': 10 / speed,
+            'clearance': 2 / speed,
+        })
+    return [parse_intersection(entry) for entry in entries]
+
+
+def feed_scans(runtime, channels, rate, seconds, seed):
+    rng = random.Random(seed)
+    end = time.monotonic() + seconds
+    sent = 0
+    while time.monotonic() < end:
+        time.sleep(rng.expovariate(rate))
+        runtime.submit(rng.choice(channels), f"TAG{sent:06d}")
+        sent += 1
+
+
+def run(count, args):
+    intersections = make_intersections(count, args.speed)
+    backend = SimulatedBackend()
+    runtime = JunctionRuntime(intersections, backend, verbose=False)
+    channels = list(runtime.routes)
+
+    loop = threading.Thread(target=runtime.run)
+    feeder = threading.Thread(target=feed_scans, args=(
+        runtime, channels, args.scans_per_junction * count / 60, args.seconds, args.seed))
+
+    started_cpu = time.process_time()
+    started = time.monotonic()
+    loop.start()
+    feeder.start()
+    feeder.join()
+    runtime.stop()
+    loop.join()
+    wall = time.monotonic() - started
+    cpu = time.process_time() - started_cpu
+    runtime.close()
+
+    return {
+        'intersections': count,
+        'wall_s': round(wall, 2),
+        'cpu_s': round(cpu, 3),
+        'cpu_share_of_one_core': round(cpu / wall, 4),
+        'lamp_changes': runtime.stats['lamp_changes'],
+        'scans': runtime.stats['scans'],
+        'pin_writes': backend.writes,
+        'max_lateness_ms': round(runtime.stats['max_lateness'] * 1000, 3),
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--counts', default='10,100,500', help='comma separated intersection counts')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--speed', type=float, default=1, help='divide all phase timings by this')
+    parser.add_argument('--scans-per-junction', type=float, default=1, help='priority scans per junction per minute')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    results = [run(int(count), args) for count in args.counts.split(',')]
+    print(json.dumps({'benchmark': 'junction_runtime', 'speed': args.speed, 'runs': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
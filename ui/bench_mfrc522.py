@@ -0,0 +1,118 @@
+"""MFRC522 detection benchmark against the simulated reader (hal.py).
+
+Cards arrive at random (Poisson) and stay on the antenna for --dwell
+seconds.  Each mode reads the same arrival script:
+
+    legacy   - the old RFID2Reader loop: blocking SimpleMFRC522-style read
+               (spins on Request/Anticoll), then sleep 1 s
+    poll@N   - MFRC522Poller polling N times a second
+
+    python bench_mfrc522.py --rate 60 --dwell 0.3 --seconds 15 --hz 5,20,50
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+os.environ['ETPS_HAL'] = 'sim'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import hal
+from intersections import SpiReader
+from mfrc522_poller import MFRC522Poller, uid_to_num
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))], 2)
+
+
+def legacy_loop(device, on_scan, stopping):
+    """RFID2Reader before the poller: read() blocks, then a 1 s sleep"""
+    while not stopping.is_set():
+        card = None
+        while card is None and not stopping.is_set():
+            status, _ = device.MFRC522_Request(device.PICC_REQIDL)
+            if status == device.MI_OK:
+                status, uid = device.MFRC522_Anticoll()
+                if status == device.MI_OK:
+                    card = uid_to_num(uid)
+        if card is not None:
+            on_scan('rfid2', str(card), time.time())
+        stopping.wait(1)
+
+
+def run_mode(mode, args):
+    arrivals = []
+    for at, uid in hal.poisson_arrivals(args.rate, seed=args.seed):
+        if at >= args.seconds:
+            break
+        arrivals.append((at, uid))
+    name = f"mfrc522:bench-{mode}"
+    script = hal.script(name, arrivals)
+    device = hal.SimulatedMFRC522(name, dwell=args.dwell)
+    reported = []
+
+    def on_scan(reader, uid, read_at):
+        reported.append(uid)
+
+    stopping = threading.Event()
+    if mode == 'legacy':
+        thread = threading.Thread(target=legacy_loop, args=(device, on_scan, stopping))
+        stop = stopping.set
+    else:
+        hz = float(mode.split('@')[1])
+        poller = MFRC522Poller([SpiReader(0, 0, 22, 'rfid2')], on_scan, poll_hz=hz,
+                               open_device=lambda bus, chip, pin_rst: device)
+        thread = threading.Thread(target=poller.run)
+        stop = poller.stop
+
+    cpu_started = time.process_time()
+    started = time.monotonic()
+    thread.start()
+    # Run past the last arrival so the final card can leave the antenna
+    time.sleep(args.seconds + args.dwell + 0.2)
+    stop()
+    thread.join()
+    wall = time.monotonic() - started
+    cpu = time.process_time() - cpu_started
+
+    latencies = [(read - arrived) * 1000 for arrived, read, uid in script.delivered]
+    return {
+        'mode': mode,
+        'cards_offered': len(arrivals),
+        'cards_detected': len(script.delivered),
+        'cards_missed': len(script.missed),
+        'detection_rate': round(len(script.delivered) / max(1, len(arrivals)), 4),
+        'scans_reported': len(reported),
+        'latency_ms': {'p50': percentile(latencies, 50), 'p99': percentile(latencies, 99)} if latencies else None,
+        'cpu_share_of_one_core': round(cpu / wall, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rate', type=float, default=60, help='cards per minute')
+    parser.add_argument('--dwell', type=float, default=0.3, help='seconds a card stays on the antenna')
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--hz', default='5,20,50', help='comma separated poll rates')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    modes = ['legacy'] + [f"poll@{hz}" for hz in args.hz.split(',')]
+    report = {
+        'benchmark': 'mfrc522_detection',
+        'settings': vars(args),
+        'runs': [],
+    }
+    with open(os.devnull, 'w') as quiet, contextlib.redirect_stdout(quiet):
+        for mode in modes:
+            report['runs'].append(run_mode(mode, args))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
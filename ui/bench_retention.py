@@ -0,0 +1,159 @@
+"""Retention benchmark: database size and query times before/after archiving.
+
+Fills a scratch database with --days days of history (--per-day scans a
+day, each one row in rfid_scans and one in rfid_reading, over --tags
+distinct tags), then runs one retention pass keeping --keep days:
+
+    python bench_retention.py --days 60 --per-day 5000 --keep 7
+
+Reported: hot rows, database file size (after incremental vacuum), archive
+size, pass duration, and timings for the test page's COUNT(*)s, the
+readings page and a tag history lookup, which must return the same rows
+before and after.  --old-database starts from a database created without
+auto_vacuum and runs the offline conversion (retention.py convert) before
+the pass, reporting how long it took.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+UI_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def timed_ms(fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 3), result
+
+
+def db_bytes(path):
+    return sum(os.path.getsize(p) for p in (path, path + '-wal') if os.path.exists(p))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--per-day', type=int, default=5000)
+    parser.add_argument('--tags', type=int, default=500)
+    parser.add_argument('--keep', type=int, default=7)
+    parser.add_argument('--old-database', action='store_true')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='etps-retention-')
+    db_path = os.path.join(workdir, 'rfid_logs.db')
+    os.environ['ETPS_DB_PATH'] = db_path
+    os.environ['ETPS_SOCKET_DIR'] = os.path.join(workdir, 'sock')
+    os.environ['ETPS_ARCHIVE_DIR'] = os.path.join(workdir, 'archive')
+    sys.path.insert(0, UI_DIR)
+
+    if args.old_database:
+        # A database from before auto_vacuum was set: a table already exists
+        raw = sqlite3.connect(db_path)
+        raw.execute("PRAGMA journal_mode=WAL")
+        raw.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, description TEXT NOT NULL, applied_at DATETIME DEFAULT CURRENT_TIMESTAMP)")
+        raw.commit()
+        raw.close()
+
+    quiet = open(os.devnull, 'w')
+    with contextlib.redirect_stdout(quiet):
+        from db import connection, transaction
+        from migrations import migrate
+        import retention
+        migrate()
+
+    rng = random.Random(args.seed)
+    tags = [f"{rng.randrange(10**11, 10**12)}" for _ in range(args.tags)]
+    now = time.time()
+    # Day 0 is today; every day gets the same number of scans
+    for day in range(args.days):
+        start = (datetime.fromtimestamp(now) - timedelta(days=day)).replace(hour=0, minute=0, second=0, microsecond=0)
+        scans, readings = [], []
+        for n in range(args.per_day):
+            at = start + timedelta(seconds=86400 * n / args.per_day)
+            if at.timestamp() > now:
+                break
+            tag = rng.choice(tags)
+            reader = rng.choice(('rfid1', 'rfid2'))
+            # rfid_scans.timestamp is UTC (CURRENT_TIMESTAMP), rfid_reading local time
+            stamp = datetime.fromtimestamp(at.timestamp(), timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+            scans.append((tag, f"Signal {1 if reader == 'rfid1' else 2}", stamp, at.timestamp()))
+            readings.append((tag, reader, at.strftime('%Y-%m-%d %H:%M:%S.%f'), 1))
+        with transaction() as conn:
+            conn.executemany("INSERT INTO rfid_scans (data, source, timestamp, read_at) VALUES (?, ?, ?, ?)", scans)
+            conn.executemany("INSERT INTO rfid_reading (rfid_number, reader_type, timestamp, processed) VALUES (?, ?, ?, ?)", readings)
+
+    probe_tag = tags[0]
+
+    def measure():
+        with connection() as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            counts_ms, counts = timed_ms(lambda: (
+                conn.execute("SELECT COUNT(*) FROM rfid_scans").fetchone()[0],
+                conn.execute("SELECT COUNT(*) FROM rfid_reading").fetchone()[0],
+            ))
+            page_ms, _ = timed_ms(lambda: conn.execute("""
+                SELECT id, rfid_number, reader_type, case_id, processed, timestamp
+                FROM rfid_reading ORDER BY timestamp DESC, id DESC LIMIT 21
+            """).fetchall())
+            change_log = conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0]
+            freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        history_ms, rows = timed_ms(lambda: retention.history('rfid_reading', rfid_number=probe_tag), repeat=3)
+        recent_ms, recent = timed_ms(lambda: retention.history(
+            'rfid_reading', since=(datetime.now() - timedelta(days=2)).strftime('%Y-%m-%d'), rfid_number=probe_tag))
+        return {
+            'hot_rows': {'rfid_scans': counts[0], 'rfid_reading': counts[1], 'change_log': change_log},
+            'db_bytes': db_bytes(db_path),
+            'free_pages': freelist,
+            'auto_vacuum': auto_vacuum,
+            'count_star_ms': counts_ms,
+            'readings_page_ms': page_ms,
+            'tag_history_all_ms': history_ms,
+            'tag_history_last_2_days_ms': recent_ms,
+            'tag_history_rows': len(rows),
+            'tag_history_recent_rows': len(recent),
+        }, [row['id'] for row in rows]
+
+    before, ids_before = measure()
+    convert_seconds = None
+    if args.old_database:
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(quiet), connection() as conn:
+            retention.enable_incremental_vacuum(conn)
+        convert_seconds = round(time.perf_counter() - started, 3)
+    archiver = retention.Archiver(days=args.keep, change_log_keep=args.per_day)
+    with contextlib.redirect_stdout(quiet):
+        summary = archiver.run()
+    after, ids_after = measure()
+
+    archive_bytes = sum(os.path.getsize(os.path.join(root, name))
+                        for root, _, names in os.walk(os.environ['ETPS_ARCHIVE_DIR']) for name in names)
+    print(json.dumps({
+        'benchmark': 'retention',
+        'settings': vars(args),
+        'before': before,
+        'after': after,
+        'convert_seconds': convert_seconds,
+        'pass': summary,
+        'archive_bytes': archive_bytes,
+        'segments': archiver.segments_written,
+        'db_bytes_reclaimed': before['db_bytes'] - after['db_bytes'],
+        # Same rows from history() whether they are hot or archived
+        'history_matches': ids_before == ids_after,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""Serial ingest check and benchmark on pseudo-terminals (no hardware needed).
+
+Each simulated reader is a pty behind a symlink, like /dev/serial/by-id/...
+Writer threads send numbered tag lines split into random chunks.  Halfway
+through, reader 0 is "unplugged" (pty closed, link removed) and plugged back
+in on a new pty.  The report checks that every line arrived exactly once and
+in order, and gives read latency and reconnect counts:
+
+    python bench_serial_ingest.py --ports 4 --rate 50 --seconds 5
+"""
+import argparse
+import json
+import os
+import pty
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tty
+
+from intersections import SerialReader
+from serial_ingest import SerialIngest
+
+
+class FakeDevice:
+    """A pty reachable through a stable symlink"""
+    def __init__(self, link):
+        self.link = link
+        self.lock = threading.Lock()
+        self.plug()
+
+    def plug(self):
+        with self.lock:
+            self.master, self.slave = pty.openpty()
+            tty.setraw(self.slave)
+            if os.path.lexists(self.link):
+                os.unlink(self.link)
+            os.symlink(os.ttyname(self.slave), self.link)
+            self.present = True
+
+    def unplug(self):
+        with self.lock:
+            self.present = False
+            os.unlink(self.link)
+            os.close(self.master)
+            os.close(self.slave)
+
+    def write(self, data):
+        with self.lock:
+            if not self.present:
+                return False
+            os.write(self.master, data)
+            return True
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ports', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=50, help='lines per second per port')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='etps-serial-')
+    devices = [FakeDevice(os.path.join(workdir, f"reader{i}")) for i in range(args.ports)]
+    ports = [SerialReader(device.link, 9600, 'rfid1') for device in devices]
+
+    received = {i: [] for i in range(args.ports)}
+    latencies = []
+
+    def on_scan(reader, line, read_at):
+        port, seq, sent_ns = line.split(':')
+        received[int(port)].append(int(seq))
+        latencies.append(time.monotonic_ns() - int(sent_ns))
+
+    ingest = SerialIngest(ports, on_scan)
+    loop_thread = threading.Thread(target=ingest.run, daemon=True)
+    loop_thread.start()
+    ingest.started.wait(5)
+    time.sleep(0.2)
+
+    sent = {i: [] for i in range(args.ports)}
+
+    def writer(i):
+        rng = random.Random(args.seed + i)
+        end = time.monotonic() + args.seconds
+        seq = 0
+        while time.monotonic() < end:
+            time.sleep(rng.expovariate(args.rate))
+            line = f"{i}:{seq}:{time.monotonic_ns()}\r\n".encode()
+            # Split the line at a random point, as a slow UART would
+            cut = rng.randrange(1, len(line))
+            if devices[i].write(line[:cut]):
+                time.sleep(rng.random() * 0.001)
+                devices[i].write(line[cut:])
+                sent[i].append(seq)
+            seq += 1
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(args.ports)]
+    started = time.monotonic()
+    cpu_started = time.process_time()
+    for thread in threads:
+        thread.start()
+
+    # Unplug reader 0 for a second halfway through
+    time.sleep(args.seconds / 2)
+    devices[0].unplug()
+    time.sleep(1.0)
+    devices[0].plug()
+
+    for thread in threads:
+        thread.join()
+    time.sleep(0.5)
+    wall = time.monotonic() - started
+    cpu = time.process_time() - cpu_started
+    stats = ingest.stats()
+    ingest.stop()
+    loop_thread.join(5)
+
+    problems = []
+    for i in range(args.ports):
+        if received[i] != sent[i]:
+            missing = sorted(set(sent[i]) - set(received[i]))
+            problems.append({'port': i, 'sent': len(sent[i]), 'received': len(received[i]),
+                             'missing': missing[:10]})
+
+    ms = [ns / 1e6 for ns in latencies]
+    report = {
+        'benchmark': 'serial_ingest',
+        'ports': args.ports,
+        'lines_sent': sum(len(s) for s in sent.values()),
+        'lines_received': sum(len(r) for r in received.values()),
+        'lines_per_s': round(sum(len(r) for r in received.values()) / wall, 1),
+        'latency_ms': {'p50': round(percentile(ms, 50), 3), 'p99': round(percentile(ms, 99), 3),
+                       'max': round(max(ms), 3)} if ms else None,
+        'reconnects': {s['port']: s['reconnects'] for s in stats},
+        'cpu_share_of_one_core': round(cpu / wall, 4),
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'ok': not problems and stats[0]['reconnects'] >= 1,
+        'problems': problems,
+    }
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report['ok'] else 1)
+
+
+if __name__ == '__main__':
+    main()
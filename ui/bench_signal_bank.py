@@ -0,0 +1,85 @@
+"""GPIO writes per render: rewrite-every-pin vs SignalBank diffing.
+
+Replays the normal cycle plus random priority preemptions through a
+PhaseMachine on a simulated clock, and renders every lamp change both ways
+on a SimulatedBackend:
+
+    python bench_signal_bank.py --hours 1 --scans-per-hour 120
+"""
+import argparse
+import json
+import random
+
+from signal_bank import SignalBank, SimulatedBackend
+from signal_plan import PhaseMachine
+
+PINS = {
+    1: {'red': 5, 'yellow': 12, 'green': 3, 'white': 40},
+    2: {'red': 13, 'yellow': 38, 'green': 15, 'white': 16},
+}
+
+
+class SimClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def rewrite_all(backend, lamps):
+    """What the controllers used to do: one write per pin, every time"""
+    for signal, colour in lamps.items():
+        for name, pin in PINS[signal].items():
+            backend.write([pin], [name == colour])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hours', type=float, default=1)
+    parser.add_argument('--scans-per-hour', type=float, default=120)
+    parser.add_argument('--hold', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    clock = SimClock()
+    machine = PhaseMachine(clock=clock)
+    naive = SimulatedBackend()
+    diffed = SimulatedBackend()
+    bank = SignalBank(PINS, diffed)
+    bank.setup()
+    setup_writes = diffed.writes
+
+    rewrite_all(naive, machine.lamps)
+    bank.apply(machine.lamps)
+    changes = 1
+
+    end = args.hours * 3600
+    next_scan = rng.expovariate(args.scans_per_hour / 3600)
+    while clock.now < end:
+        if next_scan < machine.deadline:
+            clock.now = next_scan
+            machine.preempt(rng.choice([1, 2]), args.hold)
+            next_scan += rng.expovariate(args.scans_per_hour / 3600)
+        else:
+            clock.now = machine.deadline
+            machine.tick()
+        rewrite_all(naive, machine.lamps)
+        bank.apply(machine.lamps)
+        changes += 1
+
+    assert naive.levels == diffed.levels
+    print(json.dumps({
+        'benchmark': 'signal_bank_writes',
+        'renders': changes,
+        'rewrite_all_pin_writes': naive.writes,
+        'rewrite_all_calls': naive.calls,
+        'signal_bank_pin_writes': diffed.writes - setup_writes,
+        'signal_bank_calls': diffed.calls - 1,
+        'pin_write_reduction': round(naive.writes / max(1, diffed.writes - setup_writes), 2),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""Stats benchmark: trigger-maintained counters vs. COUNT(*) on growing tables.
+
+Grows a scratch database to each --sizes row count (rows in each of
+rfid_scans and rfid_reading, one case per 100 readings) and times, at every
+size, the test page's three COUNT(*)s against the stat_counter read that
+replaced them, plus stats.read_stats() (the /api/stats document):
+
+    python bench_stats.py --sizes 10000 100000 500000
+
+Then it measures what the triggers cost writers (rows/s inserted with and
+without them, single-row and batched transactions), runs a retention pass
+and checks the counters still match a full recount (stats.check()).
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+UI_DIR = os.path.dirname(os.path.abspath(__file__))
+TRIGGERS = ('trg_stats_scan_insert', 'trg_stats_scan_delete', 'trg_stats_reading_insert',
+            'trg_stats_reading_delete', 'trg_stats_case_insert', 'trg_stats_case_delete', 'trg_stats_case_update')
+
+
+def timed_ms(fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 3), result
+
+
+def rows_for(rng, start, count, span_days):
+    """`count` scans/readings/cases spread over the span_days before `start`"""
+    scans, readings, cases = [], [], []
+    for n in range(count):
+        at = start - timedelta(seconds=span_days * 86400 * rng.random())
+        tag = f"{rng.randrange(10**11, 10**12)}"
+        reader = rng.choice(('rfid1', 'rfid2'))
+        stamp = at.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        scans.append((tag, f"Signal {1 if reader == 'rfid1' else 2}", stamp, at.timestamp()))
+        readings.append((tag, reader, at.strftime('%Y-%m-%d %H:%M:%S.%f')))
+        if n % 100 == 0:
+            cases.append((f"Patient {n}", rng.choice(('City', 'General', 'St. Mary')), rng.randint(1, 5),
+                          'driver123', at.strftime('%Y-%m-%d %H:%M:%S.%f')))
+    return scans, readings, cases
+
+
+def insert(conn, scans, readings, cases):
+    conn.executemany("INSERT INTO rfid_scans (data, source, timestamp, read_at) VALUES (?, ?, ?, ?)", scans)
+    conn.executemany("INSERT INTO rfid_reading (rfid_number, reader_type, timestamp) VALUES (?, ?, ?)", readings)
+    conn.executemany("""
+        INSERT INTO emergency_case (patient_name, hospital_name, severity_level, driver_id, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, cases)
+
+
+def insert_rate(transaction, rows, batch):
+    """Readings inserted per second, `batch` rows per transaction"""
+    started = time.perf_counter()
+    for i in range(0, len(rows), batch):
+        with transaction() as conn:
+            conn.executemany("INSERT INTO rfid_reading (rfid_number, reader_type, timestamp) VALUES (?, ?, ?)",
+                             rows[i:i + batch])
+    return round(len(rows) / (time.perf_counter() - started))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 500000])
+    parser.add_argument('--span-days', type=int, default=60, help='history the rows are spread over')
+    parser.add_argument('--write-rows', type=int, default=5000, help='rows per insert-rate run')
+    parser.add_argument('--keep', type=int, default=7, help='retention days for the final pass')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='etps-stats-')
+    os.environ['ETPS_DB_PATH'] = os.path.join(workdir, 'rfid_logs.db')
+    os.environ['ETPS_SOCKET_DIR'] = os.path.join(workdir, 'sock')
+    os.environ['ETPS_ARCHIVE_DIR'] = os.path.join(workdir, 'archive')
+    sys.path.insert(0, UI_DIR)
+
+    quiet = open(os.devnull, 'w')
+    with contextlib.redirect_stdout(quiet):
+        from db import connection, transaction
+        from migrations import migrate
+        import retention
+        import stats
+        migrate()
+
+    rng = random.Random(args.seed)
+    now = datetime.now().astimezone()
+    sizes, have = [], 0
+    for size in sorted(args.sizes):
+        for i in range(have, size, 20000):
+            with transaction() as conn:
+                insert(conn, *rows_for(rng, now, min(20000, size - i), args.span_days))
+        have = size
+        with connection() as conn:
+            count_ms, _ = timed_ms(lambda: [conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                                            for table in ('emergency_case', 'rfid_reading', 'rfid_scans')])
+            counter_ms, _ = timed_ms(lambda: stats.hot_rows(conn))
+            api_ms, document = timed_ms(lambda: stats.read_stats(conn, stats.DEFAULT_HOURS))
+            api_week_ms, _ = timed_ms(lambda: stats.read_stats(conn, 24 * 7))
+        sizes.append({
+            'rows_per_table': size,
+            'test_page_count_star_ms': count_ms,
+            'test_page_counters_ms': counter_ms,
+            'api_stats_24h_ms': api_ms,
+            'api_stats_7d_ms': api_week_ms,
+            'totals': document['totals'],
+        })
+
+    # Writer cost: the same inserts with the triggers in place and dropped
+    writes = {}
+    rows = rows_for(rng, now, args.write_rows, 1)[1]
+    for label in ('with_triggers', 'without_triggers'):
+        if label == 'without_triggers':
+            with transaction() as conn:
+                saved = conn.execute(f"""
+                    SELECT sql FROM sqlite_master WHERE type = 'trigger'
+                    AND name IN ({', '.join('?' * len(TRIGGERS))})
+                """, TRIGGERS).fetchall()
+                for name in TRIGGERS:
+                    conn.execute(f"DROP TRIGGER {name}")
+        writes[label] = {
+            'rows_per_s_single': insert_rate(transaction, rows[:args.write_rows // 10], 1),
+            'rows_per_s_batch_100': insert_rate(transaction, rows, 100),
+        }
+    with transaction() as conn:
+        for (sql,) in saved:
+            conn.execute(sql)
+    with contextlib.redirect_stdout(quiet):
+        with transaction(immediate=True) as conn:
+            stats.rebuild(conn)
+
+    # Archiving must not change totals; hot_rows follow the deletes
+    with connection() as conn:
+        before = stats.read_stats(conn, 1)
+    with contextlib.redirect_stdout(quiet):
+        summary = retention.Archiver(days=args.keep).run()
+    with connection() as conn:
+        after = stats.read_stats(conn, 1)
+        check_ms, drift = timed_ms(lambda: stats.check(conn), repeat=1)
+
+    print(json.dumps({
+        'benchmark': 'stats',
+        'settings': vars(args),
+        'sizes': sizes,
+        'writes': writes,
+        'retention': {
+            'archived': summary,
+            'hot_rows_before': before['hot_rows'],
+            'hot_rows_after': after['hot_rows'],
+            'totals_unchanged': before['totals'] == after['totals'],
+            'rebuild_check_ms': check_ms,
+            'drift': drift,
+        },
+    }, indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
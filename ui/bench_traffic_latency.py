@@ -0,0 +1,87 @@
+"""Scan-to-white-light latency of traffic.py under a synthetic scan stream.
+
+Runs the real listener and controller threads from traffic.py with the
+in-process scan bus and the simulated GPIO from hal.py, so it works on
+any machine:
+
+    python bench_traffic_latency.py --scans 500 --rate 20
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+
+# Must be set before traffic.py binds its scan bus channels and picks its GPIO
+os.environ['ETPS_SCAN_BUS'] = 'queue'
+os.environ['ETPS_HAL'] = 'sim'
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scans', type=int, default=200, help='scans to send')
+    parser.add_argument('--rate', type=float, default=10, help='mean scans per second')
+    parser.add_argument('--hold', type=float, default=0.05,
+                        help='priority hold in seconds (short, so the normal cycle runs between scans)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    import traffic
+    from hal import GPIO
+    from scan_bus import ScanBus
+
+    traffic.PRIORITY_HOLD = args.hold
+    threads = [threading.Thread(target=target, daemon=True) for target in
+               (traffic.rfid_listener_arduino, traffic.rfid_listener_mfrc, traffic.traffic_light_controller)]
+    for thread in threads:
+        thread.start()
+
+    readers = {'Signal1': ScanBus('rfid1'), 'Signal2': ScanBus('rfid2')}
+    rng = random.Random(args.seed)
+    latencies = []
+    missed = 0
+
+    started = time.monotonic()
+    for i in range(args.scans):
+        time.sleep(rng.expovariate(args.rate))
+        # Alternate approaches so every scan needs a lamp change
+        signal = 'Signal1' if i % 2 == 0 else 'Signal2'
+        white = traffic.LEDs[signal]['White']
+        sent = time.monotonic()
+        readers[signal].publish(f"TAG{i:05d}")
+        lit = GPIO.wait_for(white, GPIO.HIGH, timeout=5)
+        if lit is None:
+            missed += 1
+        else:
+            latencies.append(lit - sent)
+    elapsed = time.monotonic() - started
+
+    traffic.stop()
+    for thread in threads:
+        thread.join(timeout=2)
+
+    ms = [latency * 1000 for latency in latencies]
+    print(json.dumps({
+        'benchmark': 'traffic_scan_to_white',
+        'scans': args.scans,
+        'rate_per_s': args.rate,
+        'missed': missed,
+        'p50_ms': round(percentile(ms, 50), 3) if ms else None,
+        'p95_ms': round(percentile(ms, 95), 3) if ms else None,
+        'p99_ms': round(percentile(ms, 99), 3) if ms else None,
+        'max_ms': round(max(ms), 3) if ms else None,
+        'gpio_writes': GPIO.writes,
+        'lamp_transitions': len(GPIO.transitions),
+        'elapsed_s': round(elapsed, 2),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""Web tier throughput: Flask dev server with in-process readers vs. gunicorn.
+
+Runs the same HTTP load against both layouts, each on a fresh database with
+simulated readers producing scans (ETPS_SIM_RATE) during the run:
+
+    before - app.run(threaded=True) with the reader threads in the same
+             process, as `python app.py` used to run it
+    after  - gunicorn -c gunicorn.conf.py (--workers gthread workers) plus
+             ingest_daemon.py in its own process
+
+Every client keeps one logged-in connection and cycles through the
+dashboard, /api/rfid_readings and /get_nearby_hospitals:
+
+    python bench_web_tier.py --seconds 10 --clients 32 --workers 4
+
+Reported per layout: requests per second, latency percentiles, errors, and
+whether each server kept connections alive.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+
+UI_DIR = os.path.dirname(os.path.abspath(__file__))
+
+REQUESTS = [
+    ('GET', '/dashboard', None),
+    ('GET', '/api/rfid_readings', None),
+    ('POST', '/get_nearby_hospitals', json.dumps({'latitude': 12.97, 'longitude': 77.59})),
+]
+
+
+def serve_dev(port):
+    """The old layout: dev server and reader threads in one process"""
+    sys.path.insert(0, UI_DIR)
+    import app
+    import ingest
+    app.init_db()
+    ingest.start_readers()
+    app.app.run(host='127.0.0.1', port=port, threaded=True)
+
+
+def login(conn):
+    body = urllib.parse.urlencode({'driver_id': 'driver123', 'password': 'password123'})
+    conn.request('POST', '/login', body, {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = conn.getresponse()
+    response.read()
+    return response.getheader('Set-Cookie').split(';')[0]
+
+
+def client(port, seconds, connections, results):
+    """One load process: `connections` keep-alive connections, round robin"""
+    conns = [http.client.HTTPConnection('127.0.0.1', port, timeout=10) for _ in range(connections)]
+    cookies = [login(conn) for conn in conns]
+    latencies, errors, reconnects = [], 0, 0
+    end = time.monotonic() + seconds
+    n = 0
+    while time.monotonic() < end:
+        i = n % connections
+        method, path, body = REQUESTS[n % len(REQUESTS)]
+        n += 1
+        headers = {'Cookie': cookies[i], 'Content-Type': 'application/json'}
+        started = time.perf_counter()
+        try:
+            was_open = conns[i].sock is not None
+            conns[i].request(method, path, body, headers)
+            response = conns[i].getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+            if not was_open:
+                reconnects += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conns[i].close()
+            continue
+        latencies.append(time.perf_counter() - started)
+    results.put((latencies, errors, reconnects))
+
+
+def wait_for(port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/test')
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not come up")
+
+
+def start_layout(layout, args, port, env):
+    log = open(os.path.join(env['ETPS_SOCKET_DIR'] + '.log'), 'w')
+    if layout == 'before':
+        return [subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve-dev', str(port)],
+                                 cwd=UI_DIR, env=env, stdout=log, stderr=log)]
+    daemon = subprocess.Popen([sys.executable, 'ingest_daemon.py'], cwd=UI_DIR, env=env, stdout=log, stderr=log)
+    gunicorn = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                                 '--workers', str(args.workers), '--bind', f"127.0.0.1:{port}", 'app:app'],
+                                cwd=UI_DIR, env=env, stdout=log, stderr=log)
+    return [gunicorn, daemon]
+
+
+def run_layout(layout, args, port):
+    workdir = tempfile.mkdtemp(prefix=f"etps-web-{layout}-")
+    env = dict(os.environ,
+               ETPS_HAL='sim',
+               ETPS_SIM_RATE=str(args.scan_rate),
+               ETPS_DB_PATH=os.path.join(workdir, 'rfid_logs.db'),
+               ETPS_SOCKET_DIR=os.path.join(workdir, 'sock'))
+    processes = start_layout(layout, args, port, env)
+    try:
+        wait_for(port)
+        results = multiprocessing.Queue()
+        per_process = max(1, args.clients // args.load_processes)
+        loaders = [multiprocessing.Process(target=client, args=(port, args.seconds, per_process, results))
+                   for _ in range(args.load_processes)]
+        for loader in loaders:
+            loader.start()
+        collected = [results.get() for _ in loaders]
+        for loader in loaders:
+            loader.join()
+    finally:
+        for process in processes:
+            process.send_signal(signal.SIGTERM)
+        for process in processes:
+            process.wait(timeout=15)
+
+    latencies = sorted(l for lat, _, _ in collected for l in lat)
+    requests = len(latencies)
+    return {
+        'layout': layout,
+        'requests': requests,
+        'requests_per_s': round(requests / args.seconds, 1),
+        'latency_ms': {
+            'p50': round(statistics.median(latencies) * 1000, 2),
+            'p99': round(latencies[int(requests * 0.99) - 1] * 1000, 2),
+        },
+        'errors': sum(e for _, e, _ in collected),
+        # New TCP connections opened after login (0 with keep-alive)
+        'reconnects': sum(r for _, _, r in collected),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=int, default=10)
+    parser.add_argument('--clients', type=int, default=32, help='concurrent connections')
+    parser.add_argument('--load-processes', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers')
+    parser.add_argument('--scan-rate', type=float, default=120, help='simulated scans per minute')
+    parser.add_argument('--port', type=int, default=5077)
+    parser.add_argument('--serve-dev', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_dev:
+        return serve_dev(args.serve_dev)
+
+    runs = [run_layout(layout, args, args.port + n) for n, layout in enumerate(('before', 'after'))]
+    print(json.dumps({'benchmark': 'web_tier', 'settings': vars(args), 'cpus': os.cpu_count(), 'runs': runs}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,51 +1,144 @@
-import RPi.GPIO as GPIO
+import queue
 import time
-import sqlite3
 from datetime import datetime, timedelta
 import threading
 
+from case_index import CaseIndex
+from change_feed import READ_BATCH, ChangeFeed, notify_changes
+from db import connection, transaction
+from hal import GPIO
+from intersections import load_intersection
+from lamp_animator import DENIAL, LampAnimator
+import metrics
+from signal_bank import GPIOBackend, SignalBank
+from signal_plan import PhaseMachine, relabel_plan
+
 # Setup GPIO mode
 GPIO.setmode(GPIO.BOARD)
 GPIO.setwarnings(False)
 
+# Pin numbers and timings come from intersections.json
+JUNCTION = load_intersection()
 # Signal 1 (Top) Pins
-SIGNAL1 = {'red': 5, 'yellow': 12, 'green': 3, 'white': 40}
-# Signal 2 (Bottom) Pins  
-SIGNAL2 = {'red': 13, 'yellow': 38, 'green': 15, 'white': 16}
+SIGNAL1 = JUNCTION.signals['1']
+# Signal 2 (Bottom) Pins
+SIGNAL2 = JUNCTION.signals['2']
+
+SIGNALS = {1: SIGNAL1, 2: SIGNAL2}
 
 # Setup all pins as output
-for pin in list(SIGNAL1.values()) + list(SIGNAL2.values()):
-    GPIO.setup(pin, GPIO.OUT)
-    GPIO.output(pin, GPIO.LOW)
+bank = SignalBank(SIGNALS, GPIOBackend(GPIO))
+bank.setup()
+
+class PriorityEventLog:
+    """Writes priority_event rows on its own thread, so the decision loop
+    never waits for the write lock (the scan writer may be holding it)"""
+    def __init__(self, queue_size=256):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.dropped = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='priority-events', daemon=True)
+        self.thread.start()
+
+    def record(self, signal_num, priority_level, rfid_number):
+        """Queue one activation without blocking"""
+        try:
+            self.queue.put_nowait((signal_num, priority_level, rfid_number, time.time()))
+        except queue.Full:
+            self.dropped += 1
+            print(f"⚠️ Priority event queue full - not logging Signal {signal_num}")
+
+    def stop(self, timeout=5):
+        """Write what is queued, then stop"""
+        if self.thread:
+            self.queue.put(None)
+            self.thread.join(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = None in batch
+            events = [event for event in batch if event is not None]
+            if not events:
+                continue
+            try:
+                with transaction() as conn:
+                    conn.executemany("""
+                        INSERT INTO priority_event (signal, severity, rfid_number, activated_at)
+                        VALUES (?, ?, ?, ?)
+                    """, events)
+                notify_changes()
+            except Exception as e:
+                print(f"⚠️ Could not log priority event: {e}")
 
-DB_PATH = "rfid_logs.db"
 
 class PriorityTrafficController:
     def __init__(self):
         self.current_priority_signal = None  # 1 or 2
         self.current_priority_level = None   # 1-5 (1 = highest)
         self.priority_start_time = None
-        self.priority_duration = 10  # seconds
-        self.last_processed_id = 0
+        self.priority_duration = JUNCTION.priority_hold  # seconds
+        self.priority_scan_time = None       # timestamp of the scan holding priority
+        # Normal cycle + preemption; the lamps always follow self.signals.lamps
+        self.signals = PhaseMachine(relabel_plan(JUNCTION.plan, int), JUNCTION.clearance)
+        # Denial flashes run on their own timer threads over the top of it
+        self.animator = LampAnimator(self.write_lamp, lambda signal_num: self.signals.lamps[signal_num])
+        # RFID UID -> (case id, severity, created_at), kept in memory
+        self.cases = CaseIndex()
+        self.cases.load()
+        # New scans and case links arrive through the change feed; history
+        # from before startup is not replayed
+        self.feed = ChangeFeed('priority-controller')
+        self.feed.skip_to_end()
+        # Activations for the dashboard's live feed, written off the decision loop
+        self.events = PriorityEventLog()
+        self.running = False
+        # When the scan being processed was read (for latency metrics)
+        self.scan_read_at = None
+        self.scan_uid = None
         
     def get_latest_rfid_scans(self):
-        """Get new RFID scans that haven't been processed yet"""
+        """Get new RFID scans from the change feed, oldest first"""
         try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            
-            # Get latest scans after last processed ID
-            cursor.execute("""
-                SELECT rs.id, rs.data, rs.source, rs.timestamp, ec.severity_level
-                FROM rfid_scans rs
-                LEFT JOIN emergency_case ec ON (rs.data = ec.rfid1_number OR rs.data = ec.rfid2_number)
-                WHERE rs.id > ? 
-                ORDER BY rs.timestamp DESC
-            """, (self.last_processed_id,))
-            
-            scans = cursor.fetchall()
-            conn.close()
-            return scans
+            with connection() as conn:
+                events = []
+                while True:
+                    batch = self.feed.read(conn)
+                    events += batch
+                    if len(batch) < READ_BATCH:
+                        break
+
+                # Apply case inserts/links first - a scan may have linked its
+                # own tag in the same transaction
+                case_ids = {e.row_id for e in events if e.table_name == 'emergency_case'}
+                if case_ids:
+                    self.cases.update(conn, case_ids)
+
+                scan_ids = [e.row_id for e in events if e.table_name == 'rfid_scans']
+                scans = []
+                for start in range(0, len(scan_ids), READ_BATCH):
+                    chunk = scan_ids[start:start + READ_BATCH]
+                    scans += conn.execute(f"""
+                        SELECT id, data, source, timestamp, read_at
+                        FROM rfid_scans
+                        WHERE id IN ({','.join('?' * len(chunk))})
+                        ORDER BY id
+                    """, chunk).fetchall()
+
+            now = time.time()
+            for scan in scans:
+                if scan[4]:
+                    metrics.observe('etps_scan_pickup_seconds', now - scan[4])
+            return [(scan_id, data, source, timestamp, self.cases.severity(data), read_at)
+                    for scan_id, data, source, timestamp, read_at in scans]
             
         except Exception as e:
             print(f"DB Error: {e}")
@@ -61,38 +154,45 @@ class PriorityTrafficController:
     
     def all_off(self):
         """Turn off all lights"""
-        for pin in list(SIGNAL1.values()) + list(SIGNAL2.values()):
-            GPIO.output(pin, GPIO.LOW)
+        self.animator.stop()
+        bank.all_off()
+    
+    def write_lamp(self, signal_num, lamp, on):
+        bank.set_lamp(signal_num, lamp, on)
+    
+    def render(self):
+        """Drive the LEDs to match the phase machine"""
+        with self.animator.lock:
+            # A lamp that is flashing belongs to the animator until it ends
+            busy = {(signal_num, self.animator.animating(signal_num)) for signal_num in SIGNALS}
+            bank.apply(self.signals.lamps, hold=busy)
     
     def flash_red_denial(self, signal_num):
         """Flash red light rapidly for 2 seconds to indicate access denied"""
         print(f"🚫 Access Denied - Signal {signal_num}")
-        
-        signal = SIGNAL1 if signal_num == 1 else SIGNAL2
-        
-        # Flash red rapidly for 2 seconds
-        for _ in range(8):  # 8 flashes in 2 seconds
-            GPIO.output(signal['red'], GPIO.HIGH)
-            time.sleep(0.125)
-            GPIO.output(signal['red'], GPIO.LOW)
-            time.sleep(0.125)
+        metrics.inc('etps_denials_total')
+        # Returns straight away; repeated denials merge into one flash
+        self.animator.play(signal_num, DENIAL)
     
-    def activate_priority_signal(self, signal_num, priority_level):
-        """Activate white light for priority signal"""
+    def activate_priority_signal(self, signal_num, priority_level, scan_time=None):
+        """Give signal_num the white light (after yellow clearance if needed)"""
         print(f"🚨 Priority Activated - Signal {signal_num}, Priority Level {priority_level}")
         
-        self.all_off()
-        
-        if signal_num == 1:
-            GPIO.output(SIGNAL1['white'], GPIO.HIGH)
-            GPIO.output(SIGNAL2['red'], GPIO.HIGH)
-        else:
-            GPIO.output(SIGNAL2['white'], GPIO.HIGH) 
-            GPIO.output(SIGNAL1['red'], GPIO.HIGH)
+        self.signals.preempt(signal_num, self.priority_duration)
+        self.render()
+        metrics.inc('etps_preemptions_total')
+        if self.scan_read_at:
+            metrics.observe('etps_scan_lamp_seconds', time.time() - self.scan_read_at)
         
         self.current_priority_signal = signal_num
         self.current_priority_level = priority_level
         self.priority_start_time = datetime.now()
+        self.priority_scan_time = scan_time
+        self.log_priority_event(signal_num, priority_level)
+
+    def log_priority_event(self, signal_num, priority_level):
+        """Record the activation for the dashboard's live feed (after the lamps changed)"""
+        self.events.record(signal_num, priority_level, self.scan_uid)
     
     def process_rfid_scan(self, scan_id, rfid_data, source, timestamp, severity_level):
         """Process individual RFID scan and determine action"""
@@ -111,120 +211,85 @@ class PriorityTrafficController:
         
         # If no current priority session
         if self.current_priority_signal is None:
-            self.activate_priority_signal(signal_num, severity_level)
+            self.activate_priority_signal(signal_num, severity_level, timestamp)
             return
         
         # If same signal is scanning again
         if self.current_priority_signal == signal_num:
             if severity_level <= self.current_priority_level:  # Same or higher priority
-                self.activate_priority_signal(signal_num, severity_level)
+                self.activate_priority_signal(signal_num, severity_level, timestamp)
             else:  # Lower priority
                 self.flash_red_denial(signal_num)
             return
         
         # Different signal is scanning
         if severity_level < self.current_priority_level:  # Higher priority (lower number)
-            self.activate_priority_signal(signal_num, severity_level)
+            self.activate_priority_signal(signal_num, severity_level, timestamp)
         elif severity_level > self.current_priority_level:  # Lower priority
             self.flash_red_denial(signal_num)
-        else:  # Same priority - check timestamp
-            # Get current priority signal's timestamp
-            try:
-                conn = sqlite3.connect(DB_PATH)
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT rs.timestamp FROM rfid_scans rs
-                    LEFT JOIN emergency_case ec ON (rs.data = ec.rfid1_number OR rs.data = ec.rfid2_number)
-                    WHERE rs.source = ? AND ec.severity_level = ?
-                    ORDER BY rs.timestamp DESC LIMIT 1
-                """, (f"Signal {self.current_priority_signal}", self.current_priority_level))
-                
-                current_time = cursor.fetchone()
-                conn.close()
-                
-                if current_time and timestamp > current_time[0]:
-                    # New scan is more recent
-                    self.activate_priority_signal(signal_num, severity_level)
-                else:
-                    self.flash_red_denial(signal_num)
-                    
-            except Exception as e:
-                print(f"Timestamp comparison error: {e}")
+        else:  # Same priority - the more recent scan wins
+            if self.priority_scan_time and timestamp > self.priority_scan_time:
+                self.activate_priority_signal(signal_num, severity_level, timestamp)
+            else:
                 self.flash_red_denial(signal_num)
     
     def check_priority_timeout(self):
         """Check if current priority session has expired"""
-        if (self.current_priority_signal is not None and 
-            self.priority_start_time is not None):
-            
-            elapsed = (datetime.now() - self.priority_start_time).total_seconds()
-            if elapsed >= self.priority_duration:
-                print(f"⏰ Priority timeout - Signal {self.current_priority_signal}")
-                self.current_priority_signal = None
-                self.current_priority_level = None
-                self.priority_start_time = None
-                return True
+        # The phase machine ends the hold and resumes the normal cycle
+        if self.current_priority_signal is not None and self.signals.priority_signal is None:
+            print(f"⏰ Priority timeout - Signal {self.current_priority_signal}")
+            self.current_priority_signal = None
+            self.current_priority_level = None
+            self.priority_start_time = None
+            self.priority_scan_time = None
+            return True
         return False
     
-    def normal_cycle(self):
-        """Run normal traffic light cycle"""
-        print("🚦 Running Normal Cycle")
-        
-        # Signal 1 Green, Signal 2 Red
-        self.all_off()
-        GPIO.output(SIGNAL1['green'], GPIO.HIGH)
-        GPIO.output(SIGNAL2['red'], GPIO.HIGH)
-        time.sleep(2)
-        
-        GPIO.output(SIGNAL1['green'], GPIO.LOW)
-        GPIO.output(SIGNAL1['yellow'], GPIO.HIGH)
-        time.sleep(2)
-        
-        GPIO.output(SIGNAL1['yellow'], GPIO.LOW)
-        
-        # Signal 1 Red, Signal 2 Green
-        GPIO.output(SIGNAL1['red'], GPIO.HIGH)
-        GPIO.output(SIGNAL2['green'], GPIO.HIGH)
-        time.sleep(5)
-        
-        GPIO.output(SIGNAL2['green'], GPIO.LOW)
-        GPIO.output(SIGNAL2['yellow'], GPIO.HIGH)
-        time.sleep(2)
-        
-        GPIO.output(SIGNAL2['yellow'], GPIO.LOW)
-        GPIO.output(SIGNAL1['red'], GPIO.LOW)
-        GPIO.output(SIGNAL2['red'], GPIO.LOW)
-    
     def run(self):
         """Main control loop"""
         try:
-            while True:
+            print("🚦 Running Normal Cycle")
+            self.events.start()
+            self.render()
+            self.running = True
+            while self.running:
+                # Sleep until the next phase change, or until a scan is
+                # committed - whichever comes first
+                self.feed.wait(self.signals.time_left())
+
                 # Check for new RFID scans
                 new_scans = self.get_latest_rfid_scans()
                 
                 for scan in new_scans:
-                    scan_id, rfid_data, source, timestamp, severity_level = scan
+                    scan_id, rfid_data, source, timestamp, severity_level, read_at = scan
+                    self.scan_read_at = read_at
+                    self.scan_uid = rfid_data
                     self.process_rfid_scan(scan_id, rfid_data, source, timestamp, severity_level)
-                    self.last_processed_id = max(self.last_processed_id, scan_id)
+                    if read_at:
+                        metrics.observe('etps_scan_decision_seconds', time.time() - read_at)
+                self.scan_read_at = None
+                self.scan_uid = None
                 
-                # Check if priority session has expired
-                priority_expired = self.check_priority_timeout()
+                if self.signals.tick():
+                    print(f"🚦 {self.signals.phase_name}: {self.signals.lamps}")
+                    self.render()
                 
-                # Run appropriate cycle
-                if self.current_priority_signal is not None and not priority_expired:
-                    # Maintain priority state
-                    time.sleep(0.5)
-                else:
-                    # Run normal cycle
-                    self.all_off()
-                    self.normal_cycle()
+                # Check if priority session has expired
+                self.check_priority_timeout()
                 
         except KeyboardInterrupt:
             print("🔴 Exiting...")
         finally:
             self.all_off()
+            self.events.stop()
+            self.feed.close()
             GPIO.cleanup()
 
+    def stop(self):
+        """Make run() return (safe to call from another thread)"""
+        self.running = False
+        notify_changes()
+
 def main():
     controller = PriorityTrafficController()
     controller.run()
@@ -0,0 +1,97 @@
+from collections import namedtuple
+
+from db import connection
+
+# ============================================================================
+# IN-MEMORY TAG -> CASE INDEX
+# ============================================================================
+#
+# The priority controller needs the severity of every scanned tag.  Instead of
+# joining rfid_scans against emergency_case on each loop, it keeps this index:
+# loaded once at startup, then refreshed incrementally with only the cases
+# that are new or were still waiting for a tag.  Lookups are dict reads.
+
+CaseEntry = namedtuple('CaseEntry', ['case_id', 'severity', 'created_at'])
+
+# Cases fetched per refresh query (keeps the IN (...) list short)
+REFRESH_CHUNK = 500
+
+
+class CaseIndex:
+    """RFID UID -> newest emergency case carrying that tag"""
+    def __init__(self):
+        self.by_uid = {}
+        self.last_case_id = 0
+        # Cases still missing rfid1 or rfid2 - they may be linked later
+        self.pending = set()
+
+    def __len__(self):
+        return len(self.by_uid)
+
+    def lookup(self, uid):
+        """CaseEntry for a tag, or None if no case carries it"""
+        return self.by_uid.get(str(uid))
+
+    def severity(self, uid):
+        entry = self.by_uid.get(str(uid))
+        return entry.severity if entry else None
+
+    def add_case(self, case_id, severity, created_at, rfid1_number, rfid2_number):
+        """Record a case, or its new tags when it gets linked"""
+        entry = CaseEntry(case_id, severity, created_at or '')
+        for uid in (rfid1_number, rfid2_number):
+            if not uid:
+                continue
+            # A tag reused on a later case resolves to the newest case
+            current = self.by_uid.get(uid)
+            if current is None or (current.created_at, current.case_id) <= (entry.created_at, case_id):
+                self.by_uid[uid] = entry
+
+        if rfid1_number and rfid2_number:
+            self.pending.discard(case_id)
+        else:
+            self.pending.add(case_id)
+        self.last_case_id = max(self.last_case_id, case_id)
+
+    def load(self, conn=None):
+        """Build the index from every case in the database"""
+        if conn is None:
+            with connection() as conn:
+                return self.load(conn)
+
+        self.by_uid.clear()
+        self.pending.clear()
+        self.last_case_id = 0
+        rows = conn.execute("""
+            SELECT id, severity_level, created_at, rfid1_number, rfid2_number
+            FROM emergency_case ORDER BY id
+        """)
+        for row in rows:
+            self.add_case(*row)
+        print(f"[INDEX] Loaded {len(self.by_uid)} tags from emergency_case")
+
+    def refresh(self, conn=None):
+        """Pick up cases created or linked since the last load/refresh"""
+        if conn is None:
+            with connection() as conn:
+                return self.refresh(conn)
+
+        rows = conn.execute("""
+            SELECT id, severity_level, created_at, rfid1_number, rfid2_number
+            FROM emergency_case WHERE id > ? ORDER BY id
+        """, (self.last_case_id,)).fetchall()
+        for row in rows:
+            self.add_case(*row)
+        self.update(conn, self.pending)
+
+    def update(self, conn, case_ids):
+        """Re-read specific cases (e.g. ids from the change feed)"""
+        case_ids = sorted(case_ids)
+        for start in range(0, len(case_ids), REFRESH_CHUNK):
+            chunk = case_ids[start:start + REFRESH_CHUNK]
+            rows = conn.execute(f"""
+                SELECT id, severity_level, created_at, rfid1_number, rfid2_number
+                FROM emergency_case WHERE id IN ({','.join('?' * len(chunk))})
+            """, chunk).fetchall()
+            for row in rows:
+                self.add_case(*row)
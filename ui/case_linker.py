@@ -0,0 +1,190 @@
+import itertools
+import threading
+from collections import OrderedDict
+
+# ============================================================================
+# CASE LINKING
+# ============================================================================
+#
+# A driver creates a case on the dashboard, then the ambulance's tag is read
+# at reader 1 and reader 2; each read fills that reader's slot
+# (rfid1_number / rfid2_number) of a waiting case.
+#
+# CaseLinker keeps the waiting cases in memory so a scan needs no lookups:
+#
+#   - each driver has one current case (their newest one)
+#   - per reader slot, the current cases still missing that slot, oldest
+#     first; a scan goes to the newest one
+#   - a tag already in one slot of a case goes to the same case's other
+#     slot (it is the same ambulance), ahead of newer cases
+#   - a tag read again at a reader whose slot it already fills (after the
+#     dedup window, or on the way back) belongs to that case and claims
+#     nothing.  It can link again once its driver creates a new case.
+#
+# The claim is one conditional UPDATE ... WHERE <slot> IS NULL RETURNING
+# (SQLite 3.35+, checked by db.py).
+# If another scan got there first nothing is returned and the next waiting
+# case is tried, so two ambulances scanning at once link to two different
+# cases instead of fighting over the newest one.
+#
+# Cases created by any process are picked up with an "id > last seen" query
+# at the start of each link().  The database stays the source of truth:
+# after a rollback, invalidate() makes the next link() reload.
+
+SLOTS = {'rfid1': 'rfid1_number', 'rfid2': 'rfid2_number'}
+# Waiting cases tried per scan before giving up
+MAX_ATTEMPTS = 8
+
+
+class PendingCase:
+    """A driver's current case (fully linked ones stay until superseded)"""
+    __slots__ = ('case_id', 'driver_id', 'tags')
+
+    def __init__(self, case_id, driver_id, rfid1_number, rfid2_number):
+        self.case_id = case_id
+        self.driver_id = driver_id
+        self.tags = {'rfid1': rfid1_number, 'rfid2': rfid2_number}
+
+
+class CaseLinker:
+    """Pending-case table plus single-statement linking"""
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.cases = {}
+        self.by_driver = {}
+        self.waiting = {slot: OrderedDict() for slot in SLOTS}
+        self.by_tag = {}
+        self.last_case_id = 0
+        self.stale = True
+        # Counters
+        self.links = 0
+        self.retries = 0
+        self.unlinked = 0
+        self.rereads = 0
+
+    # ------------------------------------------------------------------
+    # Pending table
+    # ------------------------------------------------------------------
+    def _add(self, case_id, driver_id, rfid1_number, rfid2_number):
+        self.last_case_id = max(self.last_case_id, case_id)
+        previous = self.by_driver.get(driver_id)
+        if previous is not None and previous > case_id:
+            return
+        if previous is not None:
+            # The driver's older case is superseded
+            self._drop(previous)
+        case = self.cases[case_id] = PendingCase(case_id, driver_id, rfid1_number, rfid2_number)
+        self.by_driver[driver_id] = case_id
+        for slot, uid in case.tags.items():
+            if uid:
+                self.by_tag[uid] = case_id
+            else:
+                self.waiting[slot][case_id] = None
+
+    def _drop(self, case_id):
+        case = self.cases.pop(case_id, None)
+        if case is None:
+            return
+        if self.by_driver.get(case.driver_id) == case_id:
+            del self.by_driver[case.driver_id]
+        for slot, uid in case.tags.items():
+            self.waiting[slot].pop(case_id, None)
+            if uid and self.by_tag.get(uid) == case_id:
+                del self.by_tag[uid]
+
+    def load(self, conn):
+        """Rebuild the pending table from the database"""
+        with self.lock:
+            self.cases.clear()
+            self.by_driver.clear()
+            self.by_tag.clear()
+            for waiting in self.waiting.values():
+                waiting.clear()
+            self.last_case_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM emergency_case").fetchone()[0]
+            # Each driver's newest case - older ones are superseded
+            # (driver_current_case is kept up to date by triggers)
+            rows = conn.execute("""
+                SELECT c.id, c.driver_id, c.rfid1_number, c.rfid2_number
+                FROM driver_current_case d JOIN emergency_case c ON c.id = d.case_id
+                ORDER BY d.case_id
+            """)
+            for row in rows:
+                self._add(*row)
+            self.stale = False
+
+    def refresh(self, conn):
+        """Pick up cases created since the last load/refresh"""
+        with self.lock:
+            if self.stale:
+                return self.load(conn)
+            rows = conn.execute("""
+                SELECT id, driver_id, rfid1_number, rfid2_number FROM emergency_case
+                WHERE id > ? ORDER BY id
+            """, (self.last_case_id,)).fetchall()
+            for row in rows:
+                self._add(*row)
+
+    def invalidate(self):
+        """Reload on the next link() (call after a rolled-back transaction)"""
+        self.stale = True
+
+    def candidates(self, uid, slot):
+        """Case ids to try for a tag at this reader, best first"""
+        same_ambulance = self.by_tag.get(uid)
+        if same_ambulance is not None and same_ambulance in self.waiting[slot]:
+            yield same_ambulance
+        for case_id in reversed(self.waiting[slot]):
+            if case_id != same_ambulance:
+                yield case_id
+
+    # ------------------------------------------------------------------
+    # Linking
+    # ------------------------------------------------------------------
+    def link(self, c, uid, reader_type):
+        """Link a tag to a waiting case using cursor c (inside the caller's
+        immediate transaction).  Returns (case_id, fully_linked, claimed):
+        claimed is False when the tag already filled this slot of case_id.
+        (None, False, False) if nothing was linked.
+        """
+        column = SLOTS.get(reader_type)
+        if column is None:
+            return None, False, False
+        other = SLOTS['rfid2' if reader_type == 'rfid1' else 'rfid1']
+        with self.lock:
+            self.refresh(c)
+            current = self.cases.get(self.by_tag.get(uid))
+            if current is not None and current.tags[reader_type] == uid:
+                self.rereads += 1
+                return current.case_id, bool(current.tags['rfid1'] and current.tags['rfid2']), False
+            for case_id in list(itertools.islice(self.candidates(uid, reader_type), MAX_ATTEMPTS)):
+                row = c.execute(f"""
+                    UPDATE emergency_case
+                    SET {column} = ?, rfid_linked = ({other} IS NOT NULL)
+                    WHERE id = ? AND {column} IS NULL
+                    RETURNING rfid1_number, rfid2_number
+                """, (uid, case_id)).fetchone()
+                if row is None:
+                    # Linked (or deleted) elsewhere - forget it and try the next one
+                    self.retries += 1
+                    self.waiting[reader_type].pop(case_id, None)
+                    continue
+                case = self.cases[case_id]
+                case.tags = {'rfid1': row[0], 'rfid2': row[1]}
+                self.links += 1
+                self.waiting[reader_type].pop(case_id, None)
+                self.by_tag[uid] = case_id
+                return case_id, bool(row[0] and row[1]), True
+            self.unlinked += 1
+            return None, False, False
+
+    def stats(self):
+        with self.lock:
+            return {
+                'pending_cases': sum(1 for case in self.cases.values() if None in case.tags.values()),
+                'waiting': {slot: len(waiting) for slot, waiting in self.waiting.items()},
+                'links': self.links,
+                'retries': self.retries,
+                'unlinked_scans': self.unlinked,
+                'rereads': self.rereads,
+            }
+
@@ -0,0 +1,108 @@
+import os
+import socket
+from collections import namedtuple
+
+from db import connection
+from scan_bus import SOCKET_DIR
+
+# ============================================================================
+# CHANGE FEED FOR rfid_logs.db
+# ============================================================================
+#
+# Triggers (migration 3) append a row to change_log for every scan and every
+# case insert/link.  Consumers read change_log through a cursor on its seq
+# column, so rows arrive in commit order and are never read twice.
+#
+# Instead of polling change_log, a consumer binds a wakeup socket in
+# FEED_DIR.  Writers call notify_changes() after committing, which sends one
+# byte to every socket there; the consumer's wait() returns straight away.
+
+FEED_DIR = os.path.join(SOCKET_DIR, 'feed')
+# Events read per query
+READ_BATCH = 500
+
+ChangeEvent = namedtuple('ChangeEvent', ['seq', 'table_name', 'row_id', 'op'])
+
+_notify_socket = None
+
+
+def notify_changes():
+    """Wake every feed subscriber (call after committing)"""
+    global _notify_socket
+    try:
+        names = os.listdir(FEED_DIR)
+    except OSError:
+        return
+    if _notify_socket is None:
+        _notify_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        _notify_socket.setblocking(False)
+    for name in names:
+        path = os.path.join(FEED_DIR, name)
+        try:
+            _notify_socket.sendto(b'!', path)
+        except BlockingIOError:
+            # Subscriber already has wakeups queued - one is enough
+            pass
+        except (ConnectionRefusedError, FileNotFoundError):
+            # Subscriber exited without cleaning up its socket
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        except OSError:
+            # e.g. PermissionError: the subscriber runs as another user.  It
+            # still sees the change on its next poll.
+            pass
+
+
+class ChangeFeed:
+    """Cursor over change_log plus a wakeup socket"""
+    def __init__(self, name):
+        self.cursor = 0
+        os.makedirs(FEED_DIR, exist_ok=True)
+        self.path = os.path.join(FEED_DIR, f"{name}-{os.getpid()}.sock")
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.wakeup = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.wakeup.bind(self.path)
+
+    def skip_to_end(self, conn=None):
+        """Start after the newest event, ignoring history"""
+        if conn is None:
+            with connection() as conn:
+                return self.skip_to_end(conn)
+        self.cursor = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+
+    def read(self, conn=None, limit=READ_BATCH):
+        """Events after the cursor, oldest first; advances the cursor"""
+        if conn is None:
+            with connection() as conn:
+                return self.read(conn, limit)
+        events = [ChangeEvent(*row) for row in conn.execute("""
+            SELECT seq, table_name, row_id, op FROM change_log
+            WHERE seq > ? ORDER BY seq LIMIT ?
+        """, (self.cursor, limit))]
+        if events:
+            self.cursor = events[-1].seq
+        return events
+
+    def wait(self, timeout=None):
+        """Block until a writer notifies (True) or the timeout expires (False)"""
+        self.wakeup.settimeout(timeout)
+        try:
+            self.wakeup.recv(16)
+        except (socket.timeout, BlockingIOError):
+            return False
+        # Collapse any further queued wakeups into this one
+        self.wakeup.setblocking(False)
+        try:
+            while True:
+                self.wakeup.recv(16)
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        self.wakeup.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
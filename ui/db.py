@@ -0,0 +1,154 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# ============================================================================
+# SHARED SQLITE CONNECTION LAYER
+# ============================================================================
+#
+# app.py, the reader threads and the traffic controllers all share
+# rfid_logs.db.  Connections are pooled instead of opened per call, and every
+# connection runs in WAL mode so readers never block the scan writer (and the
+# writer never blocks readers).
+
+DB_PATH = os.environ.get('ETPS_DB_PATH', 'rfid_logs.db')
+
+# UPDATE ... RETURNING (case_linker.py) needs SQLite 3.35
+MIN_SQLITE_VERSION = (3, 35, 0)
+if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+    raise RuntimeError(f"SQLite {sqlite3.sqlite_version} is too old - "
+                       f"{'.'.join(map(str, MIN_SQLITE_VERSION))} or newer is required")
+
+# Seconds a writer waits for another writer before "database is locked"
+BUSY_TIMEOUT = 5.0
+# Idle connections kept around for reuse
+POOL_SIZE = 8
+# Prepared statements kept per connection (sqlite3 caches them by SQL text)
+STATEMENT_CACHE_SIZE = 128
+
+PRAGMAS = [
+    # Lets retention.py hand freed pages back to the filesystem.  Only takes
+    # effect on a new database, so it must come before journal_mode; older
+    # databases are converted once, offline, by `python retention.py convert`
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    # NORMAL is durable across application crashes in WAL mode and only
+    # syncs at checkpoints, instead of on every commit
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-8000",  # 8 MB page cache
+    "PRAGMA temp_store=MEMORY",
+]
+
+
+class ConnectionPool:
+    """Pool of tuned SQLite connections, one checked out per thread at a time"""
+    def __init__(self, path=DB_PATH, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self.idle = queue.LifoQueue(maxsize=size)
+        self.local = threading.local()
+        self.pid = os.getpid()
+        # Connections inherited across a fork - never used, never closed
+        self.inherited = []
+        # Called with no arguments after every transaction() commit
+        self.commit_hooks = []
+
+    def _after_fork(self):
+        """Drop the parent's connections in a forked child (e.g. a gunicorn
+        worker).  They are kept rather than closed: closing a copy of the
+        parent's SQLite handle can release locks the parent still holds."""
+        while True:
+            try:
+                self.inherited.append(self.idle.get_nowait())
+            except queue.Empty:
+                break
+        self.idle = queue.LifoQueue(maxsize=self.size)
+        self.local = threading.local()
+        self.pid = os.getpid()
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; nested calls in the same thread reuse it"""
+        if self.pid != os.getpid():
+            self._after_fork()
+        held = getattr(self.local, 'conn', None)
+        if held is not None:
+            yield held
+            return
+
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+
+        self.local.conn = conn
+        try:
+            yield conn
+        finally:
+            self.local.conn = None
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self.idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """Commit on success, roll back on error.
+
+        immediate=True takes the write lock up front, so the transaction
+        cannot fail halfway through with "database is locked".
+        """
+        with self.connection() as conn:
+            # Already inside a transaction further up the stack - join it
+            if conn.in_transaction:
+                yield conn
+                return
+            if immediate:
+                conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            # The data is committed - a failing hook must not look like a failed write
+            for hook in self.commit_hooks:
+                try:
+                    hook()
+                except Exception as e:
+                    print(f"[DB] Commit hook {getattr(hook, '__name__', hook)} failed: {e}")
+
+    def add_commit_hook(self, hook):
+        """Run hook() after each committed transaction (e.g. notify_changes)"""
+        if hook not in self.commit_hooks:
+            self.commit_hooks.append(hook)
+
+    def close_all(self):
+        """Close idle connections (e.g. before deleting the database file)"""
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# Default pool for rfid_logs.db
+pool = ConnectionPool()
+connection = pool.connection
+transaction = pool.transaction
+add_commit_hook = pool.add_commit_hook
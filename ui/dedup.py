@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# ============================================================================
+# SCAN DEDUPLICATION
+# ============================================================================
+#
+# A tag left near a reader is read over and over.  Without this every read
+# becomes a new rfid_scans row and a new priority decision (resetting the
+# priority timer or flashing another denial).
+#
+# ScanDedup remembers when each (reader, uid) was last seen.  A scan within
+# TTL seconds of the previous one is a duplicate - and it refreshes the
+# timestamp, so a tag that stays put is reported once, not once per TTL.
+# The same tag is reported again after it has been away for TTL seconds.
+#
+# Entries are kept in last-seen order (an OrderedDict), which is both the
+# LRU order and the expiry order: expired entries are trimmed from the
+# front, and past MAX_ENTRIES the least recently seen key is evicted.
+
+TTL = float(os.environ.get('ETPS_DEDUP_TTL', '5'))
+MAX_ENTRIES = 4096
+
+
+class ScanDedup:
+    """Bounded TTL + LRU cache of recently seen (reader, uid) pairs"""
+    def __init__(self, ttl=TTL, max_entries=MAX_ENTRIES, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.seen = OrderedDict()
+        self.lock = threading.Lock()
+        # Counters
+        self.passed = 0
+        self.suppressed = 0
+        self.evicted = 0
+        self.suppressed_by_reader = {}
+
+    def duplicate(self, reader, uid, now=None):
+        """True if this scan repeats one seen less than ttl seconds ago"""
+        if now is None:
+            now = self.clock()
+        key = (reader, str(uid))
+        with self.lock:
+            self._expire(now)
+            last = self.seen.pop(key, None)
+            self.seen[key] = now
+            if last is not None and now - last < self.ttl:
+                self.suppressed += 1
+                self.suppressed_by_reader[reader] = self.suppressed_by_reader.get(reader, 0) + 1
+                return True
+            self.passed += 1
+            if len(self.seen) > self.max_entries:
+                self.seen.popitem(last=False)
+                self.evicted += 1
+            return False
+
+    def _expire(self, now):
+        while self.seen:
+            key, last = next(iter(self.seen.items()))
+            if now - last < self.ttl:
+                break
+            del self.seen[key]
+
+    def forget(self, reader, uid):
+        """Let the next scan of this tag through"""
+        with self.lock:
+            self.seen.pop((reader, str(uid)), None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'ttl': self.ttl,
+                'entries': len(self.seen),
+                'passed': self.passed,
+                'suppressed': self.suppressed,
+                'suppressed_by_reader': dict(self.suppressed_by_reader),
+                'evicted': self.evicted,
+            }
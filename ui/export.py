@@ -0,0 +1,198 @@
+"""Streaming CSV / NDJSON export of rfid_scans, rfid_reading and emergency_case.
+
+    python export.py rfid_reading --since 2025-01-01 --until 2025-02-01 > readings.csv
+    python export.py emergency_case --driver driver123 --format ndjson -o cases.ndjson
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+
+from db import connection
+
+# ============================================================================
+# STREAMING EXPORT
+# ============================================================================
+#
+# Exports are generators of text chunks, so /api/export/<table> and the CLI
+# hold one chunk in memory however many rows they write.  Rows come in time
+# order from keyset-paginated reads of CHUNK_ROWS rows -
+#
+#   WHERE (timestamp, id) > (<last row>) AND id <= <max id at start>
+#   ORDER BY timestamp, id LIMIT CHUNK_ROWS
+#
+# - each a short read on the timestamp index that returns its connection to
+# the pool before the chunk is sent.  No read transaction stays open while a
+# slow client downloads, so WAL checkpoints keep up and the ingest daemon's
+# writes are never held back by an export.  Rows inserted after the export
+# started are left out.
+#
+# Filters: since <= timestamp < until (strings compared as stored: rfid_scans
+# is UTC, the other tables Pi local time) and driver_id.  Readings belong to
+# a driver through their case; scans through the tags on the driver's cases.
+# Days archived by retention.py are read from their segments first, unless
+# archived=False.  A retention pass that runs mid-export can move rows not
+# yet exported into a segment; those rows are skipped.
+
+# Rows per database read and per chunk yielded
+CHUNK_ROWS = 1000
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# table -> (time column, driver filter)
+TABLES = {
+    'rfid_scans': ('timestamp', '''data IN (
+        SELECT rfid1_number FROM emergency_case WHERE driver_id = :driver_id
+        UNION SELECT rfid2_number FROM emergency_case WHERE driver_id = :driver_id)'''),
+    'rfid_reading': ('timestamp', "case_id IN (SELECT id FROM emergency_case WHERE driver_id = :driver_id)"),
+    'emergency_case': ('created_at', "driver_id = :driver_id"),
+}
+
+
+def _archived_rows(conn, table, columns, since, until, driver_id):
+    """Generator over the matching rows in retention segments (listed now, read lazily)"""
+    from retention import ARCHIVE_DIR, TABLES as ARCHIVED_TABLES, read_segment
+
+    if table not in ARCHIVED_TABLES:
+        return iter(())
+    segments = conn.execute("""
+        SELECT path FROM archive_segment
+        WHERE table_name = ? AND day >= ? AND day <= ?
+        ORDER BY day, first_id
+    """, (table, (since or '')[:10], (until or '9999-12-31')[:10])).fetchall()
+    if driver_id is None:
+        allowed = None
+    elif table == 'rfid_reading':
+        allowed = ('case_id', {row[0] for row in conn.execute(
+            "SELECT id FROM emergency_case WHERE driver_id = ?", (driver_id,))})
+    else:
+        allowed = ('data', {tag for row in conn.execute(
+            "SELECT rfid1_number, rfid2_number FROM emergency_case WHERE driver_id = ?", (driver_id,)) for tag in row})
+
+    def generate():
+        for (path,) in segments:
+            for row in read_segment(path, ARCHIVE_DIR):
+                timestamp = str(row.get('timestamp'))
+                if since is not None and timestamp < since:
+                    continue
+                if until is not None and timestamp >= until:
+                    continue
+                if allowed is not None and row.get(allowed[0]) not in allowed[1]:
+                    continue
+                yield tuple(row.get(column) for column in columns)
+    return generate()
+
+
+def rows(table, since=None, until=None, driver_id=None, archived=True, chunk_rows=CHUNK_ROWS):
+    """(columns, generator of row tuples) for one table, oldest first"""
+    if table not in TABLES:
+        raise ValueError(f"cannot export {table!r}, expected one of {', '.join(TABLES)}")
+    time_column, driver_filter = TABLES[table]
+
+    with connection() as conn:
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        last_id = conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0] or 0
+        old = _archived_rows(conn, table, columns, since, until, driver_id) if archived else iter(())
+
+    where = [f"({time_column}, id) > (:after_time, :after_id)", "id <= :last_id"]
+    if until is not None:
+        where.append(f"{time_column} < :until")
+    if driver_id is not None:
+        where.append(driver_filter)
+    sql = f"""
+        SELECT * FROM {table} WHERE {' AND '.join(where)}
+        ORDER BY {time_column}, id LIMIT :limit
+    """
+    time_index = columns.index(time_column)
+    params = {'after_time': since or '', 'after_id': 0, 'last_id': last_id,
+              'until': until, 'driver_id': driver_id, 'limit': chunk_rows}
+
+    def generate():
+        yield from old
+        while True:
+            with connection() as conn:
+                batch = conn.execute(sql, params).fetchall()
+            yield from batch
+            if len(batch) < chunk_rows:
+                return
+            params['after_time'], params['after_id'] = batch[-1][time_index], batch[-1][0]
+    return columns, generate()
+
+
+def _csv_chunks(columns, row_iter, chunk_rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    n = 0
+    for row in row_iter:
+        writer.writerow(row)
+        n += 1
+        if n % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(columns, row_iter, chunk_rows):
+    lines = []
+    for row in row_iter:
+        lines.append(json.dumps(dict(zip(columns, row)), default=str))
+        if len(lines) == chunk_rows:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+CHUNKERS = {'csv': _csv_chunks, 'ndjson': _ndjson_chunks}
+
+
+def export(table, fmt='csv', since=None, until=None, driver_id=None, archived=True, chunk_rows=CHUNK_ROWS):
+    """Generator of text chunks of table in fmt ('csv' or 'ndjson').  Bad
+    arguments raise ValueError here, before the first chunk."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}, expected one of {', '.join(FORMATS)}")
+    columns, row_iter = rows(table, since, until, driver_id, archived, chunk_rows)
+    return CHUNKERS[fmt](columns, row_iter, chunk_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('table', choices=list(TABLES))
+    parser.add_argument('--format', default='csv', choices=list(FORMATS))
+    parser.add_argument('--since', help="first timestamp, e.g. 2025-01-01 or '2025-01-01 08:00:00'")
+    parser.add_argument('--until', help="timestamp to stop before")
+    parser.add_argument('--driver', help="only rows belonging to this driver's cases")
+    parser.add_argument('--no-archive', action='store_true', help="skip days archived by retention.py")
+    parser.add_argument('-o', '--output', help="file to write (default stdout)")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    columns, row_iter = rows(args.table, args.since, args.until, args.driver, not args.no_archive)
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in row_iter:
+            count += 1
+            yield row
+
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        for chunk in CHUNKERS[args.format](columns, counted(), CHUNK_ROWS):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+    # stderr, so it doesn't end up in an export written to stdout
+    print(f"[EXPORT] {count} {args.table} rows in {time.monotonic() - started:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
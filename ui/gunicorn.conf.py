@@ -0,0 +1,46 @@
+import multiprocessing
+import os
+
+# ============================================================================
+# GUNICORN (PRODUCTION WEB TIER)
+# ============================================================================
+#
+#   python ingest_daemon.py &                     # the RFID readers
+#   gunicorn -c gunicorn.conf.py app:app          # the web app
+#
+# Workers never touch the readers (see ingest.py), so any number of them can
+# run.  gthread workers keep connections alive between requests, and every
+# open /api/live stream (Server-Sent Events) holds one worker thread for as
+# long as the dashboard is open - size ETPS_WEB_THREADS for the number of
+# dashboards plus request concurrency.
+#
+# TLS: if ETPS_TLS_CERT / ETPS_TLS_KEY (default cert.pem / key.pem, as app.py
+# uses) exist, gunicorn terminates TLS itself; otherwise run it behind a
+# reverse proxy (nginx, caddy) that does, and it trusts X-Forwarded-* from
+# ETPS_FORWARDED_ALLOW_IPS.
+
+bind = os.environ.get('ETPS_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('ETPS_WEB_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = 'gthread'
+threads = int(os.environ.get('ETPS_WEB_THREADS', 16))
+keepalive = 5
+# gthread workers heartbeat from their main thread, so long SSE streams are fine
+timeout = 30
+graceful_timeout = 10
+# Import app.py (and build the hospital index) once, before forking
+preload_app = True
+
+certfile = os.environ.get('ETPS_TLS_CERT', 'cert.pem')
+keyfile = os.environ.get('ETPS_TLS_KEY', 'key.pem')
+if not (os.path.exists(certfile) and os.path.exists(keyfile)):
+    certfile = keyfile = None
+forwarded_allow_ips = os.environ.get('ETPS_FORWARDED_ALLOW_IPS', '127.0.0.1')
+
+
+def on_starting(server):
+    """Migrate the database once, in the master, before any worker starts"""
+    import app
+    from db import pool
+    app.init_db()
+    # Workers are forked from the master - don't hand them its connections
+    pool.close_all()
@@ -0,0 +1,341 @@
+import os
+import pty
+import random
+import threading
+import time
+import tty
+import zlib
+from collections import deque
+
+# ============================================================================
+# HARDWARE ABSTRACTION LAYER
+# ============================================================================
+#
+# Controllers and readers get their GPIO, serial port and MFRC522 from here
+# instead of importing RPi.GPIO / serial / mfrc522 directly, so the whole
+# stack also runs on a machine without the hardware.
+#
+#   ETPS_HAL=real - always use the real libraries (fails if missing)
+#   ETPS_HAL=sim  - always use the simulated devices below
+#   ETPS_HAL=auto - real if RPi.GPIO imports, simulated otherwise (default)
+#
+# Simulated readers replay scripted tag arrivals: ETPS_SIM_RATE scans per
+# minute (Poisson, default 0 = no tags) drawn from ETPS_SIM_TAGS (comma
+# separated numbers).  A simulated MFRC522 sees each card for ETPS_SIM_DWELL
+# seconds, like a card held briefly to the antenna.  Benchmarks attach their
+# own ScanScript with script().
+# Simulated GPIO records every pin transition with a timestamp.
+
+HAL_MODE = os.environ.get('ETPS_HAL', 'auto')
+SIM_RATE = float(os.environ.get('ETPS_SIM_RATE', '0'))
+SIM_TAGS = [tag for tag in os.environ.get('ETPS_SIM_TAGS', '').split(',') if tag]
+SIM_DWELL = float(os.environ.get('ETPS_SIM_DWELL', '0.5'))
+# Transitions kept by SimulatedGPIO (oldest are dropped first)
+TRANSITION_LOG_SIZE = 100000
+
+
+# ============================================================================
+# SCRIPTED TAG ARRIVALS
+# ============================================================================
+
+def poisson_arrivals(rate_per_minute, tags=None, seed=None, count=None):
+    """(seconds from start, uid) pairs with exponential gaps"""
+    rng = random.Random(seed)
+    tags = tags or [str(rng.randrange(10 ** 11, 10 ** 12)) for _ in range(20)]
+    at = 0.0
+    sent = 0
+    while count is None or sent < count:
+        at += rng.expovariate(rate_per_minute / 60)
+        yield at, rng.choice(tags)
+        sent += 1
+
+
+class ScanScript:
+    """Hands out scripted arrivals when they fall due (thread safe)"""
+    def __init__(self, arrivals=(), clock=time.monotonic):
+        self.arrivals = iter(arrivals)
+        self.clock = clock
+        self.started = clock()
+        self.upcoming = None
+        self.lock = threading.Lock()
+        # (time the tag arrived at the reader, time it was read, uid)
+        self.delivered = []
+        # (time the tag arrived, uid) for tags that left unread
+        self.missed = []
+        self.fetch()
+
+    def fetch(self):
+        offset_uid = next(self.arrivals, None)
+        self.upcoming = None if offset_uid is None else (self.started + offset_uid[0], offset_uid[1])
+
+    def due(self):
+        """Seconds until the next arrival (None if the script has ended)"""
+        with self.lock:
+            if self.upcoming is None:
+                return None
+            return max(0.0, self.upcoming[0] - self.clock())
+
+    def take(self, timeout=None):
+        """Wait up to timeout for the next tag; None if nothing arrived"""
+        wait = self.due()
+        if wait is None or (timeout is not None and wait > timeout):
+            # Script over (or next tag too far away) - behave like a read timeout
+            time.sleep(timeout if timeout is not None else 1.0)
+            return None
+        if wait:
+            time.sleep(wait)
+        with self.lock:
+            if self.upcoming is None:
+                return None
+            arrived, uid = self.upcoming
+            self.delivered.append((arrived, self.clock(), uid))
+            self.fetch()
+            return uid
+
+    def arrived(self):
+        """Arrivals that have fallen due, without waiting: [(time, uid)]"""
+        with self.lock:
+            now = self.clock()
+            due = []
+            while self.upcoming is not None and self.upcoming[0] <= now:
+                due.append(self.upcoming)
+                self.fetch()
+            return due
+
+    def record(self, arrived, uid, read=True):
+        """Note that a tag from arrived() was read (or left unread)"""
+        with self.lock:
+            if read:
+                self.delivered.append((arrived, self.clock(), uid))
+            else:
+                self.missed.append((arrived, uid))
+
+
+_scripts = {}
+
+
+def script(device, arrivals):
+    """Attach scripted arrivals to a simulated device name ('serial:/dev/ttyUSB0', 'mfrc522:0.0')"""
+    _scripts[device] = ScanScript(arrivals)
+    return _scripts[device]
+
+
+def _script_for(device):
+    if device not in _scripts:
+        arrivals = poisson_arrivals(SIM_RATE, SIM_TAGS) if SIM_RATE > 0 else ()
+        _scripts[device] = ScanScript(arrivals)
+    return _scripts[device]
+
+
+# ============================================================================
+# SIMULATED DEVICES
+# ============================================================================
+
+class SimulatedGPIO:
+    """Stand-in for the RPi.GPIO module that remembers pin levels"""
+    BOARD = 10
+    BCM = 11
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.mode = None
+        self.levels = {}
+        self.writes = 0
+        # (time, pin, level) for every change of level
+        self.transitions = deque(maxlen=TRANSITION_LOG_SIZE)
+        self.changed = threading.Condition()
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def getmode(self):
+        return self.mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, initial=LOW):
+        pins = pin if isinstance(pin, (list, tuple)) else [pin]
+        with self.changed:
+            for p in pins:
+                self.levels.setdefault(p, initial)
+
+    def output(self, pin, value):
+        # Like RPi.GPIO: one pin, or a list of pins with a value or list of values
+        pins = pin if isinstance(pin, (list, tuple)) else [pin]
+        values = value if isinstance(value, (list, tuple)) else [value] * len(pins)
+        with self.changed:
+            now = self.clock()
+            for p, v in zip(pins, values):
+                self.writes += 1
+                v = self.HIGH if v else self.LOW
+                if self.levels.get(p) != v:
+                    self.levels[p] = v
+                    self.transitions.append((now, p, v))
+            self.changed.notify_all()
+
+    def input(self, pin):
+        return self.levels.get(pin, self.LOW)
+
+    def cleanup(self, *pins):
+        with self.changed:
+            for p in (pins or list(self.levels)):
+                self.levels[p] = self.LOW
+
+    def wait_for(self, pin, level, timeout=None):
+        """Block until pin is at level; time it was seen there, or None on timeout"""
+        with self.changed:
+            if self.changed.wait_for(lambda: self.levels.get(pin) == level, timeout):
+                return self.clock()
+            return None
+
+
+class SimulatedSerial:
+    """Stand-in for serial.Serial that 'receives' scripted tag lines"""
+    def __init__(self, port, baudrate=9600, timeout=None):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.script = _script_for(f"serial:{port}")
+        self.is_open = True
+
+    @property
+    def in_waiting(self):
+        due = self.script.due()
+        return 16 if due == 0 else 0
+
+    def readline(self):
+        uid = self.script.take(self.timeout)
+        return b'' if uid is None else f"{uid}\r\n".encode('utf-8')
+
+    def write(self, data):
+        return len(data)
+
+    def close(self):
+        self.is_open = False
+
+
+class PtySerialFeeder:
+    """Pseudo-terminal that 'receives' scripted tag lines.
+
+    Open .path like a real serial port - for code that reads the device
+    itself (serial_ingest.py) rather than through a Serial object.
+    """
+    def __init__(self, port):
+        self.script = _script_for(f"serial:{port}")
+        self.master, self.slave = pty.openpty()
+        # Raw, so lines arrive unchanged and nothing is echoed back
+        tty.setraw(self.slave)
+        self.path = os.ttyname(self.slave)
+        self.thread = threading.Thread(target=self._feed, name=f"pty-feeder-{port}", daemon=True)
+        self.thread.start()
+
+    def _feed(self):
+        while True:
+            uid = self.script.take(timeout=1.0)
+            if uid is not None:
+                os.write(self.master, f"{uid}\r\n".encode('utf-8'))
+
+
+_feeders = {}
+
+
+class SimulatedMFRC522:
+    """Stand-in for mfrc522.MFRC522, the low-level driver.
+
+    A scripted tag sits on the antenna for dwell seconds after it arrives;
+    MFRC522_Request only finds it while it is there, so a reader that polls
+    too slowly misses it (recorded in the script's missed list).
+    """
+    MI_OK = 0
+    MI_NOTAGERR = 1
+    MI_ERR = 2
+    PICC_REQIDL = 0x26
+
+    def __init__(self, device='mfrc522:0.0', dwell=None):
+        self.script = _script_for(device)
+        self.dwell = SIM_DWELL if dwell is None else dwell
+        # [arrived, uid, read] for cards at or queued for the antenna
+        self.cards = deque()
+
+    def _card(self):
+        now = self.script.clock()
+        for arrived, uid in self.script.arrived():
+            self.cards.append([arrived, uid, False])
+        while self.cards and self.cards[0][0] + self.dwell < now:
+            arrived, uid, read = self.cards.popleft()
+            if not read:
+                self.script.record(arrived, uid, read=False)
+        return self.cards[0] if self.cards else None
+
+    def MFRC522_Request(self, mode):
+        if self._card() is None:
+            return self.MI_NOTAGERR, None
+        return self.MI_OK, 0x10
+
+    def MFRC522_Anticoll(self):
+        card = self._card()
+        if card is None:
+            return self.MI_ERR, []
+        if not card[2]:
+            card[2] = True
+            self.script.record(card[0], card[1])
+        uid = card[1]
+        number = int(uid) if uid.isdigit() else zlib.crc32(uid.encode('utf-8'))
+        # Five bytes (four UID bytes + check byte), as SimpleMFRC522 numbers them
+        return self.MI_OK, list((number % 2 ** 40).to_bytes(5, 'big'))
+
+
+# ============================================================================
+# BACKEND SELECTION
+# ============================================================================
+
+def _real_gpio():
+    import RPi.GPIO
+    return RPi.GPIO
+
+
+if HAL_MODE == 'real':
+    GPIO = _real_gpio()
+    HARDWARE = True
+elif HAL_MODE == 'sim':
+    GPIO = SimulatedGPIO()
+    HARDWARE = False
+else:
+    try:
+        GPIO = _real_gpio()
+        HARDWARE = True
+    except (ImportError, RuntimeError):
+        # RuntimeError: RPi.GPIO installed but not running on a Pi
+        print("[HAL] RPi.GPIO not available - using simulated hardware")
+        GPIO = SimulatedGPIO()
+        HARDWARE = False
+
+
+def open_serial(port, baudrate=9600, timeout=1):
+    """serial.Serial on real hardware, SimulatedSerial otherwise"""
+    if HARDWARE:
+        import serial
+        return serial.Serial(port=port, baudrate=baudrate, timeout=timeout)
+    return SimulatedSerial(port, baudrate, timeout)
+
+
+def serial_device(port):
+    """Path to open for a serial port: the port itself, or a simulated pty"""
+    if HARDWARE:
+        return port
+    if port not in _feeders:
+        _feeders[port] = PtySerialFeeder(port)
+    return _feeders[port].path
+
+
+def open_mfrc522(bus=0, device=0, pin_rst=22):
+    """mfrc522.MFRC522 on real hardware, SimulatedMFRC522 otherwise"""
+    if HARDWARE:
+        from mfrc522 import MFRC522
+        return MFRC522(bus=bus, device=device, pin_rst=pin_rst)
+    return SimulatedMFRC522(f"mfrc522:{bus}.{device}")
@@ -0,0 +1,195 @@
+import csv
+import json
+import math
+import os
+import threading
+from collections import OrderedDict, defaultdict, namedtuple
+
+# ============================================================================
+# NEAREST-HOSPITAL INDEX
+# ============================================================================
+#
+# Hospitals are loaded once from a CSV (name,latitude,longitude[,...]) or a
+# JSON list of {"name", "latitude", "longitude"} objects and bucketed into a
+# grid of CELL_DEGREES x CELL_DEGREES cells.  nearest() searches rings of
+# cells outwards from the ambulance's cell and stops as soon as no unsearched
+# cell can hold anything closer than the k-th hospital found so far.
+#
+# Ambulances ask again every few seconds from nearly the same spot, so
+# results are cached per CACHE_DEGREES cell.  The cache holds every hospital
+# that could be among the k nearest for *any* point in that cell (the k
+# nearest to the cell centre, plus everything within one cell diagonal of
+# the k-th), and the final ranking is redone for the exact position - the
+# answer is the same as an uncached search.
+
+HOSPITALS_PATH = os.environ.get(
+    'ETPS_HOSPITALS',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hospitals.csv'),
+)
+
+# Grid cell size (0.05 degrees is about 5.5 km north-south)
+CELL_DEGREES = 0.05
+# Result cache cell size (about 1.1 km) and number of cells kept
+CACHE_DEGREES = 0.01
+CACHE_SIZE = 4096
+DEFAULT_K = 10
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+Hospital = namedtuple('Hospital', ['name', 'latitude', 'longitude'])
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def load_hospitals(path=HOSPITALS_PATH):
+    """Hospitals from a .csv or .json file"""
+    if path.endswith('.json'):
+        with open(path) as f:
+            rows = json.load(f)
+    else:
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+    hospitals = []
+    for row in rows:
+        try:
+            latitude, longitude = float(row['latitude']), float(row['longitude'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if row.get('name') and -90 <= latitude <= 90 and -180 <= longitude <= 180:
+            hospitals.append(Hospital(row['name'].strip(), latitude, longitude))
+    return hospitals
+
+
+class HospitalIndex:
+    """Grid index over hospital locations with a per-cell result cache"""
+    def __init__(self, hospitals, cell=CELL_DEGREES, cache_cell=CACHE_DEGREES, cache_size=CACHE_SIZE):
+        self.hospitals = list(hospitals)
+        self.cell = cell
+        self.cache_cell = cache_cell
+        self.cache_size = cache_size
+        self.grid = defaultdict(list)
+        for hospital in self.hospitals:
+            self.grid[self._cell(hospital.latitude, hospital.longitude)].append(hospital)
+        rows = [row for row, _ in self.grid] or [0]
+        cols = [col for _, col in self.grid] or [0]
+        self.bounds = (min(rows), max(rows), min(cols), max(cols))
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        # Counters
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.hospitals)
+
+    def _cell(self, latitude, longitude):
+        return math.floor(latitude / self.cell), math.floor(longitude / self.cell)
+
+    def _ring(self, row, col, radius):
+        """Cells exactly radius steps from (row, col), clipped to the data"""
+        min_row, max_row, min_col, max_col = self.bounds
+        for r in range(max(row - radius, min_row), min(row + radius, max_row) + 1):
+            if abs(r - row) == radius:
+                cols = range(max(col - radius, min_col), min(col + radius, max_col) + 1)
+            else:
+                cols = [c for c in (col - radius, col + radius) if min_col <= c <= max_col]
+            for c in cols:
+                cell = self.grid.get((r, c))
+                if cell:
+                    yield cell
+
+    def _radii(self, row, col):
+        """Ring radii that can hold hospitals: from the first ring to reach
+        the data to the last, so the work is bounded by the data's extent
+        however far away (row, col) is"""
+        min_row, max_row, min_col, max_col = self.bounds
+        first = max(0, min_row - row, row - max_row, min_col - col, col - max_col)
+        last = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+        return range(first, last + 1)
+
+    def _ring_distance_km(self, latitude, radius):
+        """Lower bound on the distance to anything outside ring radius - 1"""
+        if radius <= 1:
+            return 0.0
+        # Cells are narrowest (east-west) at the highest latitude they reach
+        highest = min(89.9, abs(latitude) + radius * self.cell)
+        return (radius - 1) * self.cell * KM_PER_DEGREE * math.cos(math.radians(highest))
+
+    def search(self, latitude, longitude, k, radius_km=None):
+        """[(distance km, hospital)] - the k nearest, or all within radius_km"""
+        row, col = self._cell(latitude, longitude)
+        found = []
+        for radius in self._radii(row, col):
+            limit = radius_km if radius_km is not None else (found[k - 1][0] if len(found) >= k else None)
+            if limit is not None and self._ring_distance_km(latitude, radius) > limit:
+                break
+            for cell in self._ring(row, col, radius):
+                for hospital in cell:
+                    distance = haversine_km(latitude, longitude, hospital.latitude, hospital.longitude)
+                    if radius_km is None or distance <= radius_km:
+                        found.append((distance, hospital))
+            found.sort(key=lambda item: item[0])
+            if radius_km is None:
+                del found[k:]
+        return found
+
+    def _candidates(self, key, k):
+        """Every hospital that can be in the k nearest from anywhere in cache cell key"""
+        with self.lock:
+            candidates = self.cache.get((key, k))
+            if candidates is not None:
+                self.cache.move_to_end((key, k))
+                self.hits += 1
+                return candidates
+            self.misses += 1
+        centre_lat = (key[0] + 0.5) * self.cache_cell
+        centre_lon = (key[1] + 0.5) * self.cache_cell
+        nearest = self.search(centre_lat, centre_lon, k)
+        if len(nearest) < k:
+            candidates = [hospital for _, hospital in nearest]
+        else:
+            # A point in the cell is at most half a diagonal from the centre
+            diagonal = haversine_km(centre_lat, centre_lon, centre_lat + self.cache_cell, centre_lon + self.cache_cell)
+            candidates = [hospital for _, hospital in self.search(centre_lat, centre_lon, k, nearest[-1][0] + diagonal)]
+        with self.lock:
+            self.cache[(key, k)] = candidates
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return candidates
+
+    def nearest(self, latitude, longitude, k=DEFAULT_K):
+        """The k nearest hospitals as [(distance km, Hospital)], closest first"""
+        key = (math.floor(latitude / self.cache_cell), math.floor(longitude / self.cache_cell))
+        ranked = sorted(
+            (haversine_km(latitude, longitude, hospital.latitude, hospital.longitude), hospital)
+            for hospital in self._candidates(key, k)
+        )
+        return ranked[:k]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hospitals': len(self.hospitals),
+                'cells': len(self.grid),
+                'cached_cells': len(self.cache),
+                'cache_hits': self.hits,
+                'cache_misses': self.misses,
+            }
+
+
+def load_hospital_index(path=HOSPITALS_PATH):
+    """HospitalIndex over the hospitals file, or None if there is no file"""
+    if not os.path.exists(path):
+        print(f"[HOSPITALS] No hospital list at {path} - using the fixed list")
+        return None
+    index = HospitalIndex(load_hospitals(path))
+    print(f"[HOSPITALS] Indexed {len(index)} hospitals in {len(index.grid)} cells")
+    return index
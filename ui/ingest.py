@@ -0,0 +1,241 @@
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from change_feed import notify_changes
+from case_linker import CaseLinker
+from db import add_commit_hook, transaction
+from dedup import ScanDedup
+from hal import HARDWARE, serial_device
+from intersections import load_serial_readers, load_spi_readers
+import metrics
+from mfrc522_poller import MFRC522Poller
+from scan_writer import ScanWriter
+from serial_ingest import SerialIngest
+
+# ============================================================================
+# SCAN INGESTION
+# ============================================================================
+#
+# The RFID readers, the dedup filter, case linking and the scan writer.
+# Only one process may own the serial ports and the SPI bus, so this module
+# is run by ingest_daemon.py; the web app (any number of worker processes)
+# talks to that daemon over its control socket and never opens the readers
+# itself.  save_rfid_to_db() is still usable from any process - linking is
+# a conditional UPDATE, so two writers can't claim the same case slot.
+
+# Real readers on the Pi; simulated ones (scripted tags, see hal.py) elsewhere
+RFID_AVAILABLE = HARDWARE
+
+# What record_rfid_scan wrote: case_id is the reading's case (None if none),
+# claimed whether this scan filled a slot of it (False for a re-read)
+SavedScan = namedtuple('SavedScan', ['reading_id', 'case_id', 'claimed'])
+
+def record_rfid_scan(c, rfid_number, reader_type, read_at=None):
+    """Insert one RFID reading and link it to a case, using cursor c.
+
+    Runs inside the caller's transaction - shared by save_rfid_to_db and the
+    group-commit scan writer.  Returns a SavedScan; pass it to
+    count_committed() once the transaction has committed.
+    """
+    read_at = read_at or time.time()
+    timestamp = datetime.fromtimestamp(read_at)
+
+    # Claim a waiting case for this tag (one conditional UPDATE)
+    case_id, fully_linked, claimed = case_linker.link(c, rfid_number, reader_type)
+
+    # Save to rfid_reading table
+    c.execute("""
+        INSERT INTO rfid_reading (rfid_number, reader_type, timestamp, case_id, processed) 
+        VALUES (?, ?, ?, ?, ?)
+    """, (rfid_number, reader_type, timestamp, case_id, case_id is not None))
+    
+    reading_id = c.lastrowid
+    print(f"[{reader_type.upper()}] Saved RFID reading: {rfid_number} (ID: {reading_id})")
+    
+    # Also save to rfid_scans for compatibility
+    c.execute("INSERT INTO rfid_scans (data, source, read_at) VALUES (?, ?, ?)", 
+             (rfid_number, f"Signal {1 if reader_type == 'rfid1' else 2}", read_at))
+    
+    if claimed:
+        print(f"{reader_type.upper()}: Linked {rfid_number} to case {case_id}")
+        if fully_linked:
+            print(f"Case {case_id} fully linked!")
+    
+    return SavedScan(reading_id, case_id, claimed)
+
+def count_committed(saved):
+    """Metrics for a scan whose transaction has committed (not before - it
+    could still be rolled back)"""
+    if saved.claimed:
+        metrics.inc('etps_case_links_total')
+
+def save_rfid_to_db(rfid_number, reader_type):
+    """Save RFID reading to database"""
+    try:
+        # IMMEDIATE takes the write lock up front so the link lookups and
+        # updates below cannot be interleaved with another reader's scan
+        with transaction(immediate=True) as conn:
+            saved = record_rfid_scan(conn.cursor(), rfid_number, reader_type)
+        count_committed(saved)
+        return True
+        
+    except Exception as e:
+        case_linker.invalidate()
+        print(f"Database error saving RFID ({reader_type}): {e}")
+        return False
+
+# Waiting cases, kept in memory so linking a scan is a single UPDATE
+case_linker = CaseLinker()
+
+# Reader threads queue scans here instead of committing each one themselves
+scan_writer = ScanWriter(record_rfid_scan, on_rollback=case_linker.invalidate, on_commit=count_committed)
+
+# Repeated reads of a tag that stays at the reader are dropped before they
+# reach the database (and so the priority controller)
+scan_dedup = ScanDedup()
+
+
+def ingest_scan(rfid_number, reader_type, read_at):
+    """Queue one scan from a reader unless it repeats a recent one"""
+    metrics.inc('etps_scans_read_total', reader=reader_type)
+    if scan_dedup.duplicate(reader_type, rfid_number):
+        metrics.inc('etps_scans_deduplicated_total', reader=reader_type)
+        return None
+    print(f"{reader_type.upper()} Received: {rfid_number}")
+    return scan_writer.submit(rfid_number, reader_type, read_at)
+
+# Wake change-feed subscribers (the priority controller) after every commit
+add_commit_hook(notify_changes)
+
+# ============================================================================
+# READERS
+# ============================================================================
+
+class RFID1Reader:
+    """RFID Reader 1 - Serial/USB connection(s) listed in intersections.json"""
+    def __init__(self):
+        self.running = False
+        self.ingest = None
+
+    def on_scan(self, reader_type, data, read_at):
+        """Called on the ingest loop for every line - must not block"""
+        ingest_scan(data, reader_type, read_at)
+
+    def start_reading(self):
+        if not RFID_AVAILABLE:
+            print("RFID1: Running in simulation mode")
+
+        try:
+            # Simulated hardware gets a pseudo-terminal per port
+            ports = [port._replace(port=serial_device(port.port)) for port in load_serial_readers()]
+            self.ingest = SerialIngest(ports, self.on_scan)
+            self.running = True
+            print(f"RFID1: Started reading from {len(ports)} serial port(s)...")
+            self.ingest.run()
+        except Exception as e:
+            print(f"RFID1 Error: {e}")
+        finally:
+            self.running = False
+
+    def stop_reading(self):
+        self.running = False
+        if self.ingest:
+            self.ingest.stop()
+
+class RFID2Reader:
+    """RFID Reader 2 - MFRC522 reader(s) on SPI, listed in intersections.json"""
+    def __init__(self):
+        self.running = False
+        self.poller = None
+
+    def on_scan(self, reader_type, data, read_at):
+        """Called on the polling thread for every new card"""
+        ingest_scan(data, reader_type, read_at)
+
+    def start_reading(self):
+        if not RFID_AVAILABLE:
+            print("RFID2: Running in simulation mode")
+
+        try:
+            self.poller = MFRC522Poller(load_spi_readers(), self.on_scan)
+            self.running = True
+            print("RFID2: Started polling MFRC522 reader(s)...")
+            self.poller.run()
+        except Exception as e:
+            print(f"RFID2 Error: {e}")
+        finally:
+            self.running = False
+
+    def stop_reading(self):
+        self.running = False
+        if self.poller:
+            self.poller.stop()
+
+# Global RFID reader instances
+rfid1_reader = RFID1Reader()
+rfid2_reader = RFID2Reader()
+
+# Reader threads, so a second start() can't open the same port twice
+_threads = {}
+_threads_lock = threading.Lock()
+_started_at = time.time()
+
+# How long stop_readers() waits for a reader thread to exit
+STOP_TIMEOUT = 5.0
+
+
+def start_readers():
+    """Start the scan writer and any reader not already running; returns the readers started"""
+    with _threads_lock:
+        scan_writer.start()
+        started = []
+        for name, reader in (('rfid1', rfid1_reader), ('rfid2', rfid2_reader)):
+            thread = _threads.get(name)
+            if thread and thread.is_alive():
+                continue
+            thread = _threads[name] = threading.Thread(target=reader.start_reading, name=f"{name}-reader", daemon=True)
+            thread.start()
+            started.append(name)
+        return started
+
+
+def stop_readers(timeout=STOP_TIMEOUT):
+    """Stop both readers (queued scans are still written); returns the readers stopped"""
+    with _threads_lock:
+        stopped = []
+        for name, reader in (('rfid1', rfid1_reader), ('rfid2', rfid2_reader)):
+            thread = _threads.pop(name, None)
+            if not (thread and thread.is_alive()):
+                continue
+            deadline = time.monotonic() + timeout
+            # A reader that is still opening its device misses the first stop
+            while thread.is_alive() and time.monotonic() < deadline:
+                reader.stop_reading()
+                thread.join(0.1)
+            stopped.append(name)
+        return stopped
+
+
+def readers_running():
+    with _threads_lock:
+        return sorted(name for name, thread in _threads.items() if thread.is_alive())
+
+
+def status():
+    """Everything the web app shows about ingestion, as one dict"""
+    ingest = rfid1_reader.ingest
+    poller = rfid2_reader.poller
+    return {
+        'pid': os.getpid(),
+        'uptime_s': round(time.time() - _started_at, 1),
+        'hardware': RFID_AVAILABLE,
+        'readers_running': readers_running(),
+        'serial_ports': ingest.stats() if ingest else [],
+        'spi_readers': poller.stats() if poller else [],
+        'scan_writer': scan_writer.stats(),
+        'scan_dedup': scan_dedup.stats(),
+        'case_linker': case_linker.stats(),
+    }
@@ -0,0 +1,180 @@
+"""RFID ingestion daemon: owns the readers, controlled over a Unix socket.
+
+    python ingest_daemon.py                 # run (starts the readers)
+    python ingest_daemon.py run --stopped   # run, readers off until "start"
+    python ingest_daemon.py status          # ask a running daemon
+    python ingest_daemon.py start | stop
+"""
+import argparse
+import fcntl
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+
+from scan_bus import SOCKET_DIR
+
+# ============================================================================
+# INGESTION DAEMON
+# ============================================================================
+#
+# Exactly one process on the Pi opens /dev/ttyUSB* and the SPI readers: this
+# one.  A second daemon exits straight away (it can't take LOCK_PATH), so
+# web workers, restarts and a stray `python ingest_daemon.py` never fight
+# over a port.
+#
+# Control API on CONTROL_PATH (stream socket, mode 0660): send one JSON line
+# {"command": "status" | "start" | "stop"}, get one JSON line back with
+# "ok" and the ingest.status() dict (plus "started"/"stopped" for those
+# commands).  control() below is the client the web app uses.
+#
+# The daemon also runs the retention job (retention.py) - it is the process
+# that writes the tables being archived.
+
+CONTROL_PATH = os.path.join(SOCKET_DIR, 'ingest.ctl')
+LOCK_PATH = os.path.join(SOCKET_DIR, 'ingest.lock')
+COMMANDS = ('status', 'start', 'stop')
+# Seconds a client waits for the daemon to answer
+CONTROL_TIMEOUT = 2.0
+# How often the daemon refreshes its gauges
+GAUGE_INTERVAL = 1.0
+
+
+# Set by serve(); its stats are part of every reply
+retention_job = None
+
+
+class DaemonNotRunning(Exception):
+    """Nothing is listening on the control socket"""
+
+
+def control(command, timeout=CONTROL_TIMEOUT, path=CONTROL_PATH):
+    """Send one command to the daemon; returns its reply dict"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        try:
+            sock.connect(path)
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            raise DaemonNotRunning(f"ingest daemon not running ({e.strerror})") from e
+        sock.sendall(json.dumps({'command': command}).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as reply:
+            line = reply.readline()
+        if not line:
+            raise DaemonNotRunning("ingest daemon closed the connection")
+        return json.loads(line)
+    finally:
+        sock.close()
+
+
+def running(path=CONTROL_PATH):
+    """True if a daemon answers on the control socket"""
+    try:
+        control('status', timeout=0.5, path=path)
+        return True
+    except (DaemonNotRunning, OSError, ValueError):
+        return False
+
+
+class ControlHandler(socketserver.StreamRequestHandler):
+    """One JSON command per line, one JSON reply per line"""
+    def handle(self):
+        import ingest
+        for line in self.rfile:
+            try:
+                command = json.loads(line).get('command')
+                if command not in COMMANDS:
+                    raise ValueError(f"unknown command {command!r}, expected one of {', '.join(COMMANDS)}")
+                reply = {'ok': True}
+                if command == 'start':
+                    reply['started'] = ingest.start_readers()
+                    print(f"[INGEST] Start requested, started {reply['started'] or 'nothing'}")
+                elif command == 'stop':
+                    reply['stopped'] = ingest.stop_readers()
+                    print(f"[INGEST] Stop requested, stopped {reply['stopped'] or 'nothing'}")
+                reply.update(ingest.status())
+                if retention_job is not None:
+                    reply['retention'] = retention_job.stats()
+            except Exception as e:
+                reply = {'ok': False, 'error': str(e)}
+            self.wfile.write(json.dumps(reply, default=str).encode('utf-8') + b'\n')
+
+
+class ControlServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(start_readers=True):
+    """Run the daemon until SIGTERM/SIGINT"""
+    global retention_job
+    os.makedirs(SOCKET_DIR, exist_ok=True)
+    lock = open(LOCK_PATH, 'w')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        print(f"[INGEST] Another ingest daemon holds {LOCK_PATH} - exiting")
+        return 1
+    lock.write(str(os.getpid()))
+    lock.flush()
+
+    import ingest
+    import metrics
+    from migrations import migrate
+    from retention import RetentionJob
+
+    migrate()
+    # We hold the lock, so a socket left here is from a daemon that died
+    if os.path.exists(CONTROL_PATH):
+        os.unlink(CONTROL_PATH)
+    server = ControlServer(CONTROL_PATH, ControlHandler)
+    os.chmod(CONTROL_PATH, 0o660)
+    threading.Thread(target=server.serve_forever, name='ingest-control', daemon=True).start()
+    print(f"[INGEST] Control socket at {CONTROL_PATH} (pid {os.getpid()})")
+
+    if start_readers:
+        ingest.start_readers()
+    else:
+        ingest.scan_writer.start()
+    retention_job = RetentionJob()
+    retention_job.start()
+
+    done = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: done.set())
+    while not done.wait(GAUGE_INTERVAL):
+        metrics.set_gauge('etps_scan_queue_depth', ingest.scan_writer.queue_depth)
+
+    print("[INGEST] Shutting down")
+    server.shutdown()
+    server.server_close()
+    os.unlink(CONTROL_PATH)
+    retention_job.stop()
+    ingest.stop_readers()
+    # Flush whatever the readers queued before they stopped
+    ingest.scan_writer.stop()
+    lock.close()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', nargs='?', default='run', choices=('run',) + COMMANDS)
+    parser.add_argument('--stopped', action='store_true', help="run without starting the readers")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        return serve(start_readers=not args.stopped)
+    try:
+        reply = control(args.command)
+    except DaemonNotRunning as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(json.dumps(reply, indent=2))
+    return 0 if reply.get('ok') else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import json
+import os
+from collections import namedtuple
+
+from signal_plan import YELLOW_CLEARANCE, cycle_plan
+
+# ============================================================================
+# INTERSECTION CONFIG
+# ============================================================================
+#
+# Pin numbers, reader channels and timings for every junction live in
+# intersections.json instead of being copied into each controller script.
+#
+#   signals  - {signal id: {lamp colour: physical pin}}
+#   readers  - {scan bus channel: signal id the reader sits in front of}
+#   green / yellow - normal cycle timings (seconds), one number for every
+#                    signal or {signal id: seconds}
+#   priority_hold  - seconds a priority vehicle keeps the white light
+#   clearance      - yellow seconds before an approach loses green/white
+#
+# serial_readers lists the USB/UART RFID readers the ingest daemon reads:
+#   port     - device path (a /dev/serial/by-id/... link survives replugging)
+#   baudrate - serial speed
+#   reader   - reader type the scans are saved as ('rfid1' or 'rfid2')
+#
+# spi_readers lists the MFRC522 readers on the Pi's SPI bus:
+#   bus, device - SPI bus and chip-select line (/dev/spidev<bus>.<device>)
+#   pin_rst     - reset pin (BOARD numbering, must not be a lamp pin)
+#   reader      - reader type the scans are saved as
+
+CONFIG_PATH = os.environ.get(
+    'ETPS_INTERSECTIONS',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'intersections.json'),
+)
+
+Intersection = namedtuple('Intersection', [
+    'name', 'signals', 'readers', 'plan', 'priority_hold', 'clearance',
+])
+
+SerialReader = namedtuple('SerialReader', ['port', 'baudrate', 'reader'])
+
+# Used when the config file has no serial_readers section
+DEFAULT_SERIAL_READERS = [SerialReader('/dev/ttyUSB0', 9600, 'rfid1')]
+
+SpiReader = namedtuple('SpiReader', ['bus', 'device', 'pin_rst', 'reader'])
+
+# Used when the config file has no spi_readers section
+DEFAULT_SPI_READERS = [SpiReader(0, 0, 22, 'rfid2')]
+
+
+def parse_intersection(entry):
+    """Build an Intersection from one config entry"""
+    name = entry['name']
+    signals = {str(signal): dict(lamps) for signal, lamps in entry['signals'].items()}
+    readers = {channel: str(signal) for channel, signal in entry.get('readers', {}).items()}
+    for channel, signal in readers.items():
+        if signal not in signals:
+            raise ValueError(f"{name}: reader {channel} points at unknown signal {signal}")
+    timings = {}
+    for colour, default in (('green', 5), ('yellow', 2)):
+        timing = entry.get(colour, default)
+        if isinstance(timing, dict):
+            timing = {str(signal): seconds for signal, seconds in timing.items()}
+            missing = set(signals) - set(timing)
+            if missing:
+                raise ValueError(f"{name}: no {colour} time for signal(s) {', '.join(sorted(missing))}")
+        timings[colour] = timing
+    plan = cycle_plan(list(signals), timings['green'], timings['yellow'])
+    return Intersection(
+        name, signals, readers, plan,
+        entry.get('priority_hold', 10),
+        entry.get('clearance', YELLOW_CLEARANCE),
+    )
+
+
+def load_intersections(path=CONFIG_PATH):
+    """All intersections in the config file, checked for clashes"""
+    with open(path) as f:
+        config = json.load(f)
+    intersections = [parse_intersection(entry) for entry in config['intersections']]
+
+    names, pins, channels = set(), {}, {}
+    for junction in intersections:
+        if junction.name in names:
+            raise ValueError(f"Duplicate intersection name {junction.name}")
+        names.add(junction.name)
+        for signal, lamps in junction.signals.items():
+            for lamp, pin in lamps.items():
+                owner = pins.setdefault(pin, (junction.name, signal, lamp))
+                if owner != (junction.name, signal, lamp):
+                    raise ValueError(f"Pin {pin} used by both {owner} and {(junction.name, signal, lamp)}")
+        for channel in junction.readers:
+            if channels.setdefault(channel, junction.name) != junction.name:
+                raise ValueError(f"Reader channel {channel} used by two intersections")
+    return intersections
+
+
+def load_intersection(name=None, path=CONFIG_PATH):
+    """One intersection by name (the first one if name is None)"""
+    intersections = load_intersections(path)
+    if name is None:
+        return intersections[0]
+    for junction in intersections:
+        if junction.name == name:
+            return junction
+    raise KeyError(f"No intersection named {name} in {path}")
+
+
+def load_serial_readers(path=CONFIG_PATH):
+    """Serial RFID readers from the config file"""
+    with open(path) as f:
+        config = json.load(f)
+    if 'serial_readers' not in config:
+        return list(DEFAULT_SERIAL_READERS)
+    readers = []
+    for entry in config['serial_readers']:
+        readers.append(SerialReader(entry['port'], entry.get('baudrate', 9600), entry.get('reader', 'rfid1')))
+    ports = [reader.port for reader in readers]
+    if len(set(ports)) != len(ports):
+        raise ValueError("The same serial port is listed twice in serial_readers")
+    return readers
+
+
+def load_spi_readers(path=CONFIG_PATH):
+    """MFRC522 readers from the config file"""
+    with open(path) as f:
+        config = json.load(f)
+    if 'spi_readers' not in config:
+        return list(DEFAULT_SPI_READERS)
+    readers = []
+    for entry in config['spi_readers']:
+        readers.append(SpiReader(entry.get('bus', 0), entry.get('device', 0),
+                                 entry.get('pin_rst', 22), entry.get('reader', 'rfid2')))
+    chips = [(reader.bus, reader.device) for reader in readers]
+    if len(set(chips)) != len(chips):
+        raise ValueError("The same SPI chip select is listed twice in spi_readers")
+    lamp_pins = {pin for junction in load_intersections(path)
+                 for lamps in junction.signals.values() for pin in lamps.values()}
+    for reader in readers:
+        if reader.pin_rst in lamp_pins:
+            raise ValueError(f"MFRC522 reset pin {reader.pin_rst} is also a lamp pin")
+    return readers
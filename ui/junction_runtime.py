@@ -0,0 +1,220 @@
+import argparse
+import heapq
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+
+from dedup import ScanDedup
+from hal import GPIO
+from intersections import CONFIG_PATH, load_intersections
+from scan_bus import Scan, ScanBus
+from signal_bank import GPIOBackend, SignalBank, SimulatedBackend
+from signal_plan import PhaseMachine
+
+# ============================================================================
+# ONE PROCESS, MANY INTERSECTIONS
+# ============================================================================
+#
+# Every intersection in intersections.json gets a PhaseMachine and a
+# SignalBank, and they all run on a single thread:
+#
+#   - phase deadlines sit in one heap, so the loop sleeps exactly until the
+#     next junction needs a lamp change (idle junctions cost nothing)
+#   - scan bus sockets for every reader are in one selector, so a scan wakes
+#     the loop immediately
+#
+# Nothing here sleeps per junction, so the work done is proportional to lamp
+# changes and scans, not to the number of intersections.
+
+
+class Junction:
+    """Live state of one intersection"""
+    __slots__ = ('config', 'machine', 'bank')
+
+    def __init__(self, config, machine, bank):
+        self.config = config
+        self.machine = machine
+        self.bank = bank
+
+
+class JunctionRuntime:
+    """Single-threaded event loop driving all configured intersections"""
+    def __init__(self, intersections, backend, clock=time.monotonic, verbose=True):
+        self.clock = clock
+        self.verbose = verbose
+        self.junctions = {}
+        self.routes = {}      # scan bus channel -> (junction, signal)
+        self.timers = []      # heap of (deadline, junction name)
+        self.inbox = deque()  # scans handed over by other threads
+        self.buses = []
+        self.running = False
+        self.closed = False
+        self.stats = {'scans': 0, 'unrouted': 0, 'duplicates': 0, 'ticks': 0, 'lamp_changes': 0, 'max_lateness': 0.0}
+        # A tag held at a reader must not keep re-preempting its junction
+        self.dedup = ScanDedup(clock=clock)
+
+        self.selector = selectors.DefaultSelector()
+        self.wake_recv, self.wake_send = socket.socketpair()
+        self.wake_recv.setblocking(False)
+        self.wake_send.setblocking(False)
+        self.selector.register(self.wake_recv, selectors.EVENT_READ, None)
+
+        for config in intersections:
+            bank = SignalBank(config.signals, backend)
+            bank.setup()
+            machine = PhaseMachine(config.plan, config.clearance, clock)
+            junction = self.junctions[config.name] = Junction(config, machine, bank)
+            for channel, signal in config.readers.items():
+                self.routes[channel] = (junction, signal)
+            self.render(junction)
+            self.schedule(junction)
+
+    # ------------------------------------------------------------------
+    # Inputs
+    # ------------------------------------------------------------------
+    def listen(self):
+        """Bind a scan bus channel for every configured reader"""
+        for channel in self.routes:
+            bus = ScanBus(channel).listen()
+            self.buses.append(bus)
+            try:
+                self.selector.register(bus.fileno(), selectors.EVENT_READ, bus)
+            except AttributeError:
+                # In-process queue backend: nothing to select() on, so hand
+                # its scans over through the inbox instead
+                threading.Thread(target=self._forward, args=(bus,), daemon=True).start()
+        return self
+
+    def _forward(self, bus):
+        while not self.closed:
+            scan = bus.receive(timeout=0.5)
+            if scan is not None:
+                self.submit(scan.reader, scan.uid, scan.read_at)
+
+    def submit(self, channel, uid, read_at=None):
+        """Queue a scan from any thread"""
+        self.inbox.append(Scan(channel, str(uid), read_at or time.time()))
+        self._wake()
+
+    def stop(self):
+        """Stop run() from any thread"""
+        self.running = False
+        self._wake()
+
+    def _wake(self):
+        try:
+            self.wake_send.send(b'!')
+        except BlockingIOError:
+            # A wakeup is already pending
+            pass
+
+    # ------------------------------------------------------------------
+    # Lamps
+    # ------------------------------------------------------------------
+    def schedule(self, junction):
+        heapq.heappush(self.timers, (junction.machine.deadline, junction.config.name))
+
+    def render(self, junction):
+        if junction.bank.apply(junction.machine.lamps):
+            self.stats['lamp_changes'] += 1
+
+    def handle_scan(self, scan):
+        route = self.routes.get(scan.reader)
+        if route is None:
+            self.stats['unrouted'] += 1
+            return
+        if self.dedup.duplicate(scan.reader, scan.uid):
+            self.stats['duplicates'] += 1
+            return
+        junction, signal = route
+        self.stats['scans'] += 1
+        if self.verbose:
+            print(f"🚨 {junction.config.name}: {scan.reader} read {scan.uid} - priority to signal {signal}")
+        now = self.clock()
+        junction.machine.preempt(signal, junction.config.priority_hold, now)
+        junction.machine.tick(now)
+        self.render(junction)
+        self.schedule(junction)
+
+    def run_timers(self):
+        """Advance every junction whose deadline has passed"""
+        now = self.clock()
+        while self.timers and self.timers[0][0] <= now:
+            deadline, name = heapq.heappop(self.timers)
+            junction = self.junctions[name]
+            # A scan moved this junction's deadline since the entry was pushed
+            if deadline != junction.machine.deadline:
+                continue
+            self.stats['ticks'] += 1
+            self.stats['max_lateness'] = max(self.stats['max_lateness'], now - deadline)
+            if junction.machine.tick(now):
+                self.render(junction)
+                if self.verbose:
+                    print(f"🚦 {name}: {junction.machine.phase_name} {junction.machine.lamps}")
+            self.schedule(junction)
+
+    # ------------------------------------------------------------------
+    # Loop
+    # ------------------------------------------------------------------
+    def run(self):
+        self.running = True
+        while self.running:
+            timeout = max(0.0, self.timers[0][0] - self.clock()) if self.timers else None
+            for key, _ in self.selector.select(timeout):
+                if key.data is None:
+                    try:
+                        while self.wake_recv.recv(64):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                while True:
+                    scan = key.data.receive(timeout=0)
+                    if scan is None:
+                        break
+                    self.handle_scan(scan)
+            while self.inbox:
+                self.handle_scan(self.inbox.popleft())
+            self.run_timers()
+
+    def close(self):
+        self.closed = True
+        for junction in self.junctions.values():
+            junction.bank.all_off()
+        for bus in self.buses:
+            bus.close()
+        self.selector.close()
+        self.wake_recv.close()
+        self.wake_send.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run every intersection in the config file")
+    parser.add_argument('--config', default=CONFIG_PATH)
+    parser.add_argument('--simulate', action='store_true', help='no GPIO - keep lamp states in memory')
+    args = parser.parse_args()
+
+    intersections = load_intersections(args.config)
+    if args.simulate:
+        backend = SimulatedBackend()
+    else:
+        GPIO.setmode(GPIO.BOARD)
+        GPIO.setwarnings(False)
+        backend = GPIOBackend(GPIO)
+
+    runtime = JunctionRuntime(intersections, backend).listen()
+    print(f"🚦 Running {len(intersections)} intersection(s) from {args.config}")
+    try:
+        runtime.run()
+    except KeyboardInterrupt:
+        print("🔴 Exiting...")
+    finally:
+        runtime.close()
+        if not args.simulate:
+            GPIO.cleanup()
+
+
+if __name__ == "__main__":
+    main()
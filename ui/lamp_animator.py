@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import namedtuple
+
+# ============================================================================
+# LAMP ANIMATIONS (denial flash etc.)
+# ============================================================================
+#
+# A pattern is a list of (on, seconds) steps for one lamp of one signal.
+# Each signal gets one worker thread that plays its pattern on a timer, so
+# the control loop just calls play() and carries on - it never sleeps on an
+# effect.  While a lamp is animating, the controller's render() leaves that
+# pin alone; when the pattern ends the worker puts the lamp back to whatever
+# the controller wants it to be (the base callback).
+#
+# Playing the pattern that is already running merges with it (it just runs
+# for its full length from now); playing a different one cancels the old one.
+
+Pattern = namedtuple('Pattern', ['name', 'lamp', 'steps'])
+
+
+def flash(lamp, count=8, period=0.25):
+    """Fast on/off, e.g. 8 flashes in 2 seconds"""
+    return Pattern('flash', lamp, ((True, period / 2), (False, period / 2)) * count)
+
+
+def blink(lamp, count=3, period=1.0):
+    """Slow on/off"""
+    return Pattern('blink', lamp, ((True, period / 2), (False, period / 2)) * count)
+
+
+def pulse(lamp, duration=1.0):
+    """One long flash"""
+    return Pattern('pulse', lamp, ((True, duration), (False, 0)))
+
+
+# Access denied: flash red rapidly for 2 seconds
+DENIAL = flash('red')
+
+
+class _SignalWorker:
+    """Timer thread playing patterns for one signal"""
+    def __init__(self, animator, signal):
+        self.animator = animator
+        self.signal = signal
+        self.wakeup = threading.Condition(animator.lock)
+        self.pattern = None
+        self.step = 0
+        self.due = 0.0
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name=f"lamp-animator-{signal}", daemon=True)
+        self.thread.start()
+
+    def play(self, pattern):
+        """Called with the animator lock held"""
+        now = self.animator.clock()
+        if self.pattern is not None:
+            if self.pattern == pattern:
+                # Same effect requested again - keep the current step going
+                # and restart the count after it
+                self.step = self.step % 2
+                return
+            self._finish()
+        self.pattern = pattern
+        self.step = 0
+        self.due = now
+        self.wakeup.notify()
+
+    def cancel(self):
+        """Called with the animator lock held"""
+        if self.pattern is not None:
+            self._finish()
+            self.wakeup.notify()
+
+    def _finish(self):
+        lamp = self.pattern.lamp
+        self.pattern = None
+        self.animator.output(self.signal, lamp, self.animator.base(self.signal) == lamp)
+
+    def run(self):
+        with self.wakeup:
+            while self.running:
+                if self.pattern is None:
+                    self.wakeup.wait()
+                    continue
+                now = self.animator.clock()
+                if now < self.due:
+                    self.wakeup.wait(self.due - now)
+                    continue
+                if self.step >= len(self.pattern.steps):
+                    self._finish()
+                    continue
+                on, seconds = self.pattern.steps[self.step]
+                self.animator.output(self.signal, self.pattern.lamp, on)
+                self.step += 1
+                # Schedule from the last due time so long patterns don't drift
+                self.due += seconds
+
+    def stop(self):
+        self.running = False
+        self.wakeup.notify()
+
+
+class LampAnimator:
+    """Runs lamp patterns for a set of signals without blocking the caller.
+
+    output(signal, lamp, on) drives a lamp; base(signal) returns the colour
+    the controller currently wants lit there.  Both are called with
+    self.lock held - the controller must hold the same lock while it writes
+    the lamps itself.
+    """
+    def __init__(self, output, base, clock=time.monotonic):
+        self.output = output
+        self.base = base
+        self.clock = clock
+        self.lock = threading.RLock()
+        self.workers = {}
+
+    def play(self, signal, pattern):
+        with self.lock:
+            worker = self.workers.get(signal)
+            if worker is None:
+                worker = self.workers[signal] = _SignalWorker(self, signal)
+            worker.play(pattern)
+
+    def cancel(self, signal):
+        with self.lock:
+            worker = self.workers.get(signal)
+            if worker is not None:
+                worker.cancel()
+
+    def animating(self, signal):
+        """Lamp currently being animated on signal, or None"""
+        with self.lock:
+            worker = self.workers.get(signal)
+            return worker.pattern.lamp if worker and worker.pattern else None
+
+    def stop(self):
+        """Cancel everything and stop the worker threads"""
+        with self.lock:
+            workers = list(self.workers.values())
+            self.workers = {}
+            for worker in workers:
+                worker.cancel()
+                worker.stop()
+        for worker in workers:
+            worker.thread.join()
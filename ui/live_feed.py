@@ -0,0 +1,232 @@
+import json
+import threading
+import time
+from collections import deque
+
+from change_feed import READ_BATCH, ChangeFeed
+from db import connection
+
+# ============================================================================
+# LIVE FEED (SERVER-SENT EVENTS)
+# ============================================================================
+#
+# One broadcaster thread per app process follows change_log (see
+# change_feed.py), turns each batch of changes into events with one query
+# per table, and keeps the last HISTORY_SIZE events in memory.  Browsers
+# subscribe with EventSource; their generators only wait on a Condition and
+# read that buffer, so a connected client costs no database queries.
+#
+#   reading  - a tag was read (rfid_scans insert)
+#   case     - a case was created       } only sent to the
+#   link     - a case got a tag linked  } case's own driver
+#   priority - the controller gave a signal the white light
+#
+# Event ids are change_log seq numbers.  A reconnecting EventSource sends
+# Last-Event-ID and gets what it missed from the buffer; if that is too old
+# it gets a "reset" event and should reload.  A comment line is sent every
+# HEARTBEAT seconds so proxies don't close an idle stream.
+
+HISTORY_SIZE = 1000
+HEARTBEAT = 15.0
+# Milliseconds the browser waits before reconnecting
+RETRY_MS = 3000
+
+
+class LiveEvent:
+    """One event, pre-rendered as an SSE message"""
+    __slots__ = ('seq', 'name', 'driver_id', 'message')
+
+    def __init__(self, seq, name, data, driver_id=None):
+        self.seq = seq
+        self.name = name
+        self.driver_id = driver_id
+        self.message = f"id: {seq}\nevent: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class LiveFeed:
+    """Broadcaster from change_log to any number of SSE subscribers"""
+    def __init__(self, history=HISTORY_SIZE, heartbeat=HEARTBEAT):
+        self.events = deque(maxlen=history)
+        # Every event after this seq is still in the buffer
+        self.floor = 0
+        self.heartbeat = heartbeat
+        self.changed = threading.Condition()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+        self.feed = None
+        # Counters
+        self.subscribers = 0
+        self.queries = 0
+        self.published = 0
+
+    # ------------------------------------------------------------------
+    # Broadcaster
+    # ------------------------------------------------------------------
+    def start(self):
+        """Start the broadcaster thread (no-op if it is already running)"""
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.feed = ChangeFeed('live-feed')
+            with connection() as conn:
+                # Prime the buffer so Last-Event-ID works across restarts
+                newest = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+                self.feed.cursor = self.floor = max(0, newest - self.events.maxlen)
+                self.poll(conn)
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name='live-feed', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.running = False
+        with self.changed:
+            self.changed.notify_all()
+
+    def _run(self):
+        while self.running:
+            self.feed.wait(self.heartbeat)
+            try:
+                with connection() as conn:
+                    self.poll(conn)
+            except Exception as e:
+                print(f"[LIVE] Error reading change feed: {e}")
+                time.sleep(1)
+        self.feed.close()
+
+    def poll(self, conn):
+        """Turn every new change_log entry into events; returns how many"""
+        total = 0
+        while True:
+            changes = self.feed.read(conn)
+            self.queries += 1
+            if changes:
+                self.publish(self.build(conn, changes))
+                total += len(changes)
+            if len(changes) < READ_BATCH:
+                return total
+
+    def _rows(self, conn, sql, ids):
+        if not ids:
+            return {}
+        self.queries += 1
+        ids = sorted(ids)
+        rows = conn.execute(sql.format(','.join('?' * len(ids))), ids).fetchall()
+        return {row[0]: row for row in rows}
+
+    def build(self, conn, changes):
+        """LiveEvents for a batch of change_log entries (one query per table)"""
+        by_table = {}
+        for change in changes:
+            by_table.setdefault(change.table_name, set()).add(change.row_id)
+        scans = self._rows(conn, """
+            SELECT id, data, source, read_at, timestamp FROM rfid_scans WHERE id IN ({})
+        """, by_table.get('rfid_scans'))
+        cases = self._rows(conn, """
+            SELECT id, driver_id, rfid1_number, rfid2_number, rfid_linked FROM emergency_case WHERE id IN ({})
+        """, by_table.get('emergency_case'))
+        priorities = self._rows(conn, """
+            SELECT id, signal, severity, rfid_number, activated_at FROM priority_event WHERE id IN ({})
+        """, by_table.get('priority_event'))
+
+        events = []
+        for change in changes:
+            if change.table_name == 'rfid_scans' and change.row_id in scans:
+                _, uid, source, read_at, timestamp = scans[change.row_id]
+                events.append(LiveEvent(change.seq, 'reading', {
+                    'scan_id': change.row_id, 'rfid_number': uid, 'source': source,
+                    'read_at': read_at, 'timestamp': timestamp,
+                }))
+            elif change.table_name == 'emergency_case' and change.row_id in cases:
+                # Current state of the case, not the state at this change
+                _, driver_id, rfid1, rfid2, linked = cases[change.row_id]
+                events.append(LiveEvent(change.seq, 'case' if change.op == 'insert' else 'link', {
+                    'case_id': change.row_id, 'rfid1_number': rfid1, 'rfid2_number': rfid2,
+                    'rfid_linked': bool(linked),
+                }, driver_id))
+            elif change.table_name == 'priority_event' and change.row_id in priorities:
+                _, signal, severity, uid, activated_at = priorities[change.row_id]
+                events.append(LiveEvent(change.seq, 'priority', {
+                    'signal': signal, 'severity': severity, 'rfid_number': uid,
+                    'activated_at': activated_at,
+                }))
+        return events
+
+    def publish(self, events):
+        with self.changed:
+            self.events.extend(events)
+            if len(self.events) == self.events.maxlen:
+                self.floor = max(self.floor, self.events[0].seq - 1)
+            self.published += len(events)
+            self.changed.notify_all()
+
+    # ------------------------------------------------------------------
+    # Subscribers
+    # ------------------------------------------------------------------
+    def _after(self, seq):
+        """Buffered events newer than seq (call with self.changed held)"""
+        if not self.events or self.events[-1].seq <= seq:
+            return []
+        # Newest first until we reach seq - usually only a few events back
+        newer = []
+        for event in reversed(self.events):
+            if event.seq <= seq:
+                break
+            newer.append(event)
+        newer.reverse()
+        return newer
+
+    def subscribe(self, driver_id=None, last_event_id=None):
+        """SSE text chunks for one client (a generator for a streaming response)"""
+        self.start()
+        with self.changed:
+            newest = self.events[-1].seq if self.events else self.feed.cursor
+            floor = self.floor
+        with self.lock:
+            self.subscribers += 1
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            if last_event_id is None:
+                seq = newest
+            elif last_event_id < floor or last_event_id > newest:
+                # Missed more than the buffer holds (or the id is from another database)
+                yield f"id: {newest}\nevent: reset\ndata: {{}}\n\n"
+                seq = newest
+            else:
+                seq = last_event_id
+
+            while self.running:
+                with self.changed:
+                    if seq < self.floor:
+                        # Too slow - events were dropped from the buffer
+                        seq = self.events[-1].seq
+                        events = None
+                    else:
+                        events = self._after(seq)
+                        if not events:
+                            self.changed.wait(self.heartbeat)
+                            events = self._after(seq)
+                if events is None:
+                    yield f"id: {seq}\nevent: reset\ndata: {{}}\n\n"
+                    continue
+                if not events:
+                    yield ": keepalive\n\n"
+                    continue
+                seq = events[-1].seq
+                for event in events:
+                    if event.driver_id is None or event.driver_id == driver_id:
+                        yield event.message
+        finally:
+            with self.lock:
+                self.subscribers -= 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'running': bool(self.thread and self.thread.is_alive()),
+                'subscribers': self.subscribers,
+                'buffered': len(self.events),
+                'published': self.published,
+                'queries': self.queries,
+                'cursor': self.feed.cursor if self.feed else None,
+            }
@@ -0,0 +1,298 @@
+import bisect
+import fcntl
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+
+from scan_bus import SOCKET_DIR
+
+# ============================================================================
+# SHARED METRICS (PROMETHEUS TEXT FORMAT)
+# ============================================================================
+#
+# Every process (web workers, the ingest daemon, the priority controller,
+# traffic.py) records into its own fixed-size memory-mapped file in
+# METRICS_DIR - a flat array of doubles, one slot per counter/gauge and
+# len(BUCKETS) + 2 slots per histogram.  Recording is a lock and a couple of
+# struct writes, with no I/O and no allocation, so it is cheap enough for the
+# scan hot path.  Recording never raises: if the file can't be created
+# (unwritable METRICS_DIR, disk full) the error is logged, the values are
+# lost and it is retried after RETRY_SECONDS - metrics must not break
+# ingestion.
+#
+# collect() (the /metrics route in app.py) reads every process's file and
+# adds them up, so one scrape covers the whole system.  When a process exits
+# (a gunicorn worker is recycled, the daemon restarts) its counters and
+# histograms are folded into RETIRED_FILE before its file is removed, so
+# the totals never go backwards; its gauges are dropped.
+#
+# Latency histograms are measured from the moment the tag was read at the
+# serial port / SPI reader (Scan.read_at / rfid_scans.read_at).
+
+METRICS_DIR = os.path.join(SOCKET_DIR, 'metrics')
+
+# Histogram bucket upper bounds in seconds (plus +Inf)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+# (name, type, help, label values as (label, (values...)) or None)
+METRICS = [
+    ('etps_scans_read_total', COUNTER, "Tags read by the RFID readers", ('reader', ('rfid1', 'rfid2'))),
+    ('etps_scans_deduplicated_total', COUNTER, "Repeated reads of a tag suppressed at ingestion",
+     ('reader', ('rfid1', 'rfid2'))),
+    ('etps_scans_committed_total', COUNTER, "Scans committed by the scan writer", None),
+    ('etps_scans_dropped_total', COUNTER, "Scans dropped because the writer queue was full", None),
+    ('etps_case_links_total', COUNTER, "RFID tags linked to an emergency case", None),
+    ('etps_preemptions_total', COUNTER, "Priority (white light) activations", None),
+    ('etps_denials_total', COUNTER, "Scans denied priority", None),
+    ('etps_scan_queue_depth', GAUGE, "Scans waiting for the scan writer", None),
+    ('etps_scan_commit_seconds', HISTOGRAM, "Tag read to DB commit", None),
+    ('etps_scan_pickup_seconds', HISTOGRAM, "Tag read to controller pickup", None),
+    ('etps_scan_decision_seconds', HISTOGRAM, "Tag read to priority decision", None),
+    ('etps_scan_lamp_seconds', HISTOGRAM, "Tag read to priority lamp GPIO write", None),
+]
+
+_DOUBLE = struct.Struct('d')
+_HEADER = struct.Struct('QQ')   # layout checksum, pid
+
+FILE_NAME = re.compile(r'^(\d+)\.metrics$')
+# Summed counters and histograms of processes that have exited
+RETIRED_FILE = 'retired.metrics'
+# Seconds before retrying a metrics file that could not be created
+RETRY_SECONDS = 60.0
+
+
+def _build_layout():
+    """{series key: first slot}, slot count"""
+    slots = {}
+    index = 0
+    for name, kind, _, labels in METRICS:
+        keys = [(name, None)] if labels is None else [(name, f'{labels[0]}="{value}"') for value in labels[1]]
+        for key in keys:
+            slots[key] = index
+            index += len(BUCKETS) + 2 if kind == HISTOGRAM else 1
+    return slots, index
+
+
+SLOTS, SLOT_COUNT = _build_layout()
+KINDS = {name: kind for name, kind, _, _ in METRICS}
+GAUGE_SLOTS = {slot for (name, _), slot in SLOTS.items() if KINDS[name] == GAUGE}
+# Files written with a different METRICS/BUCKETS layout are ignored
+LAYOUT = zlib.crc32(repr((METRICS, BUCKETS)).encode('utf-8'))
+FILE_SIZE = _HEADER.size + SLOT_COUNT * _DOUBLE.size
+
+
+class MetricsFile:
+    """This process's slice of the shared metrics"""
+    def __init__(self, directory=METRICS_DIR):
+        self.directory = directory
+        self.map = None
+        self.pid = None
+        self.lock = threading.Lock()
+        self.retry_at = 0.0
+
+    def _ready(self):
+        """Open (or reopen after fork) this process's file; False if it can't be"""
+        if self.pid == os.getpid():
+            return True
+        if time.monotonic() < self.retry_at:
+            return False
+        try:
+            self._open()
+        except OSError as e:
+            print(f"[METRICS] Cannot record metrics in {self.directory}: {e}")
+            self.retry_at = time.monotonic() + RETRY_SECONDS
+            return False
+        return True
+
+    def _open(self):
+        # Reopen after fork - the child must not write into its parent's file
+        pid = os.getpid()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{pid}.metrics")
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, FILE_SIZE)
+            # Allocate the blocks now: writing to a sparse page of the map
+            # on a full disk would be a SIGBUS, not an exception
+            os.posix_fallocate(fd, 0, FILE_SIZE)
+            self.map = mmap.mmap(fd, FILE_SIZE)
+        finally:
+            os.close(fd)
+        _HEADER.pack_into(self.map, 0, LAYOUT, pid)
+        self.pid = pid
+
+    def _add(self, slot, value):
+        offset = _HEADER.size + slot * _DOUBLE.size
+        _DOUBLE.pack_into(self.map, offset, _DOUBLE.unpack_from(self.map, offset)[0] + value)
+
+    def add(self, key, value):
+        with self.lock:
+            if self._ready():
+                self._add(SLOTS[key], value)
+
+    def set(self, key, value):
+        with self.lock:
+            if self._ready():
+                _DOUBLE.pack_into(self.map, _HEADER.size + SLOTS[key] * _DOUBLE.size, value)
+
+    def observe(self, key, seconds):
+        first = SLOTS[key]
+        with self.lock:
+            if not self._ready():
+                return
+            self._add(first + bisect.bisect_left(BUCKETS, seconds), 1)
+            self._add(first + len(BUCKETS) + 1, seconds)
+
+
+_local = MetricsFile()
+
+
+def _key(name, labels):
+    if not labels:
+        return (name, None)
+    (label, value), = labels.items()
+    return (name, f'{label}="{value}"')
+
+
+def inc(name, value=1, **labels):
+    """Add to a counter, e.g. inc('etps_scans_read_total', reader='rfid1')"""
+    _local.add(_key(name, labels), value)
+
+
+def set_gauge(name, value, **labels):
+    _local.set(_key(name, labels), value)
+
+
+def observe(name, seconds):
+    """Record one latency in a histogram"""
+    _local.observe((name, None), max(0.0, seconds))
+
+
+# ============================================================================
+# COLLECTION
+# ============================================================================
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _unpack(data):
+    """Slot values from a metrics file's bytes, or None if it isn't one of ours"""
+    if len(data) != FILE_SIZE or _HEADER.unpack_from(data, 0)[0] != LAYOUT:
+        return None
+    return struct.unpack_from(f'{SLOT_COUNT}d', data, _HEADER.size)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return _unpack(f.read(FILE_SIZE))
+
+
+def _retired(directory, dead=()):
+    """Fold the files of exited processes into RETIRED_FILE (gauges dropped)
+    and return its values.  The file lock makes sure two scrapes never fold
+    the same process twice."""
+    fd = os.open(os.path.join(directory, RETIRED_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if dead else fcntl.LOCK_SH)
+        retired = list(_unpack(os.pread(fd, FILE_SIZE, 0)) or [0.0] * SLOT_COUNT)
+        folded = []
+        for path in dead:
+            try:
+                values = _read(path)
+            except OSError:
+                continue    # folded by another scrape (or unreadable - kept)
+            for i, value in enumerate(values or ()):
+                if i not in GAUGE_SLOTS:
+                    retired[i] += value
+            folded.append(path)
+        if folded:
+            os.pwrite(fd, _HEADER.pack(LAYOUT, 0) + struct.pack(f'{SLOT_COUNT}d', *retired), 0)
+            for path in folded:
+                os.unlink(path)
+    finally:
+        os.close(fd)
+    return retired
+
+
+def collect(directory=METRICS_DIR):
+    """Every process's values summed, exited ones included: [slot value, ...]"""
+    totals = [0.0] * SLOT_COUNT
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return totals
+    dead = []
+    for name in names:
+        match = FILE_NAME.match(name)
+        if not match:
+            continue
+        path = os.path.join(directory, name)
+        if not _process_alive(int(match.group(1))):
+            dead.append(path)
+            continue
+        try:
+            values = _read(path)
+        except OSError:
+            continue
+        for i, value in enumerate(values or ()):
+            totals[i] += value
+    try:
+        retired = _retired(directory, dead)
+    except OSError as e:
+        # Can't fold them - count the exited processes' files where they are
+        print(f"[METRICS] Cannot update {RETIRED_FILE}: {e}")
+        retired = [0.0] * SLOT_COUNT
+        for path in dead:
+            try:
+                values = _read(path)
+            except OSError:
+                continue
+            for i, value in enumerate(values or ()):
+                if i not in GAUGE_SLOTS:
+                    retired[i] += value
+    for i, value in enumerate(retired):
+        totals[i] += value
+    return totals
+
+
+def _format(value):
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def render_prometheus(directory=METRICS_DIR):
+    """Prometheus text exposition of collect()"""
+    totals = collect(directory)
+    lines = []
+    for name, kind, help_text, labels in METRICS:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind != HISTOGRAM:
+            keys = [(name, None)] if labels is None else [(name, f'{labels[0]}="{v}"') for v in labels[1]]
+            for key in keys:
+                suffix = f"{{{key[1]}}}" if key[1] else ''
+                lines.append(f"{name}{suffix} {_format(totals[SLOTS[key]])}")
+            continue
+        first = SLOTS[(name, None)]
+        cumulative = 0.0
+        for i, bound in enumerate(BUCKETS + (float('inf'),)):
+            cumulative += totals[first + i]
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{name}_bucket{{le="{le}"}} {_format(cumulative)}')
+        lines.append(f"{name}_sum {_format(totals[first + len(BUCKETS) + 1])}")
+        lines.append(f"{name}_count {_format(cumulative)}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+
+from hal import open_mfrc522
+
+# ============================================================================
+# MFRC522 POLLER
+# ============================================================================
+#
+# SimpleMFRC522.read() blocks until a card shows up, and the old reader loop
+# then called GPIO.cleanup() (resetting every pin, lamps included) and slept
+# a second - a card tapped during that second was never seen.
+#
+# MFRC522Poller opens each reader once (mfrc522.MFRC522, one per SPI chip
+# select) and asks every reader "is a card there?" (Request + Anticoll, a
+# few SPI transfers) POLL_HZ times a second.  It never calls GPIO.cleanup().
+#
+# A card held to the antenna answers many polls in a row (and real cards
+# skip every other Request), so a card is reported once when it appears and
+# again only after it has been gone for RELEASE_SECONDS.
+
+POLL_HZ = float(os.environ.get('ETPS_MFRC522_POLL_HZ', '20'))
+RELEASE_SECONDS = 0.5
+# Readers that failed to open are retried this often
+REOPEN_SECONDS = 5.0
+
+
+def uid_to_num(uid):
+    """Card number from the Anticoll bytes, same as SimpleMFRC522"""
+    number = 0
+    for byte in uid[:5]:
+        number = number * 256 + byte
+    return number
+
+
+class ReaderState:
+    """One MFRC522 and the card currently on it"""
+    def __init__(self, config):
+        self.config = config
+        self.device = None
+        self.present = None
+        self.last_seen = 0.0
+        self.cards = 0
+        self.polls = 0
+        self.errors = 0
+        self.last_error = None
+
+    def stats(self):
+        return {
+            'spi': f"{self.config.bus}.{self.config.device}",
+            'reader': self.config.reader,
+            'open': self.device is not None,
+            'cards': self.cards,
+            'polls': self.polls,
+            'errors': self.errors,
+            'last_error': self.last_error,
+        }
+
+
+class MFRC522Poller:
+    """Polls one or more MFRC522 readers without blocking.
+
+    readers are intersections.SpiReader tuples (bus, device, pin_rst, reader);
+    on_scan(reader, uid, read_at) is called on the polling thread.
+    """
+    def __init__(self, readers, on_scan, poll_hz=POLL_HZ, release=RELEASE_SECONDS,
+                 clock=time.time, open_device=open_mfrc522):
+        self.readers = [ReaderState(config) for config in readers]
+        self.on_scan = on_scan
+        self.interval = 1.0 / poll_hz
+        self.release = release
+        self.clock = clock
+        self.open_device = open_device
+        self.stopping = threading.Event()
+
+    def open(self):
+        for state in self.readers:
+            if state.device is not None:
+                continue
+            config = state.config
+            try:
+                state.device = self.open_device(config.bus, config.device, config.pin_rst)
+                print(f"[MFRC522] spi{config.bus}.{config.device}: reading ({config.reader})")
+            except Exception as e:
+                state.errors += 1
+                state.last_error = str(e)
+                print(f"[MFRC522] spi{config.bus}.{config.device}: open failed: {e}")
+
+    def close(self):
+        for state in self.readers:
+            spi = getattr(state.device, 'spi', None)
+            if spi is not None:
+                # Not Close_MFRC522() - that calls GPIO.cleanup()
+                spi.close()
+            state.device = None
+
+    def poll(self, state):
+        """One Request/Anticoll round on one reader; the card number or None"""
+        device = state.device
+        state.polls += 1
+        status, _ = device.MFRC522_Request(device.PICC_REQIDL)
+        if status != device.MI_OK:
+            return None
+        status, uid = device.MFRC522_Anticoll()
+        if status != device.MI_OK:
+            return None
+        return uid_to_num(uid)
+
+    def poll_all(self):
+        """Poll every reader once and report new cards"""
+        for state in self.readers:
+            if state.device is None:
+                continue
+            try:
+                card = self.poll(state)
+            except Exception as e:
+                state.errors += 1
+                if state.last_error != str(e):
+                    print(f"[MFRC522] spi{state.config.bus}.{state.config.device}: {e}")
+                state.last_error = str(e)
+                continue
+            now = self.clock()
+            if card is None:
+                if state.present is not None and now - state.last_seen > self.release:
+                    state.present = None
+                continue
+            state.last_seen = now
+            if card == state.present:
+                continue
+            state.present = card
+            state.cards += 1
+            try:
+                self.on_scan(state.config.reader, str(card), now)
+            except Exception as e:
+                print(f"[MFRC522] scan handler failed: {e}")
+
+    def run(self):
+        """Poll until stop() is called (blocks the calling thread)"""
+        try:
+            next_poll = next_open = time.monotonic()
+            while not self.stopping.is_set():
+                if time.monotonic() >= next_open:
+                    self.open()
+                    next_open = time.monotonic() + REOPEN_SECONDS
+                self.poll_all()
+                # Fixed rate; if a round overran, start the next one now
+                next_poll = max(next_poll + self.interval, time.monotonic())
+                self.stopping.wait(next_poll - time.monotonic())
+        finally:
+            self.close()
+
+    def stop(self):
+        self.stopping.set()
+
+    def stats(self):
+        return [state.stats() for state in self.readers]
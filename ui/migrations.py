@@ -0,0 +1,450 @@
+import re
+import sys
+
+from db import connection
+
+# ============================================================================
+# SCHEMA MIGRATIONS FOR rfid_logs.db
+# ============================================================================
+#
+# Each migration is (version, description, steps).  A step is either an SQL
+# string or a function taking the connection.  migrate() applies every
+# version newer than the one recorded in schema_version, each in its own
+# transaction, so running it again is a no-op.  Never edit a migration that
+# has shipped - add a new one.
+
+def _bump(name, key, delta=1, when=None):
+    """Trigger statement: add delta to stat_counter (name, key)"""
+    return f"""
+            INSERT INTO stat_counter (name, key, value) SELECT '{name}', COALESCE({key}, ''), {delta}
+            WHERE {when or 'true'}
+            ON CONFLICT (name, key) DO UPDATE SET value = value + excluded.value;"""
+
+
+def _bump_hour(hour, metric, when=None):
+    """Trigger statement: count one event in stat_hourly (hour, metric)"""
+    return f"""
+            INSERT INTO stat_hourly (hour, metric, value) SELECT {hour}, '{metric}', 1
+            WHERE {hour} IS NOT NULL AND {when or 'true'}
+            ON CONFLICT (hour, metric) DO UPDATE SET value = value + 1;"""
+
+
+def _backfill_stats(conn):
+    import stats
+    stats.rebuild(conn)
+
+
+MIGRATIONS = [
+    (1, "base tables", [
+        '''
+        CREATE TABLE IF NOT EXISTS rfid_scans (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data TEXT NOT NULL,
+            source TEXT NOT NULL,
+            severity INTEGER,
+            patient_name TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS emergency_case (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_name TEXT NOT NULL,
+            hospital_name TEXT NOT NULL,
+            severity_level INTEGER NOT NULL,
+            driver_id TEXT NOT NULL,
+            rfid1_number TEXT,
+            rfid2_number TEXT,
+            rfid_linked BOOLEAN DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS driver (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            driver_id TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            name TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS rfid_reading (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            rfid_number TEXT NOT NULL,
+            reader_type TEXT NOT NULL,
+            case_id INTEGER,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            processed BOOLEAN DEFAULT 0,
+            FOREIGN KEY (case_id) REFERENCES emergency_case (id)
+        )
+        ''',
+    ]),
+    (2, "indexes for hot queries", [
+        # Driver case lists: WHERE driver_id = ? ORDER BY created_at DESC
+        "CREATE INDEX IF NOT EXISTS idx_case_driver_created ON emergency_case (driver_id, created_at)",
+        # Tag -> severity lookups; covering, so the table row is never read.
+        # They also serve "rfid1_number IS NULL OR rfid2_number IS NULL".
+        "CREATE INDEX IF NOT EXISTS idx_case_rfid1 ON emergency_case (rfid1_number, created_at, severity_level)",
+        "CREATE INDEX IF NOT EXISTS idx_case_rfid2 ON emergency_case (rfid2_number, created_at, severity_level)",
+        # Latest readings / scans: ORDER BY timestamp DESC LIMIT n
+        "CREATE INDEX IF NOT EXISTS idx_reading_timestamp ON rfid_reading (timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_scans_timestamp ON rfid_scans (timestamp)",
+        # Latest scan per signal (priority tie-break)
+        "CREATE INDEX IF NOT EXISTS idx_scans_source_timestamp ON rfid_scans (source, timestamp)",
+    ]),
+    (3, "change_log feed and triggers", [
+        '''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            op TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_scans_feed AFTER INSERT ON rfid_scans
+        BEGIN
+            INSERT INTO change_log (table_name, row_id, op) VALUES ('rfid_scans', NEW.id, 'insert');
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_case_insert_feed AFTER INSERT ON emergency_case
+        BEGIN
+            INSERT INTO change_log (table_name, row_id, op) VALUES ('emergency_case', NEW.id, 'insert');
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_case_link_feed
+        AFTER UPDATE OF rfid1_number, rfid2_number, rfid_linked ON emergency_case
+        BEGIN
+            INSERT INTO change_log (table_name, row_id, op) VALUES ('emergency_case', NEW.id, 'link');
+        END
+        ''',
+    ]),
+    (4, "rfid_scans.read_at for scan latency metrics", [
+        # When the reader saw the tag (epoch seconds); timestamp is only the
+        # insert time, to the second
+        "ALTER TABLE rfid_scans ADD COLUMN read_at REAL",
+    ]),
+    (5, "priority_event log for the live feed", [
+        '''
+        CREATE TABLE IF NOT EXISTS priority_event (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            signal INTEGER NOT NULL,
+            severity INTEGER,
+            rfid_number TEXT,
+            activated_at REAL NOT NULL
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_priority_feed AFTER INSERT ON priority_event
+        BEGIN
+            INSERT INTO change_log (table_name, row_id, op) VALUES ('priority_event', NEW.id, 'insert');
+        END
+        ''',
+    ]),
+    (6, "archive_segment manifest for retention", [
+        # One row per archived segment file (see retention.py)
+        '''
+        CREATE TABLE IF NOT EXISTS archive_segment (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            day TEXT NOT NULL,
+            path TEXT UNIQUE NOT NULL,
+            rows INTEGER NOT NULL,
+            first_id INTEGER NOT NULL,
+            last_id INTEGER NOT NULL,
+            bytes INTEGER NOT NULL,
+            archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_archive_segment_day ON archive_segment (table_name, day)",
+        # Tag history lookups: WHERE rfid_number = ? [AND timestamp range]
+        "CREATE INDEX IF NOT EXISTS idx_reading_tag ON rfid_reading (rfid_number, timestamp)",
+    ]),
+    (7, "stat_counter / stat_hourly rollups kept by triggers", [
+        # See stats.py.  'total' counts never go down (archiving is not
+        # deleting); 'hot_rows' follow the tables.  Hours are Pi local time.
+        '''
+        CREATE TABLE IF NOT EXISTS stat_counter (
+            name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value INTEGER NOT NULL,
+            PRIMARY KEY (name, key)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS stat_hourly (
+            hour TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            value INTEGER NOT NULL,
+            PRIMARY KEY (hour, metric)
+        ) WITHOUT ROWID
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_stats_scan_insert AFTER INSERT ON rfid_scans
+        BEGIN{_bump('total', "'rfid_scans'")}{_bump('hot_rows', "'rfid_scans'")}{_bump('scans_by_source', 'NEW.source')}
+            -- rfid_scans.timestamp is UTC (CURRENT_TIMESTAMP){_bump_hour("strftime('%Y-%m-%d %H', NEW.timestamp, 'localtime')", 'scans')}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_stats_scan_delete AFTER DELETE ON rfid_scans
+        BEGIN{_bump('hot_rows', "'rfid_scans'", -1)}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_stats_reading_insert AFTER INSERT ON rfid_reading
+        BEGIN{_bump('total', "'rfid_reading'")}{_bump('hot_rows', "'rfid_reading'")}{_bump('readings_by_reader', 'NEW.reader_type')}{_bump('total', "'readings_linked'", when='NEW.case_id IS NOT NULL')}{_bump_hour("strftime('%Y-%m-%d %H', NEW.timestamp)", 'readings')}{_bump_hour("strftime('%Y-%m-%d %H', NEW.timestamp)", 'readings_linked', when='NEW.case_id IS NOT NULL')}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_stats_reading_delete AFTER DELETE ON rfid_reading
+        BEGIN{_bump('hot_rows', "'rfid_reading'", -1)}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_stats_case_insert AFTER INSERT ON emergency_case
+        BEGIN{_bump('total', "'emergency_case'")}{_bump('hot_rows', "'emergency_case'")}{_bump('cases_by_severity', 'CAST(NEW.severity_level AS TEXT)')}{_bump('cases_by_hospital', 'NEW.hospital_name')}{_bump('cases_by_driver', 'NEW.driver_id')}{_bump('cases_linked', "''", when='NEW.rfid_linked')}{_bump_hour("strftime('%Y-%m-%d %H', NEW.created_at)", 'cases')}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_stats_case_delete AFTER DELETE ON emergency_case
+        BEGIN{_bump('hot_rows', "'emergency_case'", -1)}{_bump('cases_by_severity', 'CAST(OLD.severity_level AS TEXT)', -1)}{_bump('cases_by_hospital', 'OLD.hospital_name', -1)}{_bump('cases_by_driver', 'OLD.driver_id', -1)}{_bump('cases_linked', "''", -1, when='OLD.rfid_linked')}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_stats_case_update
+        AFTER UPDATE OF severity_level, hospital_name, driver_id, rfid_linked ON emergency_case
+        BEGIN{''.join(
+            _bump(name, key.format('OLD'), -1, when=f'OLD.{column} IS NOT NEW.{column}')
+            + _bump(name, key.format('NEW'), when=f'OLD.{column} IS NOT NEW.{column}')
+            for name, column, key in (
+                ('cases_by_severity', 'severity_level', 'CAST({}.severity_level AS TEXT)'),
+                ('cases_by_hospital', 'hospital_name', '{}.hospital_name'),
+                ('cases_by_driver', 'driver_id', '{}.driver_id'),
+            )
+        )}{_bump('cases_linked', "''", -1, when='OLD.rfid_linked AND NOT NEW.rfid_linked')}{_bump('cases_linked', "''", when='NEW.rfid_linked AND NOT COALESCE(OLD.rfid_linked, 0)')}
+        END
+        ''',
+        # Counts for what is already in the database (and the archive)
+        _backfill_stats,
+    ]),
+    (8, "emergency_case created_at index for exports", [
+        # export.py walks cases in (created_at, id) order without a driver
+        "CREATE INDEX IF NOT EXISTS idx_case_created ON emergency_case (created_at)",
+    ]),
+    (9, "current case per driver for case linking", [
+        # case_linker.py loads each driver's newest case; this keeps that a
+        # read of one row per driver however many cases pile up
+        '''
+        CREATE TABLE IF NOT EXISTS driver_current_case (
+            driver_id TEXT PRIMARY KEY,
+            case_id INTEGER NOT NULL UNIQUE
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_current_case_insert AFTER INSERT ON emergency_case BEGIN
+            INSERT INTO driver_current_case (driver_id, case_id) VALUES (NEW.driver_id, NEW.id)
+            ON CONFLICT (driver_id) DO UPDATE SET case_id = MAX(case_id, excluded.case_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_current_case_delete AFTER DELETE ON emergency_case BEGIN
+            DELETE FROM driver_current_case WHERE case_id = OLD.id;
+            INSERT OR IGNORE INTO driver_current_case (driver_id, case_id)
+            SELECT driver_id, MAX(id) FROM emergency_case WHERE driver_id = OLD.driver_id GROUP BY driver_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_current_case_update AFTER UPDATE OF driver_id ON emergency_case
+        WHEN OLD.driver_id IS NOT NEW.driver_id BEGIN
+            DELETE FROM driver_current_case WHERE case_id = OLD.id;
+            INSERT OR IGNORE INTO driver_current_case (driver_id, case_id)
+            SELECT driver_id, MAX(id) FROM emergency_case WHERE driver_id = OLD.driver_id GROUP BY driver_id;
+            INSERT INTO driver_current_case (driver_id, case_id) VALUES (NEW.driver_id, NEW.id)
+            ON CONFLICT (driver_id) DO UPDATE SET case_id = MAX(case_id, excluded.case_id);
+        END
+        ''',
+        '''
+        INSERT OR REPLACE INTO driver_current_case (driver_id, case_id)
+        SELECT driver_id, MAX(id) FROM emergency_case GROUP BY driver_id
+        ''',
+    ]),
+]
+
+
+def current_version(conn):
+    """Highest applied schema version (0 for a fresh database)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def migrate(conn=None):
+    """Apply pending migrations; returns the resulting schema version"""
+    if conn is None:
+        with connection() as conn:
+            return migrate(conn)
+
+    version = current_version(conn)
+    for number, description, steps in MIGRATIONS:
+        if number <= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while we waited for the lock
+            applied = conn.execute("SELECT 1 FROM schema_version WHERE version = ?", (number,)).fetchone()
+            if not applied:
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                             (number, description))
+                print(f"[DB] Applied migration {number}: {description}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        version = number
+    return version
+
+
+# ============================================================================
+# QUERY PLAN CHECK
+# ============================================================================
+#
+# The hot queries from app.py, brandnewpriority.py, case_index.py,
+# case_linker.py, change_feed.py and retention.py.  Keep these in step
+# with the call sites - check_query_plans() fails if any of them falls back to
+# scanning a whole table.  Queries marked bounded=True may walk an index in
+# order, because their LIMIT stops the walk after a few rows (or, for the
+# pending cases load, the index holds one row per driver).
+
+HOT_QUERIES = [
+    ("dashboard cases page", '''
+        SELECT id, patient_name, hospital_name, severity_level, rfid1_number, rfid2_number,
+               rfid_linked, created_at
+        FROM emergency_case
+        WHERE driver_id = ?
+        ORDER BY created_at DESC, id DESC LIMIT ?
+    ''', ('driver123', 21), True),
+    ("dashboard cases next page", '''
+        SELECT id, patient_name, hospital_name, severity_level, rfid1_number, rfid2_number,
+               rfid_linked, created_at
+        FROM emergency_case
+        WHERE driver_id = ? AND (created_at, id) < (?, ?)
+        ORDER BY created_at DESC, id DESC LIMIT ?
+    ''', ('driver123', '2025-01-01 00:00:00', 1, 21), True),
+    ("readings page", '''
+        SELECT id, rfid_number, reader_type, case_id, processed, timestamp
+        FROM rfid_reading
+        ORDER BY timestamp DESC, id DESC LIMIT ?
+    ''', (21,), True),
+    ("readings next page", '''
+        SELECT id, rfid_number, reader_type, case_id, processed, timestamp
+        FROM rfid_reading
+        WHERE (timestamp, id) < (?, ?)
+        ORDER BY timestamp DESC, id DESC LIMIT ?
+    ''', ('2025-01-01 00:00:00', 1, 21), True),
+    ("recent scans", "SELECT * FROM rfid_scans ORDER BY timestamp DESC LIMIT 10", (), True),
+    ("pending cases load", '''
+        SELECT c.id, c.driver_id, c.rfid1_number, c.rfid2_number
+        FROM driver_current_case d JOIN emergency_case c ON c.id = d.case_id
+        ORDER BY d.case_id
+    ''', (), True),
+    ("new cases for linking", '''
+        SELECT id, driver_id, rfid1_number, rfid2_number FROM emergency_case
+        WHERE id > ? ORDER BY id
+    ''', (0,), False),
+    ("claim waiting case", '''
+        UPDATE emergency_case
+        SET rfid1_number = ?, rfid_linked = (rfid2_number IS NOT NULL)
+        WHERE id = ? AND rfid1_number IS NULL
+        RETURNING rfid1_number, rfid2_number
+    ''', ('tag', 1), False),
+    ("controller scan fetch", '''
+        SELECT id, data, source, timestamp, read_at
+        FROM rfid_scans
+        WHERE id IN (?, ?)
+        ORDER BY id
+    ''', (1, 2), False),
+    ("case index refresh", '''
+        SELECT id, severity_level, created_at, rfid1_number, rfid2_number
+        FROM emergency_case WHERE id > ? ORDER BY id
+    ''', (0,), False),
+    ("change feed read", '''
+        SELECT seq, table_name, row_id, op FROM change_log
+        WHERE seq > ? ORDER BY seq LIMIT ?
+    ''', (0, 500), False),
+    ("oldest reading for retention", "SELECT MIN(timestamp) FROM rfid_reading", (), False),
+    ("retention day batch", '''
+        SELECT * FROM rfid_reading WHERE timestamp >= ? AND timestamp < ?
+        ORDER BY id LIMIT ?
+    ''', ('2025-01-01', '2025-01-02', 20000), False),
+    ("tag history (hot part)", "SELECT * FROM rfid_reading WHERE rfid_number = ?", ('tag',), False),
+    ("archive segments for a history query", '''
+        SELECT path FROM archive_segment
+        WHERE table_name = ? AND day >= ? AND day <= ?
+        ORDER BY day, first_id
+    ''', ('rfid_reading', '2025-01-01', '2025-02-01'), False),
+    ("stats counters", '''
+        SELECT name, key, value FROM stat_counter WHERE name IN (?, ?, ?)
+    ''', ('total', 'hot_rows', 'cases_linked'), False),
+    ("stats hourly rollups", "SELECT hour, metric, value FROM stat_hourly WHERE hour >= ?", ('2025-01-01 00',), False),
+    ("test page row counts", "SELECT key, value FROM stat_counter WHERE name = 'hot_rows'", (), False),
+    ("reading export chunk", '''
+        SELECT * FROM rfid_reading WHERE (timestamp, id) > (?, ?) AND id <= ? AND timestamp < ?
+        ORDER BY timestamp, id LIMIT ?
+    ''', ('2025-01-01', 0, 1000, '2025-02-01', 1000), False),
+    ("scan export chunk", '''
+        SELECT * FROM rfid_scans WHERE (timestamp, id) > (?, ?) AND id <= ?
+        ORDER BY timestamp, id LIMIT ?
+    ''', ('', 0, 1000, 1000), False),
+    ("all cases page", '''
+        SELECT * FROM emergency_case WHERE (created_at, id) < (?, ?)
+        ORDER BY created_at DESC, id DESC LIMIT ?
+    ''', ('2025-01-01', 1, 1000), True),
+    ("case export chunk", '''
+        SELECT * FROM emergency_case WHERE (created_at, id) > (?, ?) AND id <= ?
+        ORDER BY created_at, id LIMIT ?
+    ''', ('', 0, 1000, 1000), False),
+]
+
+# "SCAN rfid_scans" is a full table scan; "SCAN rfid_scans USING INDEX ..."
+# walks a whole index
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+INDEX_SCAN = re.compile(r'^SCAN (\w+) USING (COVERING )?INDEX ')
+
+
+def check_query_plans(conn=None):
+    """Return (name, plan detail) for every hot query that does a full scan"""
+    if conn is None:
+        with connection() as conn:
+            return check_query_plans(conn)
+
+    failures = []
+    for name, sql, params, bounded in HOT_QUERIES:
+        for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+            detail = row[-1]
+            if FULL_SCAN.match(detail) or (INDEX_SCAN.match(detail) and not bounded):
+                failures.append((name, detail))
+    return failures
+
+
+if __name__ == '__main__':
+    print(f"Schema version: {migrate()}")
+    if '--check' in sys.argv:
+        failures = check_query_plans()
+        for name, detail in failures:
+            print(f"FULL SCAN in {name}: {detail}")
+        if failures:
+            sys.exit(1)
+        print(f"All {len(HOT_QUERIES)} hot queries use an index")
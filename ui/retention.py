@@ -0,0 +1,405 @@
+"""Retention for rfid_scans / rfid_reading: archive old days, vacuum, query history.
+
+    python retention.py                 # archive everything past the horizon
+    python retention.py --days 3        # ... with another horizon
+    python retention.py --dry-run       # only show what would be archived
+    python retention.py convert         # one-off: enable incremental vacuum (offline)
+    python retention.py history --table rfid_reading --rfid-number 123 --since 2026-01-01
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from db import DB_PATH, connection, transaction
+
+# ============================================================================
+# RETENTION AND ARCHIVAL
+# ============================================================================
+#
+# Every scan adds a row to rfid_scans and rfid_reading.  Whole days older
+# than the horizon (RETENTION_DAYS) move out of the database into gzipped
+# JSON-lines segments in ARCHIVE_DIR:
+#
+#   <table>/<YYYY-MM-DD>/<first id>-<last id>.jsonl.gz
+#
+# (first line: the column names, then one JSON array per row).  A segment is
+# written under a temporary name and renamed, then one transaction records
+# it in archive_segment and deletes its rows - so a row is always either hot
+# or in a recorded segment, never both or neither.  Re-running after a crash
+# rewrites the same segment file.
+#
+# Freed pages go back to the filesystem with PRAGMA incremental_vacuum, a
+# few at a time so the write lock is never held for long.  Databases created
+# before auto_vacuum was set need one full VACUUM to allow that, which
+# rewrites the whole file under the write lock - so it is never done by the
+# daemon, only by `retention.py convert` with the readers stopped; until
+# then passes archive and prune but skip vacuuming.  change_log is
+# trimmed to its newest CHANGE_LOG_KEEP entries: every consumer starts near
+# the end (and the live feed sends "reset" for anything older).
+#
+# history() answers queries over both: hot rows and the segments for the
+# requested days, read in one snapshot.
+
+RETENTION_DAYS = int(os.environ.get('ETPS_RETENTION_DAYS', 30))
+ARCHIVE_DIR = os.environ.get(
+    'ETPS_ARCHIVE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), 'archive'),
+)
+# Seconds between runs in the ingest daemon
+RETENTION_INTERVAL = float(os.environ.get('ETPS_RETENTION_INTERVAL', 3600))
+CHANGE_LOG_KEEP = int(os.environ.get('ETPS_CHANGE_LOG_KEEP', 100000))
+
+# Archived tables and the clock their timestamp column is in: rfid_scans
+# uses SQLite's CURRENT_TIMESTAMP (UTC), rfid_reading the Pi's local time
+TABLES = {'rfid_scans': 'utc', 'rfid_reading': 'local'}
+# Rows per segment file (and per delete transaction)
+SEGMENT_ROWS = 20000
+# Pages freed per incremental_vacuum step, and change_log rows per delete
+VACUUM_PAGES = 2000
+PRUNE_BATCH = 20000
+
+
+def cutoff_day(table, days, now=None):
+    """'YYYY-MM-DD' - rows before this day are past the horizon"""
+    now = now or time.time()
+    tz = timezone.utc if TABLES[table] == 'utc' else None
+    return (datetime.fromtimestamp(now, tz) - timedelta(days=days)).strftime('%Y-%m-%d')
+
+
+def next_day(day):
+    return (datetime.strptime(day, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def incremental_vacuum_enabled(conn):
+    return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+def enable_incremental_vacuum(conn):
+    """Switch an older database to auto_vacuum=INCREMENTAL (one full VACUUM -
+    run it offline, see `retention.py convert`)"""
+    if incremental_vacuum_enabled(conn):
+        return False
+    print("[RETENTION] Converting database to incremental vacuum (one-time VACUUM)...")
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+
+class Archiver:
+    """Moves old rows into archive segments and reclaims their space"""
+    def __init__(self, days=RETENTION_DAYS, archive_dir=ARCHIVE_DIR, segment_rows=SEGMENT_ROWS,
+                 change_log_keep=CHANGE_LOG_KEEP):
+        self.days = days
+        self.archive_dir = archive_dir
+        self.segment_rows = segment_rows
+        self.change_log_keep = change_log_keep
+        self.lock = threading.Lock()
+        # Counters
+        self.runs = 0
+        self.rows_archived = 0
+        self.segments_written = 0
+        self.bytes_written = 0
+        self.change_log_pruned = 0
+        self.pages_vacuumed = 0
+        self.vacuum_skipped = False
+        self.last_run = None
+        self.last_error = None
+
+    # ------------------------------------------------------------------
+    # Archiving
+    # ------------------------------------------------------------------
+    def _write_segment(self, table, day, columns, rows):
+        relative = os.path.join(table, day, f"{rows[0][0]}-{rows[-1][0]}.jsonl.gz")
+        path = os.path.join(self.archive_dir, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+                f.write(json.dumps(columns).encode('utf-8') + b'\n')
+                for row in rows:
+                    f.write(json.dumps(row, default=str).encode('utf-8') + b'\n')
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp, path)
+        return relative, os.path.getsize(path)
+
+    def archive_table(self, conn, table, dry_run=False, now=None):
+        """Archive every whole day before the horizon; returns rows archived"""
+        cutoff = cutoff_day(table, self.days, now)
+        archived = 0
+        while True:
+            oldest = conn.execute(f"SELECT MIN(timestamp) FROM {table}").fetchone()[0]
+            if oldest is None or str(oldest)[:10] >= cutoff:
+                return archived
+            day = str(oldest)[:10]
+            cursor = conn.execute(f"""
+                SELECT * FROM {table} WHERE timestamp >= ? AND timestamp < ?
+                ORDER BY id LIMIT ?
+            """, (day, next_day(day), self.segment_rows))
+            columns = [d[0] for d in cursor.description]
+            rows = cursor.fetchall()
+            if not rows:
+                # Timestamps that don't start with a date (never archived)
+                return archived
+            if dry_run:
+                count = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE timestamp < ?", (cutoff,)).fetchone()[0]
+                print(f"[RETENTION] Would archive {count} {table} rows before {cutoff}")
+                return count
+
+            relative, size = self._write_segment(table, day, columns, rows)
+            with transaction(immediate=True) as tx:
+                tx.execute("""
+                    INSERT OR REPLACE INTO archive_segment (table_name, day, path, rows, first_id, last_id, bytes)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (table, day, relative, len(rows), rows[0][0], rows[-1][0], size))
+                tx.executemany(f"DELETE FROM {table} WHERE id = ?", [(row[0],) for row in rows])
+            archived += len(rows)
+            with self.lock:
+                self.rows_archived += len(rows)
+                self.segments_written += 1
+                self.bytes_written += size
+            print(f"[RETENTION] Archived {len(rows)} {table} rows from {day} -> {relative} ({size} bytes)")
+
+    def prune_change_log(self, conn):
+        """Drop all but the newest change_log entries; returns rows deleted"""
+        newest = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+        floor = newest - self.change_log_keep
+        pruned = 0
+        while floor > 0:
+            with transaction(immediate=True) as tx:
+                deleted = tx.execute("""
+                    DELETE FROM change_log WHERE seq IN (
+                        SELECT seq FROM change_log WHERE seq <= ? ORDER BY seq LIMIT ?
+                    )
+                """, (floor, PRUNE_BATCH)).rowcount
+            pruned += deleted
+            if deleted < PRUNE_BATCH:
+                break
+        with self.lock:
+            self.change_log_pruned += pruned
+        return pruned
+
+    def vacuum(self, conn):
+        """Return free pages to the filesystem, VACUUM_PAGES per transaction"""
+        if not incremental_vacuum_enabled(conn):
+            # incremental_vacuum is a no-op here; the file keeps its free pages
+            if not self.vacuum_skipped:
+                print("[RETENTION] Database is not in incremental vacuum mode - skipping vacuum "
+                      "(run `python retention.py convert` with the readers stopped)")
+                self.vacuum_skipped = True
+            return 0
+        freed = 0
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        while free > 0:
+            # executescript steps the pragma to completion; execute() would
+            # stop after the first page
+            conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES});")
+            remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if remaining >= free:
+                break
+            freed += free - remaining
+            free = remaining
+        if freed:
+            # The file only shrinks once the WAL is checkpointed
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+        with self.lock:
+            self.pages_vacuumed += freed
+        return freed
+
+    def run(self, dry_run=False, now=None):
+        """One retention pass; returns a summary dict"""
+        started = time.monotonic()
+        summary = {'archived': {}, 'change_log_pruned': 0, 'pages_vacuumed': 0}
+        try:
+            with connection() as conn:
+                for table in TABLES:
+                    summary['archived'][table] = self.archive_table(conn, table, dry_run, now)
+                if not dry_run:
+                    summary['change_log_pruned'] = self.prune_change_log(conn)
+                    summary['pages_vacuumed'] = self.vacuum(conn)
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"[RETENTION] Error: {e}")
+            summary['error'] = str(e)
+        summary['seconds'] = round(time.monotonic() - started, 3)
+        with self.lock:
+            self.runs += 1
+            self.last_run = time.time()
+        return summary
+
+    def stats(self):
+        with self.lock:
+            return {
+                'retention_days': self.days,
+                'archive_dir': self.archive_dir,
+                'runs': self.runs,
+                'last_run': self.last_run,
+                'last_error': self.last_error,
+                'rows_archived': self.rows_archived,
+                'segments_written': self.segments_written,
+                'bytes_written': self.bytes_written,
+                'change_log_pruned': self.change_log_pruned,
+                'pages_vacuumed': self.pages_vacuumed,
+                'vacuum_skipped': self.vacuum_skipped,
+            }
+
+
+class RetentionJob:
+    """Runs an Archiver every RETENTION_INTERVAL seconds on its own thread"""
+    def __init__(self, archiver=None, interval=RETENTION_INTERVAL):
+        self.archiver = archiver or Archiver()
+        self.interval = interval
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.archiver.days <= 0:
+            print("[RETENTION] Disabled (ETPS_RETENTION_DAYS=0)")
+            return
+        if self.thread and self.thread.is_alive():
+            return
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, name='retention', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(10)
+
+    def _run(self):
+        while not self.stopping.is_set():
+            self.archiver.run()
+            self.stopping.wait(self.interval)
+
+    def stats(self):
+        return dict(self.archiver.stats(), running=bool(self.thread and self.thread.is_alive()))
+
+
+# ============================================================================
+# HISTORY ACROSS HOT AND ARCHIVED ROWS
+# ============================================================================
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def read_segment(path, archive_dir=ARCHIVE_DIR, needles=()):
+    """Rows of one segment file as dicts (only lines containing all needles)"""
+    with open(os.path.join(archive_dir, path), 'rb') as f:
+        data = gzip.decompress(f.read())
+    header_end = data.index(b'\n')
+    columns = json.loads(data[:header_end])
+    needles = [needle.encode('utf-8') for needle in needles]
+    if not needles:
+        for line in data[header_end + 1:].splitlines():
+            yield dict(zip(columns, json.loads(line)))
+        return
+    # Jump between occurrences of the first needle instead of parsing every line
+    first, rest = needles[0], needles[1:]
+    position = data.find(first, header_end)
+    while position != -1:
+        start = data.rfind(b'\n', 0, position) + 1
+        end = data.find(b'\n', position)
+        end = len(data) if end == -1 else end
+        line = data[start:end]
+        if all(needle in line for needle in rest):
+            yield dict(zip(columns, json.loads(line)))
+        position = data.find(first, end)
+
+
+def history(table, since=None, until=None, archive_dir=ARCHIVE_DIR, **equals):
+    """Rows of table with since <= timestamp < until (both optional, as
+    'YYYY-MM-DD[ HH:MM:SS]' strings) whose columns equal **equals, hot and
+    archived, oldest first.  E.g. history('rfid_reading', rfid_number='123').
+    """
+    if table not in TABLES:
+        raise ValueError(f"no history for {table!r}, expected one of {', '.join(TABLES)}")
+    with connection() as conn:
+        columns = _columns(conn, table)
+        unknown = set(equals) - set(columns)
+        if unknown:
+            raise ValueError(f"unknown column(s) for {table}: {', '.join(sorted(unknown))}")
+
+        where, params = [], []
+        if since is not None:
+            where.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("timestamp < ?")
+            params.append(until)
+        for column, value in equals.items():
+            where.append(f"{column} = ?")
+            params.append(value)
+        clause = f"WHERE {' AND '.join(where)}" if where else ''
+
+        # Hot rows and the segment list from the same snapshot, so rows
+        # archived meanwhile are seen exactly once
+        outer = conn.in_transaction
+        if not outer:
+            conn.execute("BEGIN")
+        try:
+            hot = [dict(zip(columns, row)) for row in conn.execute(f"SELECT * FROM {table} {clause}", params)]
+            segments = conn.execute("""
+                SELECT path FROM archive_segment
+                WHERE table_name = ? AND day >= ? AND day <= ?
+                ORDER BY day, first_id
+            """, (table, (since or '')[:10], (until or '9999-12-31')[:10])).fetchall()
+        finally:
+            if not outer:
+                conn.rollback()
+
+    # Only parse lines that contain every value being matched
+    needles = [json.dumps(value) for value in equals.values()]
+    archived = []
+    for (path,) in segments:
+        for row in read_segment(path, archive_dir, needles):
+            timestamp = str(row.get('timestamp'))
+            if since is not None and timestamp < since:
+                continue
+            if until is not None and timestamp >= until:
+                continue
+            if all(row.get(column) == value for column, value in equals.items()):
+                archived.append(row)
+    rows = archived + hot
+    rows.sort(key=lambda row: (str(row['timestamp']), row['id']))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', nargs='?', default='archive', choices=('archive', 'history', 'convert'))
+    parser.add_argument('--days', type=int, default=RETENTION_DAYS)
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--table', default='rfid_reading', choices=tuple(TABLES))
+    parser.add_argument('--rfid-number', help="history: readings of this tag (rfid_reading)")
+    parser.add_argument('--data', help="history: scans of this tag (rfid_scans)")
+    parser.add_argument('--since')
+    parser.add_argument('--until')
+    args = parser.parse_args()
+
+    if args.command == 'history':
+        equals = {key: value for key, value in (('rfid_number', args.rfid_number), ('data', args.data)) if value}
+        for row in history(args.table, args.since, args.until, **equals):
+            print(json.dumps(row, default=str))
+        return 0
+    if args.command == 'convert':
+        started = time.monotonic()
+        with connection() as conn:
+            converted = enable_incremental_vacuum(conn)
+        print(f"[RETENTION] {'Converted' if converted else 'Already in incremental vacuum mode'} "
+              f"({time.monotonic() - started:.1f}s)")
+        return 0
+    summary = Archiver(days=args.days).run(dry_run=args.dry_run)
+    print(json.dumps(summary, indent=2))
+    return 1 if 'error' in summary else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from collections import namedtuple
+
+# ============================================================================
+# SCAN BUS - reader processes -> traffic controller
+# ============================================================================
+#
+# Each reader gets its own channel ("rfid1", "rfid2").  The traffic controller
+# binds the channel and blocks on receive(), so it wakes the moment a tag
+# arrives instead of polling rfid1.txt / rfid2.txt.
+#
+# Backends:
+#   socket - Unix datagram socket, one datagram per scan (default).  Scans are
+#            never merged, and a full socket buffer makes the reader wait
+#            instead of overwriting an unread scan.
+#   queue  - in-process queue.Queue, for running readers and controller in
+#            the same Python process.
+
+SOCKET_DIR = os.environ.get('ETPS_SOCKET_DIR', '/tmp/etps')
+DEFAULT_BACKEND = os.environ.get('ETPS_SCAN_BUS', 'socket')
+MAX_DATAGRAM = 4096
+# How long a reader waits for a stalled controller to drain its socket
+SEND_TIMEOUT = 5.0
+
+Scan = namedtuple('Scan', ['reader', 'uid', 'read_at'])
+
+
+def channel_path(channel):
+    """Socket path for a channel"""
+    return os.path.join(SOCKET_DIR, f"{channel}.sock")
+
+
+class QueueBackend:
+    """In-process backend - one shared queue per channel"""
+    _queues = {}
+    _lock = threading.Lock()
+
+    def __init__(self, channel):
+        with QueueBackend._lock:
+            self.queue = QueueBackend._queues.setdefault(channel, queue.Queue())
+
+    def bind(self):
+        pass
+
+    def send(self, scan):
+        self.queue.put(scan)
+        return True
+
+    def receive(self, timeout=None):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        pass
+
+
+class SocketBackend:
+    """Unix datagram socket backend"""
+    def __init__(self, channel):
+        self.path = channel_path(channel)
+        self.receiver = None
+        self.sender = None
+        self.send_lock = threading.Lock()
+
+    def bind(self):
+        os.makedirs(SOCKET_DIR, exist_ok=True)
+        # A stale socket from a previous run would make bind() fail
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.receiver.bind(self.path)
+        os.chmod(self.path, 0o666)
+
+    def send(self, scan):
+        payload = json.dumps(scan._asdict()).encode('utf-8')
+        with self.send_lock:
+            if self.sender is None:
+                self.sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                self.sender.settimeout(SEND_TIMEOUT)
+            try:
+                self.sender.sendto(payload, self.path)
+                return True
+            except (FileNotFoundError, ConnectionRefusedError):
+                print(f"[BUS] No controller listening on {self.path} - scan {scan.uid} not delivered")
+                return False
+            except socket.timeout:
+                print(f"[BUS] Controller on {self.path} is not draining - scan {scan.uid} not delivered")
+                return False
+
+    def receive(self, timeout=None):
+        self.receiver.settimeout(timeout)
+        try:
+            payload = self.receiver.recv(MAX_DATAGRAM)
+        except (socket.timeout, BlockingIOError):
+            # timeout=0 polls without blocking
+            return None
+        return Scan(**json.loads(payload.decode('utf-8')))
+
+    def fileno(self):
+        """Receiving socket, for select()-based event loops"""
+        return self.receiver.fileno()
+
+    def close(self):
+        for sock in (self.receiver, self.sender):
+            if sock:
+                sock.close()
+        if self.receiver and os.path.exists(self.path):
+            os.unlink(self.path)
+        self.receiver = None
+        self.sender = None
+
+
+BACKENDS = {
+    'socket': SocketBackend,
+    'queue': QueueBackend,
+}
+
+
+def register_backend(name, backend_class):
+    """Make another transport available to ScanBus(backend=name)"""
+    BACKENDS[name] = backend_class
+
+
+class ScanBus:
+    """One channel of the scan bus"""
+    def __init__(self, channel, backend=None):
+        self.channel = channel
+        self.backend = BACKENDS[backend or DEFAULT_BACKEND](channel)
+
+    def listen(self):
+        """Bind the channel - call once in the consuming process"""
+        self.backend.bind()
+        return self
+
+    def publish(self, uid, read_at=None):
+        """Send one scan to whoever is listening on this channel"""
+        scan = Scan(self.channel, str(uid), read_at or time.time())
+        return self.backend.send(scan)
+
+    def receive(self, timeout=None):
+        """Block until a scan arrives; None if the timeout expires first"""
+        return self.backend.receive(timeout)
+
+    def fileno(self):
+        """File descriptor to select() on; only socket-style backends have one"""
+        return self.backend.fileno()
+
+    def close(self):
+        self.backend.close()
@@ -0,0 +1,183 @@
+import queue
+import threading
+import time
+
+import metrics
+from db import transaction
+
+# ============================================================================
+# GROUP-COMMIT SCAN WRITER
+# ============================================================================
+#
+# Reader threads hand scans to submit() and go straight back to the hardware.
+# A single writer thread drains the queue and commits everything that arrived
+# within the batch window in one transaction (one fsync instead of one per
+# scan).
+
+# Scans committed together at most
+MAX_BATCH = 64
+# How long the writer waits for more scans after the first one (seconds)
+MAX_LATENCY = 0.005
+# Scans waiting for the writer before new ones are dropped
+QUEUE_SIZE = 1024
+
+
+class ScanTicket:
+    """Acknowledgement for one submitted scan"""
+    def __init__(self, rfid_number, reader_type, read_at):
+        self.rfid_number = rfid_number
+        self.reader_type = reader_type
+        self.read_at = read_at
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        """Block until the scan is committed; True if it was saved"""
+        return self.done.wait(timeout) and self.error is None
+
+
+class ScanWriter:
+    """Background writer that batches scans into group commits.
+
+    apply(cursor, rfid_number, reader_type, read_at) does the per-scan SQL;
+    its return value ends up in ticket.result.  on_rollback() is called when
+    a scan or a whole batch is rolled back (to drop state cached by apply);
+    on_commit(result) once per scan after its batch has committed.
+    """
+    def __init__(self, apply, max_batch=MAX_BATCH, max_latency=MAX_LATENCY, queue_size=QUEUE_SIZE,
+                 on_rollback=None, on_commit=None):
+        self.apply = apply
+        self.on_rollback = on_rollback
+        self.on_commit = on_commit
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.running = False
+        self.lock = threading.Lock()
+        # Counters
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self.batches = 0
+
+    def start(self):
+        """Start the writer thread (no-op if it is already running)"""
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name='scan-writer', daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=5):
+        """Flush what is queued, then stop the writer thread"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout)
+
+    def submit(self, rfid_number, reader_type, read_at=None):
+        """Queue a scan without blocking; None if the queue is full"""
+        ticket = ScanTicket(rfid_number, reader_type, read_at or time.time())
+        try:
+            self.queue.put_nowait(ticket)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            metrics.inc('etps_scans_dropped_total')
+            print(f"[WRITER] Queue full - dropped {reader_type} scan {rfid_number}")
+            return None
+        with self.lock:
+            self.submitted += 1
+        return ticket
+
+    @property
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    def stats(self):
+        """Counters for status pages"""
+        with self.lock:
+            return {
+                'running': bool(self.thread and self.thread.is_alive()),
+                'queue_depth': self.queue_depth,
+                'submitted': self.submitted,
+                'written': self.written,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'batches': self.batches,
+            }
+
+    def _run(self):
+        while self.running or not self.queue.empty():
+            try:
+                batch = [self.queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+
+            # Collect whatever else arrives inside the batch window
+            deadline = time.monotonic() + self.max_latency
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self.queue.get(timeout=remaining) if remaining > 0
+                                 else self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._commit(batch)
+            except Exception as e:
+                # Never let one batch stop the writer - later scans would
+                # queue up and never be written
+                print(f"[WRITER] Unexpected error committing {len(batch)} scans: {e}")
+            finally:
+                for ticket in batch:
+                    ticket.done.set()
+
+    def _rolled_back(self):
+        if self.on_rollback:
+            self.on_rollback()
+
+    def _commit(self, batch):
+        try:
+            with transaction(immediate=True) as conn:
+                c = conn.cursor()
+                for ticket in batch:
+                    # A savepoint per scan, so one bad scan doesn't lose the batch
+                    c.execute("SAVEPOINT scan")
+                    try:
+                        ticket.result = self.apply(c, ticket.rfid_number, ticket.reader_type, ticket.read_at)
+                        c.execute("RELEASE scan")
+                    except Exception as e:
+                        c.execute("ROLLBACK TO scan")
+                        c.execute("RELEASE scan")
+                        ticket.error = e
+                        self._rolled_back()
+                        print(f"[WRITER] Error saving {ticket.reader_type} scan {ticket.rfid_number}: {e}")
+        except Exception as e:
+            print(f"[WRITER] Batch of {len(batch)} scans failed: {e}")
+            self._rolled_back()
+            for ticket in batch:
+                ticket.error = ticket.error or e
+
+        committed = time.time()
+        with self.lock:
+            self.batches += 1
+            for ticket in batch:
+                if ticket.error is None:
+                    self.written += 1
+                else:
+                    self.failed += 1
+        for ticket in batch:
+            if ticket.error is None:
+                metrics.inc('etps_scans_committed_total')
+                metrics.observe('etps_scan_commit_seconds', committed - ticket.read_at)
+                if self.on_commit:
+                    # The scan is committed - a failing hook must not look like a failed write
+                    try:
+                        self.on_commit(ticket.result)
+                    except Exception as e:
+                        print(f"[WRITER] on_commit failed for {ticket.reader_type} scan {ticket.rfid_number}: {e}")
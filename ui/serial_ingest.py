@@ -0,0 +1,194 @@
+import asyncio
+import os
+import termios
+import threading
+import time
+import tty
+
+# ============================================================================
+# ASYNCIO SERIAL INGEST
+# ============================================================================
+#
+# One event loop reads every configured serial RFID reader.  Each port's
+# file descriptor is registered with the loop, so a reader costs nothing
+# until bytes arrive - no in_waiting polling, no fixed sleeps.  Chunks are
+# split into lines as they come in (a line may arrive in several chunks, or
+# several lines in one).
+#
+# Complete lines go to on_scan(reader, uid, read_at), which must not block
+# (ingest.py hands them to the scan writer's queue).  When a USB reader is
+# unplugged the read fails; the port is closed and reopened with
+# exponential backoff until the device comes back.
+
+# Reconnect backoff (seconds)
+MIN_BACKOFF = 0.5
+MAX_BACKOFF = 10.0
+# Longer lines are line noise, not tags - they are dropped
+MAX_LINE = 256
+READ_SIZE = 4096
+
+
+class LineParser:
+    """Incremental line splitter for one port"""
+    def __init__(self, max_line=MAX_LINE):
+        self.buffer = b''
+        self.max_line = max_line
+        self.discarded = 0
+
+    def feed(self, chunk):
+        """Add a chunk; returns the complete, non-empty lines in it (decoded)"""
+        self.buffer += chunk
+        *lines, self.buffer = self.buffer.split(b'\n')
+        if len(self.buffer) > self.max_line:
+            self.buffer = b''
+            self.discarded += 1
+        decoded = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if len(line) > self.max_line:
+                self.discarded += 1
+                continue
+            decoded.append(line.decode('utf-8', errors='replace'))
+        return decoded
+
+
+def open_tty(path, baudrate):
+    """Open a serial device non-blocking, raw, at baudrate"""
+    fd = os.open(path, os.O_RDONLY | os.O_NOCTTY | os.O_NONBLOCK)
+    try:
+        tty.setraw(fd)
+        attrs = termios.tcgetattr(fd)
+        speed = getattr(termios, f"B{baudrate}")
+        attrs[4] = attrs[5] = speed
+        attrs[2] |= termios.CLOCAL | termios.CREAD
+        termios.tcsetattr(fd, termios.TCSANOW, attrs)
+    except termios.error:
+        # Not a terminal (e.g. a FIFO) - read it as it is
+        pass
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+class PortState:
+    """Counters for one port"""
+    def __init__(self, config):
+        self.config = config
+        self.connected = False
+        self.lines = 0
+        self.reconnects = 0
+        self.last_error = None
+        self.parser = LineParser()
+
+    def stats(self):
+        return {
+            'port': self.config.port,
+            'reader': self.config.reader,
+            'connected': self.connected,
+            'lines': self.lines,
+            'reconnects': self.reconnects,
+            'discarded': self.parser.discarded,
+            'last_error': self.last_error,
+        }
+
+
+class SerialIngest:
+    """Reads any number of serial RFID readers on one asyncio loop.
+
+    ports are intersections.SerialReader tuples (port, baudrate, reader).
+    """
+    def __init__(self, ports, on_scan, clock=time.time):
+        self.ports = [PortState(config) for config in ports]
+        self.on_scan = on_scan
+        self.clock = clock
+        self.loop = None
+        self.stopping = None
+        self.stop_requested = False
+        self.started = threading.Event()
+
+    def run(self):
+        """Run until stop() is called (blocks the calling thread)"""
+        self.stop_requested = False
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        if self.stop_requested:
+            return
+        self.started.set()
+        tasks = [asyncio.create_task(self._maintain(state)) for state in self.ports]
+        try:
+            await self.stopping.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.started.clear()
+
+    def stop(self):
+        """Stop run() from any thread"""
+        self.stop_requested = True
+        if self.loop is not None and self.started.is_set():
+            self.loop.call_soon_threadsafe(self.stopping.set)
+
+    def stats(self):
+        return [state.stats() for state in self.ports]
+
+    async def _maintain(self, state):
+        """Keep one port open, reconnecting with backoff"""
+        config = state.config
+        backoff = MIN_BACKOFF
+        while True:
+            try:
+                fd = open_tty(config.port, config.baudrate)
+            except OSError as e:
+                if state.last_error != str(e):
+                    print(f"[SERIAL] {config.port}: {e} - retrying")
+                state.last_error = str(e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                continue
+
+            backoff = MIN_BACKOFF
+            state.connected = True
+            state.last_error = None
+            print(f"[SERIAL] {config.port}: reading ({config.reader})")
+            closed = self.loop.create_future()
+            self.loop.add_reader(fd, self._readable, state, fd, closed)
+            try:
+                reason = await closed
+            finally:
+                self.loop.remove_reader(fd)
+                os.close(fd)
+                state.connected = False
+            state.reconnects += 1
+            state.parser = LineParser()
+            state.last_error = reason
+            print(f"[SERIAL] {config.port}: disconnected ({reason}) - reconnecting")
+            await asyncio.sleep(MIN_BACKOFF)
+
+    def _readable(self, state, fd, closed):
+        try:
+            chunk = os.read(fd, READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            # EIO / ENODEV: the device went away
+            if not closed.done():
+                closed.set_result(str(e))
+            return
+        if not chunk:
+            if not closed.done():
+                closed.set_result('end of file')
+            return
+        read_at = self.clock()
+        for line in state.parser.feed(chunk):
+            state.lines += 1
+            try:
+                self.on_scan(state.config.reader, line, read_at)
+            except Exception as e:
+                print(f"[SERIAL] {state.config.port}: scan handler failed: {e}")
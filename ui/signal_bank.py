@@ -0,0 +1,117 @@
+# ============================================================================
+# SIGNAL BANK - ALL LAMPS OF AN INTERSECTION AS ONE STATE
+# ============================================================================
+#
+# Controllers describe the whole intersection at once ({signal: colour}) and
+# SignalBank works out which pins actually have to change.  Only those pins
+# are written, in a single call where the backend supports it, so an
+# approach never goes dark between "everything off" and "new lamp on", and
+# unchanged lamps cost nothing.
+#
+# Every state is checked before it is written: at most one approach may
+# show a go light (green or white) at any time.
+
+GO_COLOURS = ('green', 'white')
+
+
+class SignalConflict(ValueError):
+    """Raised instead of writing a state with two approaches on go"""
+
+
+class GPIOBackend:
+    """RPi.GPIO (or anything with the same output() signature)"""
+    def __init__(self, gpio):
+        self.gpio = gpio
+
+    def setup(self, pins):
+        for pin in pins:
+            self.gpio.setup(pin, self.gpio.OUT)
+
+    def write(self, pins, levels):
+        # RPi.GPIO.output() takes a list of channels and a list of values
+        if len(pins) == 1:
+            self.gpio.output(pins[0], self.gpio.HIGH if levels[0] else self.gpio.LOW)
+        else:
+            self.gpio.output(list(pins), [self.gpio.HIGH if on else self.gpio.LOW for on in levels])
+
+
+class SimulatedBackend:
+    """Keeps pin levels in memory and counts writes"""
+    def __init__(self):
+        self.levels = {}
+        self.calls = 0       # backend calls (one per batch)
+        self.writes = 0      # individual pin writes
+
+    def setup(self, pins):
+        for pin in pins:
+            self.levels.setdefault(pin, False)
+
+    def write(self, pins, levels):
+        self.calls += 1
+        self.writes += len(pins)
+        self.levels.update(zip(pins, levels))
+
+
+class SignalBank:
+    """Current lamp state of one intersection; writes only what changes.
+
+    pins is {signal: {lamp name: pin}}.  Lamp names are matched to colours
+    case-insensitively, so {'Red': 5} and {'red': 5} both work.
+    """
+    def __init__(self, pins, backend):
+        self.pins = pins
+        self.backend = backend
+        self.levels = {}   # pin -> bool, as last written
+
+    def setup(self):
+        """Configure every pin as an output and switch it off"""
+        all_pins = [pin for lamps in self.pins.values() for pin in lamps.values()]
+        self.backend.setup(all_pins)
+        self.levels = {}
+        self.write({pin: False for pin in all_pins})
+
+    def desired(self, lamps, hold=()):
+        """Pin levels for {signal: colour}; (signal, lamp) pairs in hold are left alone"""
+        levels = {}
+        for signal, colour in lamps.items():
+            for name, pin in self.pins[signal].items():
+                if (signal, name) not in hold:
+                    levels[pin] = colour is not None and name.lower() == colour
+        return levels
+
+    def apply(self, lamps, hold=()):
+        """Show {signal: colour} (None = dark); returns the number of pins written"""
+        return self.write(self.desired(lamps, hold))
+
+    def set_lamp(self, signal, name, on):
+        """Switch one lamp (used by lamp animations)"""
+        return self.write({self.pins[signal][name]: on})
+
+    def all_off(self):
+        return self.apply({signal: None for signal in self.pins})
+
+    def lit(self, levels=None):
+        """{signal: [lamp names that are on]}"""
+        levels = self.levels if levels is None else levels
+        return {signal: [name for name, pin in lamps.items() if levels.get(pin)]
+                for signal, lamps in self.pins.items()}
+
+    def check(self, levels):
+        """Raise SignalConflict if levels would put two approaches on go"""
+        go = [signal for signal, names in self.lit(levels).items()
+              if any(name.lower() in GO_COLOURS for name in names)]
+        if len(go) > 1:
+            raise SignalConflict(f"signals {go} would all show a go light")
+
+    def write(self, levels):
+        """Write the pins in levels that differ from what is showing"""
+        changed = {pin: on for pin, on in levels.items() if self.levels.get(pin) != on}
+        if not changed:
+            return 0
+        self.check({**self.levels, **changed})
+        # Switch lamps off before others come on within the batch, so the
+        # hardware never passes through a conflicting state either
+        order = sorted(changed, key=lambda pin: changed[pin])
+        self.backend.write(order, [changed[pin] for pin in order])
+        self.levels.update(changed)
+        return len(changed)
@@ -0,0 +1,183 @@
+import time
+from collections import namedtuple
+
+# ============================================================================
+# PREEMPTIBLE SIGNAL PHASE MACHINE
+# ============================================================================
+#
+# The normal cycle is a list of phases, each a lamp state for the whole
+# junction held for a number of seconds.  PhaseMachine steps through them on
+# a monotonic clock and never sleeps itself - the caller waits until
+# machine.deadline (or until something happens) and then calls tick().
+#
+# preempt(signal, hold) can be called at any moment.  Any approach that would
+# lose a green/white lamp shows yellow for the clearance time first, then the
+# priority signal gets white and everyone else red.  When the hold expires
+# the machine resumes the phase it interrupted, with the time it had left.
+
+Phase = namedtuple('Phase', ['name', 'duration', 'lamps'])
+
+# Lamp state is {signal number: colour}
+NORMAL_PLAN = [
+    Phase('signal1_green', 2, {1: 'green', 2: 'red'}),
+    Phase('signal1_yellow', 2, {1: 'yellow', 2: 'red'}),
+    Phase('signal2_green', 5, {1: 'red', 2: 'green'}),
+    Phase('signal2_yellow', 2, {1: 'red', 2: 'yellow'}),
+]
+
+
+def cycle_plan(signals, green=5, yellow=2):
+    """Normal cycle giving each signal in turn green then yellow, others red.
+    green / yellow are seconds for every signal, or {signal: seconds}."""
+    plan = []
+    for current in signals:
+        for colour, duration in (('green', green), ('yellow', yellow)):
+            if isinstance(duration, dict):
+                duration = duration[current]
+            lamps = {signal: colour if signal == current else 'red' for signal in signals}
+            plan.append(Phase(f"{current}_{colour}".lower(), duration, lamps))
+    return plan
+
+
+def relabel_plan(plan, label):
+    """The same plan with every signal id passed through label (e.g. int)"""
+    return [phase._replace(lamps={label(signal): colour for signal, colour in phase.lamps.items()})
+            for phase in plan]
+
+
+# Seconds an approach shows yellow before losing green/white
+YELLOW_CLEARANCE = 2
+
+NORMAL = 'normal'
+CLEARING = 'clearing'
+PRIORITY = 'priority'
+
+GO_COLOURS = ('green', 'white')
+
+
+def _go(lamps):
+    """Signals that currently let traffic through"""
+    return {signal for signal, colour in lamps.items() if colour in GO_COLOURS}
+
+
+def priority_lamps(signals, priority_signal):
+    """White for the priority signal, red for everyone else"""
+    return {signal: 'white' if signal == priority_signal else 'red' for signal in signals}
+
+
+class PhaseMachine:
+    """Normal cycle + priority preemption for one junction"""
+    def __init__(self, plan=NORMAL_PLAN, clearance=YELLOW_CLEARANCE, clock=time.monotonic):
+        self.plan = plan
+        self.clearance = clearance
+        self.clock = clock
+        self.signals = sorted(plan[0].lamps)
+
+        now = clock()
+        self.mode = NORMAL
+        self.index = 0
+        self.lamps = dict(plan[0].lamps)
+        self.deadline = now + plan[0].duration
+
+        self.priority_signal = None
+        # (target lamps, mode, phase index, duration) applied after clearing
+        self.pending = None
+        # (phase index, seconds left) of the phase priority interrupted
+        self.interrupted = None
+
+    @property
+    def phase_name(self):
+        if self.mode == NORMAL:
+            return self.plan[self.index].name
+        return f"{self.mode}_{self.priority_signal}" if self.priority_signal else self.mode
+
+    def time_left(self, now=None):
+        """Seconds until the next scheduled change"""
+        return max(0.0, self.deadline - (now if now is not None else self.clock()))
+
+    def preempt(self, signal, hold, now=None):
+        """Give signal priority for hold seconds (renews an existing hold)"""
+        now = now if now is not None else self.clock()
+
+        if self.mode == NORMAL:
+            self.interrupted = (self.index, max(0.0, self.deadline - now))
+        elif self.mode == CLEARING and self.pending[1] == NORMAL:
+            # Caught on the way back from an earlier priority - resume the
+            # same phase afterwards
+            _, _, index, duration = self.pending
+            self.interrupted = (index, duration)
+
+        self.priority_signal = signal
+        if self.mode == PRIORITY and self.lamps.get(signal) == 'white':
+            # Same vehicle scanning again - just extend the hold
+            self.deadline = now + hold
+            return
+
+        self._change(priority_lamps(self.signals, signal), PRIORITY, None, hold, now)
+
+    def tick(self, now=None):
+        """Advance past every deadline that has passed; True if lamps changed"""
+        now = now if now is not None else self.clock()
+        before = dict(self.lamps)
+
+        while now >= self.deadline:
+            # Schedule from the deadline, not from now, so the cycle doesn't drift
+            at = self.deadline
+            if self.mode == CLEARING:
+                lamps, mode, index, duration = self.pending
+                self.pending = None
+                self._apply(lamps, mode, index, at + duration)
+            elif self.mode == PRIORITY:
+                self._resume(at)
+            else:
+                index = (self.index + 1) % len(self.plan)
+                self._apply(dict(self.plan[index].lamps), NORMAL, index, at + self.plan[index].duration)
+
+        return self.lamps != before
+
+    def _resume(self, now):
+        """Go back to the phase priority interrupted"""
+        self.priority_signal = None
+        index, remaining = self.interrupted or (0, self.plan[0].duration)
+        self.interrupted = None
+        phase = self.plan[index]
+        if 'yellow' in phase.lamps.values():
+            # The clearance already did this phase's job - carry on after it
+            index = (index + 1) % len(self.plan)
+            phase = self.plan[index]
+            remaining = phase.duration
+        self._change(dict(phase.lamps), NORMAL, index, remaining, now)
+
+    def _change(self, target, mode, index, duration, now):
+        """Switch to target, going through yellow first where needed"""
+        losing = _go(self.lamps) - _go(target)
+        if losing:
+            clearing = dict(self.lamps)
+            for signal in losing:
+                clearing[signal] = 'yellow'
+            self.lamps = clearing
+            self.mode = CLEARING
+            self.deadline = now + self.clearance
+            self.pending = (target, mode, index, duration)
+            return
+
+        # Nobody loses green/white, but a yellow that is already showing must
+        # finish before another approach gets green/white (it is never longer
+        # than the clearance time)
+        gaining = _go(target) - _go(self.lamps)
+        draining = {signal for signal, colour in self.lamps.items() if colour == 'yellow'} - gaining
+        if gaining and draining:
+            if self.mode != CLEARING:
+                self.deadline = min(self.deadline, now + self.clearance)
+            self.mode = CLEARING
+            self.pending = (target, mode, index, duration)
+            return
+
+        self._apply(target, mode, index, now + duration)
+
+    def _apply(self, lamps, mode, index, deadline):
+        self.lamps = lamps
+        self.mode = mode
+        if index is not None:
+            self.index = index
+        self.deadline = deadline
@@ -0,0 +1,208 @@
+"""Rollup counters for the dashboard and /api/stats, and their rebuild.
+
+    python stats.py             # print what /api/stats returns
+    python stats.py check       # compare the counters with a full recount
+    python stats.py rebuild     # recount everything and replace the counters
+"""
+import argparse
+import json
+import sys
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from db import connection, transaction
+
+# ============================================================================
+# STATISTICS ROLLUPS
+# ============================================================================
+#
+# Triggers from migration 7 keep two small tables up to date in the same
+# transaction as every write, so reading them costs the same however big the
+# history gets:
+#
+#   stat_counter (name, key) -> value
+#     total / rfid_scans, rfid_reading, emergency_case, readings_linked
+#         every row ever written (archiving by retention.py doesn't count)
+#     hot_rows / rfid_scans, rfid_reading, emergency_case
+#         rows currently in the database
+#     cases_by_severity, cases_by_hospital, cases_by_driver / <value>
+#     cases_linked / ''
+#         cases currently in the database (updates move them between keys)
+#     scans_by_source / 'Signal 1' ...   readings_by_reader / 'rfid1' ...
+#         every scan/reading ever written, like 'total'
+#
+#   stat_hourly (hour 'YYYY-MM-DD HH', Pi local time, metric) -> value
+#     scans, readings, readings_linked, cases
+#
+# rebuild() recomputes both from the tables plus the archive segments (for
+# the lifetime counts of archived days) - use it if check() reports drift.
+# Rows deleted by hand (not archived) are drift by that definition: a
+# recount can't see them, so rebuild drops them from the lifetime counts.
+
+# Hours of rollups /api/stats returns by default, and at most
+DEFAULT_HOURS = 24
+MAX_HOURS = 24 * 31
+
+GROUPS = ('cases_by_severity', 'cases_by_hospital', 'cases_by_driver', 'scans_by_source', 'readings_by_reader')
+
+
+def _scan_hour(timestamp):
+    """Local hour bucket for a UTC rfid_scans timestamp"""
+    if not timestamp:
+        return None
+    utc = datetime.strptime(str(timestamp)[:19], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    return utc.astimezone().strftime('%Y-%m-%d %H')
+
+
+def recount(conn):
+    """(stat_counter Counter, stat_hourly Counter) computed from scratch"""
+    from retention import ARCHIVE_DIR, read_segment
+
+    counters, hourly = Counter(), Counter()
+
+    def add(name, rows):
+        for key, value in rows:
+            counters[(name, '' if key is None else str(key))] += value
+
+    for table in ('rfid_scans', 'rfid_reading', 'emergency_case'):
+        hot = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        add('hot_rows', [(table, hot)])
+        add('total', [(table, hot)])
+    add('total', [('readings_linked', conn.execute(
+        "SELECT COUNT(*) FROM rfid_reading WHERE case_id IS NOT NULL").fetchone()[0])])
+    add('scans_by_source', conn.execute("SELECT source, COUNT(*) FROM rfid_scans GROUP BY source"))
+    add('readings_by_reader', conn.execute("SELECT reader_type, COUNT(*) FROM rfid_reading GROUP BY reader_type"))
+    add('cases_by_severity', conn.execute("SELECT severity_level, COUNT(*) FROM emergency_case GROUP BY severity_level"))
+    add('cases_by_hospital', conn.execute("SELECT hospital_name, COUNT(*) FROM emergency_case GROUP BY hospital_name"))
+    add('cases_by_driver', conn.execute("SELECT driver_id, COUNT(*) FROM emergency_case GROUP BY driver_id"))
+    add('cases_linked', [('', conn.execute("SELECT COUNT(*) FROM emergency_case WHERE rfid_linked").fetchone()[0])])
+
+    for hour, value in conn.execute("""
+        SELECT strftime('%Y-%m-%d %H', timestamp, 'localtime'), COUNT(*) FROM rfid_scans GROUP BY 1
+    """):
+        hourly[(hour, 'scans')] += value
+    for hour, total, linked in conn.execute("""
+        SELECT strftime('%Y-%m-%d %H', timestamp), COUNT(*), COUNT(case_id) FROM rfid_reading GROUP BY 1
+    """):
+        hourly[(hour, 'readings')] += total
+        hourly[(hour, 'readings_linked')] += linked
+    for hour, value in conn.execute("SELECT strftime('%Y-%m-%d %H', created_at), COUNT(*) FROM emergency_case GROUP BY 1"):
+        hourly[(hour, 'cases')] += value
+
+    # Archived rows still count towards totals and their hours
+    for table, path in conn.execute("SELECT table_name, path FROM archive_segment ORDER BY id").fetchall():
+        for row in read_segment(path, ARCHIVE_DIR):
+            counters[('total', table)] += 1
+            if table == 'rfid_scans':
+                counters[('scans_by_source', str(row['source']))] += 1
+                hourly[(_scan_hour(row['timestamp']), 'scans')] += 1
+            else:
+                counters[('readings_by_reader', str(row['reader_type']))] += 1
+                hour = str(row['timestamp'])[:13] if row['timestamp'] else None
+                hourly[(hour, 'readings')] += 1
+                if row['case_id'] is not None:
+                    counters[('total', 'readings_linked')] += 1
+                    hourly[(hour, 'readings_linked')] += 1
+
+    hourly = Counter({key: value for key, value in hourly.items() if key[0] is not None and value})
+    counters = Counter({key: value for key, value in counters.items() if value or key[0] in ('total', 'hot_rows')})
+    return counters, hourly
+
+
+def rebuild(conn):
+    """Replace stat_counter / stat_hourly with a full recount (in the caller's transaction)"""
+    counters, hourly = recount(conn)
+    conn.execute("DELETE FROM stat_counter")
+    conn.execute("DELETE FROM stat_hourly")
+    conn.executemany("INSERT INTO stat_counter (name, key, value) VALUES (?, ?, ?)",
+                     [(name, key, value) for (name, key), value in counters.items()])
+    conn.executemany("INSERT INTO stat_hourly (hour, metric, value) VALUES (?, ?, ?)",
+                     [(hour, metric, value) for (hour, metric), value in hourly.items()])
+    print(f"[STATS] Rebuilt {len(counters)} counters and {len(hourly)} hourly rollups")
+    return len(counters), len(hourly)
+
+
+def check(conn):
+    """Differences between the stored counters and a recount: [(table, key, stored, actual)]"""
+    counters, hourly = recount(conn)
+    stored = Counter({(name, key): value for name, key, value in conn.execute("SELECT name, key, value FROM stat_counter")})
+    stored_hourly = Counter({(hour, metric): value for hour, metric, value in conn.execute("SELECT hour, metric, value FROM stat_hourly")})
+    drift = []
+    for table, expected, actual in (('stat_counter', counters, stored), ('stat_hourly', hourly, stored_hourly)):
+        for key in sorted(set(expected) | set(actual)):
+            if expected[key] != actual[key]:
+                drift.append((table, key, actual[key], expected[key]))
+    return drift
+
+
+def hot_rows(conn):
+    """{table: rows currently in it} - what COUNT(*) would say, without the scan"""
+    return dict(conn.execute("SELECT key, value FROM stat_counter WHERE name = 'hot_rows'"))
+
+
+def read_stats(conn, hours=DEFAULT_HOURS, now=None):
+    """The /api/stats document: counters plus the last `hours` hourly rollups"""
+    totals, hot = {}, {}
+    groups = {group: {} for group in GROUPS}
+    cases_linked = 0
+    names = ('total', 'hot_rows', 'cases_linked') + GROUPS
+    for name, key, value in conn.execute(
+            f"SELECT name, key, value FROM stat_counter WHERE name IN ({', '.join('?' * len(names))})", names):
+        if name == 'total':
+            totals[key] = value
+        elif name == 'hot_rows':
+            hot[key] = value
+        elif name == 'cases_linked':
+            cases_linked = value
+        elif name in groups and value:
+            groups[name][key] = value
+
+    now = now or datetime.now()
+    first = (now - timedelta(hours=hours - 1)).strftime('%Y-%m-%d %H')
+    by_hour = {}
+    for hour, metric, value in conn.execute("SELECT hour, metric, value FROM stat_hourly WHERE hour >= ?", (first,)):
+        by_hour.setdefault(hour, {})[metric] = value
+    hourly = []
+    for n in range(hours - 1, -1, -1):
+        hour = (now - timedelta(hours=n)).strftime('%Y-%m-%d %H')
+        values = by_hour.get(hour, {})
+        hourly.append({'hour': hour, **{metric: values.get(metric, 0)
+                                        for metric in ('scans', 'readings', 'readings_linked', 'cases')}})
+
+    return {
+        'totals': {
+            'scans': totals.get('rfid_scans', 0),
+            'readings': totals.get('rfid_reading', 0),
+            'readings_linked': totals.get('readings_linked', 0),
+            'cases': totals.get('emergency_case', 0),
+            'cases_linked': cases_linked,
+        },
+        'hot_rows': hot,
+        **groups,
+        'hourly': hourly,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', nargs='?', default='show', choices=('show', 'check', 'rebuild'))
+    parser.add_argument('--hours', type=int, default=DEFAULT_HOURS)
+    args = parser.parse_args()
+
+    if args.command == 'rebuild':
+        with transaction(immediate=True) as conn:
+            rebuild(conn)
+        return 0
+    with connection() as conn:
+        if args.command == 'check':
+            drift = check(conn)
+            for table, key, stored, actual in drift:
+                print(f"{table} {key}: stored {stored}, actual {actual}")
+            print(f"{len(drift)} counter(s) differ" if drift else "All counters match a full recount")
+            return 1 if drift else 0
+        print(json.dumps(read_stats(conn, args.hours), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
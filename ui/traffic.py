@@ -1,165 +1,157 @@
-import serial
-import RPi.GPIO as GPIO
-
 import time
 import threading
 from datetime import datetime
 
+from dedup import ScanDedup
+from hal import GPIO
+from intersections import load_intersection
+import metrics
+from scan_bus import ScanBus
+from signal_bank import GPIOBackend, SignalBank
+from signal_plan import PhaseMachine, relabel_plan
+
 # GPIO Setup
 GPIO.setmode(GPIO.BOARD)
 GPIO.setwarnings(False)
 
-# LED Pins (Physical Pin Numbers)
+# LED Pins (Physical Pin Numbers) from intersections.json
+JUNCTION = load_intersection()
 LEDs = {
-    "Signal1": {
-        "Red": 5,
-        "Yellow": 12,
-        "Green": 3,
-        "White": 40
-    },
-    "Signal2": {
-        "Red": 13,
-        "Yellow": 38,
-        "Green": 15,
-        "White": 16
-    }
+    "Signal" + signal: {lamp.capitalize(): pin for lamp, pin in lamps.items()}
+    for signal, lamps in JUNCTION.signals.items()
 }
 
 # Initialize LEDs
-for sig in LEDs.values():
-    for pin in sig.values():
-        GPIO.setup(pin, GPIO.OUT)
-        GPIO.output(pin, GPIO.LOW)
-
-
+bank = SignalBank(LEDs, GPIOBackend(GPIO))
+bank.setup()
 
+# Normal cycle, priority hold and clearance from intersections.json: each
+# signal gets green then yellow in turn
+CYCLE = relabel_plan(JUNCTION.plan, lambda signal: "Signal" + signal)
+# Seconds the scanned signal stays White
+PRIORITY_HOLD = JUNCTION.priority_hold
+# Yellow seconds before an approach loses Green/White to a priority vehicle
+CLEARANCE = JUNCTION.clearance
 
 # Global Variables
-paused = False
-interrupted_signal = None
-interrupted_time = 0
 shutdown = False
-lock = threading.Lock()
+# Listener threads queue preemption requests here and notify the controller;
+# only the controller thread touches the LEDs
+preemptions = []
+wakeup = threading.Condition()
+
+# Scan bus channels - ui/RFID1.py and ui/RFID2.py publish here
+rfid1_bus = ScanBus('rfid1').listen()
+rfid2_bus = ScanBus('rfid2').listen()
+# A tag held at a reader is only acted on once
+dedup = ScanDedup()
+
+def request_priority(signal, scan):
+    """Ask the controller to give signal the White light"""
+    with wakeup:
+        preemptions.append((signal, scan))
+        wakeup.notify()
+
+def stop():
+    """Stop all threads"""
+    global shutdown
+    with wakeup:
+        shutdown = True
+        wakeup.notify_all()
 
 # RFID Listener for Arduino Serial (RFID1)
 def rfid_listener_arduino():
-    global paused, interrupted_signal, interrupted_time, shutdown
     try:
         while not shutdown:
-            #print('check nano ')
-            f=open('rfid1.txt','r')
-            data=f.read()
-            f.close()
-            #print('rfid_id 1', data)
-
-            with lock:
-                if data:
-                    print("[", datetime.now(), "] Signal1 detected RFID from Arduino: " + str(data))
-                    print("(" + str(data) + " scanned giving green corridor)")
-                    paused = True
-                    interrupted_signal = "Signal1"
-                    interrupted_time = time.time()
-
-                    for color in ["Red", "Yellow", "Green", "White"]:
-                        GPIO.output(LEDs["Signal1"][color], GPIO.LOW)
-                        GPIO.output(LEDs["Signal2"][color], GPIO.LOW)
-
-                        GPIO.output(LEDs["Signal1"]["White"], GPIO.HIGH)
-                    f=open('rfid1.txt','w')
-                    f.write('')
-                    f.close()
-
-            time.sleep(0.1)
+            # Blocks until a scan arrives; the timeout only lets us see shutdown
+            scan = rfid1_bus.receive(timeout=0.5)
+            if scan is None or dedup.duplicate(scan.reader, scan.uid):
+                continue
+            print("[", datetime.now(), "] Signal1 detected RFID from Arduino: " + str(scan.uid))
+            print("(" + str(scan.uid) + " scanned giving green corridor)")
+            request_priority("Signal1", scan)
     except Exception as e:
         print("Arduino RFID Error: " + str(e))
 
 # RFID Listener for MFRC522 (RFID2)
 def rfid_listener_mfrc():
-    global paused, interrupted_signal, interrupted_time, shutdown
     try:
         while not shutdown:
-
-            f=open('rfid2.txt','r')
-            rfid_id=f.read()
-            f.close()
-            #print('rfid_id 2', rfid_id)
-            with lock:
-                if rfid_id!='':
-                    print("[", datetime.now(), "] Signal2 detected RFID: " + str(rfid_id))
-                    print("(" + str(rfid_id) + " scanned giving green corridor)")
-                    paused = True
-                    interrupted_signal = "Signal2"
-                    interrupted_time = time.time()
-                    for color in ["Red", "Yellow", "Green", "White"]:
-                        GPIO.output(LEDs["Signal1"][color], GPIO.LOW)
-                        GPIO.output(LEDs["Signal2"][color], GPIO.LOW)
-
-                        GPIO.output(LEDs["Signal2"]["White"], GPIO.HIGH)
-                    f=open('rfid2.txt','w')
-                    f.write('')
-                    f.close()
-
-            time.sleep(0.1)
+            scan = rfid2_bus.receive(timeout=0.5)
+            if scan is None or dedup.duplicate(scan.reader, scan.uid):
+                continue
+            print("[", datetime.now(), "] Signal2 detected RFID: " + str(scan.uid))
+            print("(" + str(scan.uid) + " scanned giving green corridor)")
+            request_priority("Signal2", scan)
     except Exception as e:
         print("MFRC522 RFID Error: " + str(e))
 
-# Traffic Light Controller
+def set_lamps(lamps):
+    """Light exactly one LED per signal (only changed pins are written)"""
+    bank.apply(lamps)
+
+# Traffic Light Controller - the only thread that drives the LEDs
 def traffic_light_controller():
-    global paused, interrupted_signal, interrupted_time, shutdown
-    current_signal = "Signal1"
-    last_state = {"Signal1": "Red", "Signal2": "Red"}
+    machine = PhaseMachine(CYCLE, clearance=CLEARANCE)
+    last_state = dict(machine.lamps)
+    # signal -> read_at of the scan still waiting for its White (clearance)
+    waiting = {}
+    set_lamps(last_state)
     try:
         while not shutdown:
-            if not paused:
-                new_state = {"Signal1": "Red", "Signal2": "Red"}
-                new_state[current_signal] = "Green"
-
-                for sig in ["Signal1", "Signal2"]:
-                    if new_state[sig] != last_state[sig]:
-                        print("[", datetime.now(), "] " + sig + ": " + last_state[sig] + " -> " + new_state[sig])
-                        last_state[sig] = new_state[sig]
-
-                for sig in ["Signal1", "Signal2"]:
-                    GPIO.output(LEDs[sig]["Red"], GPIO.HIGH if new_state[sig] == "Red" else GPIO.LOW)
-                    GPIO.output(LEDs[sig]["Green"], GPIO.HIGH if new_state[sig] == "Green" else GPIO.LOW)
-                    GPIO.output(LEDs[sig]["Yellow"], GPIO.LOW)
-                    GPIO.output(LEDs[sig]["White"], GPIO.LOW)
-
-                time.sleep(5)
-                GPIO.output(LEDs[current_signal]["Green"], GPIO.LOW)
-                GPIO.output(LEDs[current_signal]["Yellow"], GPIO.HIGH)
-                time.sleep(2)
-                GPIO.output(LEDs[current_signal]["Yellow"], GPIO.LOW)
-                current_signal = "Signal2" if current_signal == "Signal1" else "Signal1"
-            else:
-                with lock:
-                    if time.time() - interrupted_time >= 10:
-                        paused = False
-                        for sig in ["Signal1", "Signal2"]:
-                            for color in ["Red", "Yellow", "Green", "White"]:
-                                GPIO.output(LEDs[sig][color], GPIO.LOW)
-                        GPIO.output(LEDs["Signal1"]["Red"], GPIO.HIGH)
-                        GPIO.output(LEDs["Signal2"]["Red"], GPIO.HIGH)
-                        last_state = {"Signal1": "Red", "Signal2": "Red"}
-            time.sleep(0.1)
+            # Wait for the next phase change; a scan wakes us straight away
+            with wakeup:
+                if not preemptions and not shutdown:
+                    wakeup.wait(machine.time_left())
+                pending = preemptions[:]
+                del preemptions[:]
+
+            for sig, scan in pending:
+                machine.preempt(sig, PRIORITY_HOLD)
+            machine.tick()
+
+            if machine.lamps != last_state:
+                for sig in machine.lamps:
+                    if machine.lamps[sig] != last_state[sig]:
+                        print("[", datetime.now(), "] " + sig + ": " + last_state[sig].capitalize()
+                              + " -> " + machine.lamps[sig].capitalize())
+                set_lamps(machine.lamps)
+                last_state = dict(machine.lamps)
+
+            for sig, scan in pending:
+                metrics.inc('etps_preemptions_total')
+                waiting.setdefault(sig, scan.read_at)
+            for sig in [sig for sig in waiting if machine.lamps[sig] == 'white']:
+                metrics.observe('etps_scan_lamp_seconds', time.time() - waiting.pop(sig))
+            # Another signal took priority before this one cleared
+            for sig in [sig for sig in waiting if machine.priority_signal != sig]:
+                del waiting[sig]
     except KeyboardInterrupt:
-        shutdown = True
+        stop()
+
+def main():
+    # Start Threads
+    thread1 = threading.Thread(target=rfid_listener_arduino)
+    thread2 = threading.Thread(target=rfid_listener_mfrc)
+    thread3 = threading.Thread(target=traffic_light_controller)
+
+    thread1.start()
+    thread2.start()
+    thread3.start()
 
-# Start Threads
-thread1 = threading.Thread(target=rfid_listener_arduino)
-thread2 = threading.Thread(target=rfid_listener_mfrc)
-thread3 = threading.Thread(target=traffic_light_controller)
-
-thread1.start()
-thread2.start()
-thread3.start()
-
-try:
-    while not shutdown:
-        time.sleep(1)
-except KeyboardInterrupt:
-    shutdown = True
-finally:
-    GPIO.cleanup()
-    arduino_serial.close()
-    print("Program stopped. GPIO and Serial cleaned up.")
+    try:
+        while not shutdown:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop()
+    finally:
+        thread1.join()
+        thread2.join()
+        thread3.join()
+        rfid1_bus.close()
+        rfid2_bus.close()
+        GPIO.cleanup()
+        print("Program stopped. GPIO cleaned up and scan bus closed.")
+
+if __name__ == "__main__":
+    main()